@@ -1,30 +1,27 @@
 import os
+import hmac
 import logging
 from tempfile import mkdtemp
 from dotenv import load_dotenv
 from collections import defaultdict
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for, send_file, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
 import uuid
-import stripe
 import json
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.pagesizes import A4
-import io
-import base64
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from models import db, User, CVUpload, AnalysisResult
 from forms import LoginForm, RegistrationForm, UserProfileForm, ChangePasswordForm
 
-# Lightweight PDF processing
-import PyPDF2
-from docx import Document
-from PIL import Image
+# Load environment variables from .env file - with override
+# (przed importem modułów utils, które czytają konfigurację ze zmiennych środowiskowych)
+load_dotenv(override=True)
+
+# Ciężkie biblioteki (stripe, reportlab, bs4, PyPDF2, cryptography) są importowane
+# przy pierwszym użyciu - szybszy zimny start workera i testów.
+# Pomiar: python benchmarks/bench_import_time.py
 
 # Removed: import fitz  # PyMuPDF
 # Removed: import pytesseract
@@ -43,15 +40,21 @@ from utils.openrouter_api import (
     analyze_job_url, ats_optimization_check, generate_interview_questions,
     analyze_cv_strengths, analyze_cv_score, analyze_keywords_match,
     check_grammar_and_style, optimize_for_position, generate_interview_tips)
-from utils.rate_limiter import rate_limit
-from utils.encryption import encryption
+from utils.rate_limiter import rate_limit, rate_limiter
 from utils.security_middleware import security_middleware
 from utils.notifications import notification_system
 from utils.analytics import analytics
 from utils.cv_validator import cv_validator
-
-# Load environment variables from .env file - with override
-load_dotenv(override=True)
+from utils.session_store import session_store
+from utils.metrics import metrics, phase
+from utils.pdf_cache import pdf_cache
+from utils.pdf_renderer import pdf_renderer
+from utils.bootstrap import bootstrap
+from utils.payments import payment_ledger
+from utils.keyword_matcher import keyword_matcher
+from utils.recruiter_batch import recruiter_batch, ranking_to_csv_rows, BatchError
+from utils.cv_similarity import cv_similarity
+from utils.response_parser import extract_json, parse_ai_response, ResponseParseError
 
 # Verify critical environment variables are loaded
 def verify_env_vars():
@@ -95,17 +98,45 @@ app.config.update(
     DEBUG=os.environ.get("DEBUG", "False").lower() == "true",
     PORT=int(os.environ.get("PORT", 5000)),
     MAX_CONTENT_LENGTH=int(os.environ.get("MAX_CONTENT_LENGTH", 16 * 1024 * 1024)),
+    RATELIMIT_STORAGE_URL=os.environ.get("RATELIMIT_STORAGE_URL"),  # Domyślnie PostgreSQL z DATABASE_URL lub SQLite w /dev/shm
+    SLOW_REQUEST_THRESHOLD=float(os.environ.get("SLOW_REQUEST_THRESHOLD", 10)),
+    SLOW_REQUEST_PROFILING=os.environ.get("SLOW_REQUEST_PROFILING", "False").lower() == "true",
+    SLOW_REQUEST_PROFILE_DIR=os.environ.get("SLOW_REQUEST_PROFILE_DIR"),
+    METRICS_TOKEN=os.environ.get("METRICS_TOKEN"),
+    ANALYTICS_RETENTION_DAYS=int(os.environ.get("ANALYTICS_RETENTION_DAYS", 90)),
+    ANALYTICS_FLUSH_INTERVAL=int(os.environ.get("ANALYTICS_FLUSH_INTERVAL", 30)),
+    ANALYTICS_QUEUE_SIZE=int(os.environ.get("ANALYTICS_QUEUE_SIZE", 10000)),
+    PDF_CACHE_DIR=os.environ.get("PDF_CACHE_DIR"),
+    PDF_CACHE_MAX_BYTES=int(os.environ.get("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+    PDF_DOWNLOAD_TOKEN_TTL=int(os.environ.get("PDF_DOWNLOAD_TOKEN_TTL", 600)),
+    PDF_RENDER_WORKERS=int(os.environ.get("PDF_RENDER_WORKERS", 2)),
+    PDF_RENDER_TIMEOUT=int(os.environ.get("PDF_RENDER_TIMEOUT", 30)),
+    PDF_RENDER_MAX_PENDING=int(os.environ.get("PDF_RENDER_MAX_PENDING", 16)),
+    STRIPE_WEBHOOK_SECRET=os.environ.get("STRIPE_WEBHOOK_SECRET"),
+    PAYMENT_CACHE_TTL=int(os.environ.get("PAYMENT_CACHE_TTL", 60)),
+    KEYWORD_CORPUS_SIZE=int(os.environ.get("KEYWORD_CORPUS_SIZE", 2000)),
+    KEYWORD_CORPUS_REFRESH=int(os.environ.get("KEYWORD_CORPUS_REFRESH", 3600)),
+    RECRUITER_BATCH_WORKERS=int(os.environ.get("RECRUITER_BATCH_WORKERS", 2)),
+    RECRUITER_BATCH_MAX_FILES=int(os.environ.get("RECRUITER_BATCH_MAX_FILES", 200)),
+    RECRUITER_BATCH_TOP_N=int(os.environ.get("RECRUITER_BATCH_TOP_N", 5)),
+    CV_SIMILARITY_THRESHOLD=float(os.environ.get("CV_SIMILARITY_THRESHOLD", 0.8)),
+    CV_SIMILARITY_REUSE=float(os.environ.get("CV_SIMILARITY_REUSE", 0.95)),
+    CV_PARALLEL_MIN_CHARS=int(os.environ.get("CV_PARALLEL_MIN_CHARS", 6000)),
+    CV_PARALLEL_CHUNK_CHARS=int(os.environ.get("CV_PARALLEL_CHUNK_CHARS", 2500)),
+    CV_PARALLEL_WORKERS=int(os.environ.get("CV_PARALLEL_WORKERS", 4)),
 )
 
 app.secret_key = app.config["SECRET_KEY"]
 
-# Enhanced session security with size optimization
+# Enhanced session security - dane sesji trzymane po stronie serwera, ciasteczko zawiera tylko ID
 app.config.update(
     SESSION_COOKIE_SECURE=os.environ.get("FLASK_ENV", "production") == "production",  # True in production with HTTPS
     SESSION_COOKIE_HTTPONLY=True,  # No JavaScript access
     SESSION_COOKIE_SAMESITE='Lax',  # CSRF protection
     PERMANENT_SESSION_LIFETIME=timedelta(hours=24),  # Session timeout
     SESSION_COOKIE_NAME='cv_optimizer_session',
+    SESSION_SWEEP_INTERVAL=int(os.environ.get('SESSION_SWEEP_INTERVAL', 300)),  # Czyszczenie wygasłych sesji
+    SESSION_SIZE_WARN_BYTES=int(os.environ.get('SESSION_SIZE_WARN_BYTES', 512 * 1024)),
     SECRET_KEY=os.environ.get("SESSION_SECRET",
                               "dev-super-secret-key-for-sessions-12345"))
 
@@ -145,6 +176,28 @@ login_manager.login_message_category = 'info'
 # Initialize security middleware
 security_middleware.init_app(app)
 
+# Server-side session store (SQLite/PostgreSQL) zamiast danych w ciasteczku
+session_store.init_app(app)
+
+# Wspólny dla wszystkich workerów rate limiter (GCRA)
+rate_limiter.init_app(app)
+
+# Analityka - zdarzenia zapisywane batchami do bazy, statystyki z dziennych liczników
+analytics.init_app(app)
+
+# Dyskowy cache wygenerowanych PDF-ów i pula procesów renderujących
+pdf_cache.init_app(app)
+pdf_renderer.init_app(app)
+
+# Lokalne dopasowanie słów kluczowych - wagi IDF z zapisanych opisów stanowisk
+keyword_matcher.init_app(app)
+
+# Ranking wielu CV (ZIP z PDF-ami) względem jednej oferty - tryb rekrutera
+recruiter_batch.init_app(app)
+
+# Prawie identyczne CV (MinHash/LSH) - ponowne użycie wyników analiz tego samego użytkownika
+cv_similarity.init_app(app)
+
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -167,10 +220,21 @@ def load_user(user_id):
 # Session management functions removed - using standard Flask-Login
 
 # Stripe configuration - ładowanie z .env
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
+
+
+def get_stripe():
+    """Stripe SDK importowany przy pierwszej operacji płatniczej"""
+    import stripe
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
+
+
+# Rejestr płatności zasilany webhookiem Stripe - sprawdzenie płatności bez zapytania do Stripe
+payment_ledger.init_app(app, get_stripe)
 
 # Verify Stripe configuration
-if not stripe.api_key or len(stripe.api_key) < 20:
+if not STRIPE_SECRET_KEY or len(STRIPE_SECRET_KEY) < 20:
     logger.warning("⚠️ STRIPE_SECRET_KEY nie jest poprawnie ustawiony w .env")
 else:
     logger.info("✅ Stripe API key załadowany poprawnie")
@@ -191,12 +255,15 @@ def allowed_file(filename):
         '.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+WATERMARK_TITLE = "🔒 WERSJA DEMO - CV OPTIMIZER PRO"
+
+
 def add_watermark_to_cv(cv_text):
     """
     Dodaj znak wodny do CV dla niepłacących użytkowników
     """
     watermark = "\n\n" + "=" * 60 + "\n"
-    watermark += "🔒 WERSJA DEMO - CV OPTIMIZER PRO\n"
+    watermark += WATERMARK_TITLE + "\n"
     watermark += "Aby otrzymać pełną wersję CV bez znaku wodnego,\n"
     watermark += "dokonaj płatności 9,99 PLN\n"
     watermark += "=" * 60 + "\n"
@@ -209,34 +276,8 @@ def add_watermark_to_cv(cv_text):
 
 def optimize_session_data():
     """
-    Optymalizuj dane w sesji, aby zmieścić się w limicie 4000 bajtów
+    Usuń z sesji nieużywane klucze (dane sesji są po stronie serwera - bez skracania)
     """
-    # Lista kluczy do skrócenia/usunięcia
-    keys_to_optimize = [
-        'cv_text', 'original_cv_text', 'last_optimized_cv', 'cv_data',
-        'pending_ai_cv_data', 'ai_generated_cv'
-    ]
-
-    for key in keys_to_optimize:
-        if key in session:
-            value = session[key]
-
-            # Jeśli to tekst, skróć do maksymalnie 1000 znaków
-            if isinstance(value, str) and len(value) > 1000:
-                session[key] = value[:1000] + "...[skrócono]"
-
-            # Jeśli to słownik, zachowaj tylko kluczowe informacje
-            elif isinstance(value, dict):
-                if key == 'cv_data':
-                    # Zachowaj tylko podstawowe informacje z CV
-                    optimized = {
-                        'firstName': value.get('firstName', ''),
-                        'lastName': value.get('lastName', ''),
-                        'email': value.get('email', ''),
-                        'jobTitle': value.get('jobTitle', '')
-                    }
-                    session[key] = optimized
-
     # Usuń stare, nieużywane klucze
     old_keys = [
         'large_cv_analysis', 'full_job_description', 'detailed_analysis'
@@ -269,86 +310,62 @@ def clean_session_before_new_data():
             session.pop(key)
 
 
-def parse_ai_json_response(ai_result):
+def incremental_cv_optimization(cv_text, job_description, language, is_premium):
     """
-    Parse JSON response from AI, handling various formats
-    For optimize_cv function, return clean CV text directly
+    Ponowna optymalizacja poprawionego CV: do LLM trafiają tylko sekcje zmienione względem tekstu
+    poprzedniej optymalizacji (bieżące lub podobne CV użytkownika, ta sama oferta i język), pozostałe
+    zoptymalizowane sekcje są wklejane bez zmian. None - potrzebna pełna optymalizacja.
     """
-    import json
-    try:
-        logger.debug(f"AI result before parsing: {ai_result[:200]}...")
-
-        # Check if it's already clean CV text (not JSON)
-        if not ('{' in ai_result and '}' in ai_result):
-            logger.debug(
-                "AI result appears to be clean CV text, returning as-is")
-            return ai_result
-
-        # Clean AI result - remove markdown formatting if present
-        clean_result = ai_result
-        if '```json' in clean_result:
-            json_start = clean_result.find('```json') + 7
-            json_end = clean_result.find('```', json_start)
-            if json_end != -1:
-                clean_result = clean_result[json_start:json_end].strip()
-        elif '{' in clean_result and '}' in clean_result:
-            json_start = clean_result.find('{')
-            json_end = clean_result.rfind('}') + 1
-            clean_result = clean_result[json_start:json_end]
-
-        parsed_result = json.loads(clean_result)
-
-        # Handle different response types
-        if 'optimized_cv' in parsed_result:
-            return parsed_result.get('optimized_cv')
-        elif 'improved_cv' in parsed_result:
-            return parsed_result.get('improved_cv')
-        elif 'result' in parsed_result:
-            return parsed_result.get('result')
-        else:
-            # Return the entire parsed result if no specific key found
-            return parsed_result
+    from utils.cv_sections import incremental_optimize
+    from utils.openrouter_api import optimize_cv_sections
+
+    previous = cv_similarity.find_previous_optimization(current_user.id, cv_text, 'optimize',
+                                                        job_description, language,
+                                                        cv_upload_id=session.get('cv_upload_id'))
+    if previous is None:
+        return None
+    base_text, optimized_text, cv_upload_id = previous
+    if WATERMARK_TITLE in optimized_text:
+        return None
 
-    except (json.JSONDecodeError, TypeError) as e:
-        logger.warning(
-            f"Failed to parse AI response as JSON, returning original: {e}")
-        return ai_result
+    incremental = incremental_optimize(
+        cv_text, base_text, optimized_text,
+        lambda sections: optimize_cv_sections(sections, job_description, language,
+                                              is_premium=is_premium, payment_verified=True))
+    if incremental is not None:
+        metrics.inc('cv_incremental_optimizations_total')
+        logger.info(f"Incremental optimization of CV upload {cv_upload_id}: "
+                    f"{len(incremental.changed)} changed sections, {incremental.reused} reused")
+    return incremental
 
 
-@app.before_request
-def monitor_session_size():
+def parallel_cv_optimization(cv_text, job_description, language, is_premium):
     """
-    Monitoruj rozmiar sesji przed każdym requestem
+    Długie CV optymalizowane porcjami sekcji w równoległych wywołaniach LLM ze wspólnym opisem
+    stanowiska - czas odpowiedzi zależy od najdłuższej porcji, nie od całego dokumentu.
+    None - CV nie dzieli się na porcje (pełna optymalizacja jednym wywołaniem).
     """
-    try:
-        # Debug authentication status tylko w trybie development
-        if app.config.get('DEBUG') and request.endpoint in ['index', 'login', 'register', 'process_cv']:
-            print(f"🔍 Route: {request.endpoint}")
-            print(f"🔍 current_user.is_authenticated: {current_user.is_authenticated}")
-            if current_user.is_authenticated:
-                print(f"🔍 current_user.username: {current_user.username}")
-            print(f"🔍 session logged_in_username: {session.get('logged_in_username')}")
-            print(f"🔍 session user_id: {session.get('user_id')}")
-            print(f"🔍 Flask-Login _user_id: {session.get('_user_id')}")
-
-        import pickle
-        session_size = len(pickle.dumps(dict(session)))
-
-        # Jeśli sesja zbliża się do limitu, optymalizuj
-        if session_size > 9500:  # 9.5KB - ostrzeżenie
-            logger.warning(
-                f"Sesja zbliża się do limitu: {session_size} bajtów")
-            optimize_session_data()
-
-        # Jeśli nadal za duża, wyczyść
-        if session_size > 10000:  # 10KB - wymuszenie czyszczenia
-            logger.error(
-                f"Sesja przekracza limit: {session_size} bajtów - wymuszam czyszczenie"
-            )
-            clean_session_before_new_data()
+    from utils.cv_sections import parallel_optimize
+    from utils.openrouter_api import optimize_cv_sections
 
-    except Exception as e:
-        logger.error(f"Błąd podczas monitorowania sesji: {e}")
+    with phase('llm'):
+        optimized = parallel_optimize(
+            cv_text,
+            lambda sections: optimize_cv_sections(sections, job_description, language,
+                                                  is_premium=is_premium, payment_verified=True),
+            max_chunk_chars=app.config['CV_PARALLEL_CHUNK_CHARS'],
+            max_workers=app.config['CV_PARALLEL_WORKERS'])
+    if optimized is not None:
+        metrics.inc('cv_parallel_optimizations_total')
+    return optimized
+
+
+def parse_ai_json_response(ai_result):
+    """
+    Parse JSON response from AI, handling various formats
+    For optimize_cv function, return clean CV text directly
+    """
+    return parse_ai_response(ai_result)
 
 
 @app.route('/')
@@ -758,6 +775,20 @@ def debug_session():
 
     return f"<pre>{json.dumps(debug_info, indent=2, default=str)}</pre>"
 
+@app.route('/internal/metrics')
+def internal_metrics():
+    """Metryki procesu (histogramy czasu per endpoint, statusy, fazy) - tylko dla developera lub z tokenem"""
+    token = app.config.get('METRICS_TOKEN')
+    has_token = bool(token) and hmac.compare_digest(request.headers.get('X-Metrics-Token', ''), token)
+    is_developer = current_user.is_authenticated and current_user.is_developer()
+    if not has_token and not is_developer:
+        return "Access denied", 403
+
+    snapshot = metrics.snapshot()
+    snapshot['pid'] = os.getpid()  # Metryki są per worker gunicorna
+    return jsonify(snapshot)
+
+
 @app.route('/clear-cache')
 def clear_cache():
     """Clear all session data and cache"""
@@ -834,7 +865,7 @@ def premium_subscription():
 def create_cv_builder_payment():
     """Create payment intent for CV Builder access"""
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe().PaymentIntent.create(
             amount=1499,  # 14,99 PLN
             currency='pln',
             metadata={
@@ -851,7 +882,7 @@ def create_cv_builder_payment():
 def create_premium_subscription():
     """Create Stripe checkout session for premium subscription"""
     try:
-        stripe_session = stripe.checkout.Session.create(
+        stripe_session = get_stripe().checkout.Session.create(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -1026,26 +1057,37 @@ def upload_cv():
         db.session.add(cv_upload)
         db.session.commit()
 
+        # Sygnatura MinHash - wcześniejsze, prawie identyczne wersje tego CV
+        similar_cv = None
+        try:
+            signature = cv_similarity.add(cv_upload.id, current_user.id, cv_text)
+            similar = cv_similarity.find_similar(current_user.id, signature=signature, exclude_id=cv_upload.id)
+            if similar:
+                previous = db.session.get(CVUpload, similar[0].cv_upload_id)
+                similar_cv = {
+                    'cv_upload_id': previous.id,
+                    'filename': previous.filename,
+                    'uploaded_at': previous.uploaded_at.isoformat() if previous.uploaded_at else None,
+                    'similarity': round(similar[0].similarity, 2),
+                }
+        except Exception as e:
+            logger.error(f"Error indexing CV fingerprint: {str(e)}")
+
         # Wyczyść sesję przed dodaniem nowych danych
         clean_session_before_new_data()
 
-        # Store CV data in session for processing (skrócone wersje)
-        session['cv_text'] = cv_text[:2000] + "...[skrócono]" if len(
-            cv_text) > 2000 else cv_text
-        session['original_cv_text'] = cv_text[:1500] + "...[skrócono]" if len(
-            cv_text) > 1500 else cv_text
-        session[
-            'original_filename'] = original_filename[:
-                                                     100]  # Limit filename length
-        session['job_title'] = request.form.get('job_title',
-                                                '')[:200]  # Limit job title
-        session['job_description'] = request.form.get(
-            'job_description', '')[:500]  # Limit job description
+        # Store CV data in session for processing (pełne wersje - sesja po stronie serwera)
+        session['cv_text'] = cv_text
+        session['original_cv_text'] = cv_text
+        session['original_filename'] = original_filename
+        session['job_title'] = request.form.get('job_title', '')
+        session['job_description'] = request.form.get('job_description', '')
         session['cv_upload_id'] = cv_upload.id
 
         return jsonify({
             'success': True,
             'cv_text': cv_text,
+            'similar_cv': similar_cv,
             'message': 'CV zostało pomyślnie przesłane i zapisane.'
         })
 
@@ -1066,7 +1108,7 @@ def create_payment_intent():
         amount = 999  # w groszach
 
         # Tworzenie Payment Intent
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe().PaymentIntent.create(
             amount=amount,
             currency='pln',
             metadata={'service': 'cv_optimization'})
@@ -1097,10 +1139,9 @@ def verify_payment():
                 'message': 'Brak ID płatności'
             }), 400
 
-        # Sprawdzenie statusu płatności
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-
-        if intent.status == 'succeeded':
+        # Sprawdzenie statusu płatności (rejestr lokalny, Stripe tylko gdy płatności tam nie ma)
+        user_id = current_user.id if current_user.is_authenticated else None
+        if payment_ledger.is_paid(payment_intent_id, user_id):
             # Płatność zakończona sukcesem - zapisz w sesji
             session['payment_verified'] = True
             session['payment_intent_id'] = payment_intent_id
@@ -1127,6 +1168,23 @@ def verify_payment():
         }), 500
 
 
+@app.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    """Zdarzenia Stripe (podpisane STRIPE_WEBHOOK_SECRET) aktualizujące rejestr płatności"""
+    try:
+        event_type = payment_ledger.handle_webhook(request.get_data(),
+                                                   request.headers.get('Stripe-Signature', ''))
+    except ValueError as e:
+        logger.warning(f"Odrzucono webhook Stripe: {str(e)}")
+        return jsonify({'success': False, 'message': 'Nieprawidłowe zdarzenie'}), 400
+    except Exception as e:
+        # 500 - Stripe ponowi wysłanie zdarzenia
+        logger.error(f"Error handling Stripe webhook: {str(e)}")
+        return jsonify({'success': False, 'message': 'Błąd przetwarzania zdarzenia'}), 500
+
+    return jsonify({'success': True, 'type': event_type})
+
+
 @app.route('/create-cv-payment', methods=['POST'])
 @login_required
 def create_cv_payment():
@@ -1134,18 +1192,11 @@ def create_cv_payment():
     try:
         cv_data = request.get_json()
 
-        # Store CV data in session for later use (optymalizowane)
-        optimized_cv_data = {
-            'firstName': cv_data.get('firstName', '')[:50],
-            'lastName': cv_data.get('lastName', '')[:50],
-            'email': cv_data.get('email', '')[:100],
-            'phone': cv_data.get('phone', '')[:20],
-            'jobTitle': cv_data.get('jobTitle', '')[:100]
-        }
-        session['cv_data'] = optimized_cv_data
+        # Store CV data in session for later use (pełne dane potrzebne do wygenerowania PDF)
+        session['cv_data'] = cv_data
 
         # Create payment intent for CV generation (9.99 PLN)
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe().PaymentIntent.create(
             amount=999,  # 9.99 PLN in grosze
             currency='pln',
             metadata={
@@ -1185,9 +1236,7 @@ def generate_cv_pdf():
             }), 400
 
         # Verify payment
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-
-        if intent.status != 'succeeded':
+        if not payment_ledger.is_paid(payment_intent_id, current_user.id):
             return jsonify({
                 'success': False,
                 'message': 'Płatność nie została zakończona'
@@ -1201,21 +1250,30 @@ def generate_cv_pdf():
                 'message': 'Brak danych CV do wygenerowania'
             }), 400
 
-        # Generate PDF
-        pdf_buffer = generate_cv_pdf_file(cv_data)
+        # Generate PDF (ponowienie po powrocie z płatności trafia w cache)
+        from utils.cv_templates import get_template
+
+        template = get_template('classic')
+        cached_pdf = pdf_cache.render_cached(
+            cv_data, template.name, template.version,
+            lambda: pdf_renderer.render(template.name, cv_data))
 
-        # Encode as base64 for frontend
-        pdf_base64 = base64.b64encode(pdf_buffer.getvalue()).decode()
+        filename = f"CV_{cv_data.get('firstName', 'CV')}_{cv_data.get('lastName', '')}.pdf"
 
+        # Zamiast base64 w JSON - krótkotrwały link do pobrania pliku
         return jsonify({
-            'success':
-            True,
-            'pdf_data':
-            pdf_base64,
-            'filename':
-            f"CV_{cv_data.get('firstName', 'CV')}_{cv_data.get('lastName', '')}.pdf"
+            'success': True,
+            'filename': filename,
+            **pdf_download_info(cached_pdf, filename)
         })
 
+    except TimeoutError as e:
+        logger.error(f"PDF rendering timed out: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Generowanie PDF trwa zbyt długo - spróbuj ponownie za chwilę'
+        }), 503
+
     except Exception as e:
         logger.error(f"Error generating CV PDF: {str(e)}")
         return jsonify({
@@ -1271,12 +1329,14 @@ def generate_ai_cv():
             language='pl')
 
         # Parse AI response
-        import json
         try:
-            cv_content = json.loads(ai_cv_content)
-        except json.JSONDecodeError:
-            # Fallback parsing
-            cv_content = parse_ai_json_response(ai_result)
+            cv_content = extract_json(ai_cv_content)
+        except ResponseParseError as e:
+            logger.error(f"Error parsing AI CV content: {str(e)}")
+            return jsonify({
+                'success': False,
+                'message': 'Nie udało się przetworzyć odpowiedzi AI. Spróbuj ponownie.'
+            }), 500
 
         # Combine basic info with AI-generated content
         complete_cv_data = {
@@ -1304,14 +1364,15 @@ def generate_ai_cv():
             basic_info['template_style']
         }
 
-        # Generate PDF with selected template
-        from utils.cv_templates import generate_cv_with_template
+        # Generate PDF with selected template (w puli procesów renderujących)
+        from utils.cv_templates import get_template
 
-        pdf_buffer = generate_cv_with_template(complete_cv_data,
-                                               basic_info['template_style'])
+        template = get_template(basic_info['template_style'])
+        cached_pdf = pdf_cache.render_cached(
+            complete_cv_data, template.name, template.version,
+            lambda: pdf_renderer.render(template.name, complete_cv_data))
 
-        # Encode as base64
-        pdf_base64 = base64.b64encode(pdf_buffer.getvalue()).decode()
+        filename = f"AI_CV_{basic_info['firstName']}_{basic_info['lastName']}.pdf"
 
         # Store in session for potential edits
         session['ai_generated_cv'] = complete_cv_data
@@ -1321,14 +1382,20 @@ def generate_ai_cv():
             True,
             'cv_data':
             complete_cv_data,
-            'pdf_data':
-            pdf_base64,
             'filename':
-            f"AI_CV_{basic_info['firstName']}_{basic_info['lastName']}.pdf",
+            filename,
             'message':
-            'CV zostało wygenerowane przez AI z profesjonalnym szablonem!'
+            'CV zostało wygenerowane przez AI z profesjonalnym szablonem!',
+            **pdf_download_info(cached_pdf, filename)
         })
 
+    except TimeoutError as e:
+        logger.error(f"AI CV PDF rendering timed out: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Generowanie PDF trwa zbyt długo - spróbuj ponownie za chwilę'
+        }), 503
+
     except Exception as e:
         logger.error(f"Error generating AI CV: {str(e)}")
         return jsonify({
@@ -1347,7 +1414,7 @@ def create_ai_cv_payment():
         session['pending_ai_cv_data'] = cv_request_data
 
         # Create payment intent for AI CV generation (29.99 PLN - same as Premium monthly)
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe().PaymentIntent.create(
             amount=2999,  # 29.99 PLN
             currency='pln',
             metadata={
@@ -1372,122 +1439,127 @@ def create_ai_cv_payment():
         }), 500
 
 
-def generate_cv_pdf_file(cv_data):
-    """Generate PDF file from CV data"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#6366f1'),
-        spaceAfter=30,
-        alignment=1  # Center
-    )
-
-    subtitle_style = ParagraphStyle('CustomSubtitle',
-                                    parent=styles['Heading2'],
-                                    fontSize=16,
-                                    textColor=colors.HexColor('#4f46e5'),
-                                    spaceAfter=20)
-
-    normal_style = ParagraphStyle('CustomNormal',
-                                  parent=styles['Normal'],
-                                  fontSize=11,
-                                  spaceAfter=12)
-
-    # Header
-    name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip(
-    )
-    story.append(Paragraph(name, title_style))
-
-    job_title = cv_data.get('jobTitle', '')
-    if job_title:
-        story.append(Paragraph(job_title, styles['Heading3']))
-
-    # Contact info
-    contact_info = []
-    if cv_data.get('email'):
-        contact_info.append(cv_data['email'])
-    if cv_data.get('phone'):
-        contact_info.append(cv_data['phone'])
-    if cv_data.get('city'):
-        contact_info.append(cv_data['city'])
-    if cv_data.get('linkedin'):
-        contact_info.append(cv_data['linkedin'])
-
-    if contact_info:
-        story.append(Paragraph(' | '.join(contact_info), normal_style))
-
-    story.append(Spacer(1, 20))
-
-    # Summary
-    if cv_data.get('summary'):
-        story.append(Paragraph("O mnie", subtitle_style))
-        story.append(Paragraph(cv_data['summary'], normal_style))
-        story.append(Spacer(1, 15))
-
-    # Experience
-    experiences = cv_data.get('experiences', [])
-    if experiences and any(
-            exp.get('title') or exp.get('company') for exp in experiences):
-        story.append(Paragraph("Doświadczenie zawodowe", subtitle_style))
-        for exp in experiences:
-            if exp.get('title') or exp.get('company'):
-                # Title and company
-                exp_header = f"<b>{exp.get('title', 'Stanowisko')}</b> - {exp.get('company', 'Firma')}"
-                story.append(Paragraph(exp_header, normal_style))
-
-                # Dates
-                start_date = exp.get('startDate', '')
-                end_date = exp.get('endDate', 'obecnie')
-                if start_date:
-                    date_range = f"{start_date} - {end_date}"
-                    story.append(Paragraph(date_range, normal_style))
-
-                # Description
-                if exp.get('description'):
-                    story.append(Paragraph(exp['description'], normal_style))
-
-                story.append(Spacer(1, 10))
-
-    # Education
-    education = cv_data.get('education', [])
-    if education and any(
-            edu.get('degree') or edu.get('school') for edu in education):
-        story.append(Paragraph("Wykształcenie", subtitle_style))
-        for edu in education:
-            if edu.get('degree') or edu.get('school'):
-                # Degree and school
-                edu_header = f"<b>{edu.get('degree', 'Kierunek')}</b> - {edu.get('school', 'Uczelnia')}"
-                story.append(Paragraph(edu_header, normal_style))
-
-                # Years
-                start_year = edu.get('startYear', '')
-                end_year = edu.get('endYear', '')
-                if start_year or end_year:
-                    year_range = f"{start_year} - {end_year}"
-                    story.append(Paragraph(year_range, normal_style))
-
-                story.append(Spacer(1, 10))
-
-    # Skills
-    skills = cv_data.get('skills', '')
-    if skills:
-        story.append(Paragraph("Umiejętności", subtitle_style))
-        skills_list = [
-            skill.strip() for skill in skills.split(',') if skill.strip()
-        ]
-        skills_text = ' • '.join(skills_list)
-        story.append(Paragraph(skills_text, normal_style))
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+def _pdf_download_serializer():
+    return URLSafeTimedSerializer(app.secret_key, salt='cv-pdf-download')
+
+
+def pdf_download_info(cached_pdf, filename):
+    """Podpisany, krótkotrwały token do pobrania PDF z cache - tylko dla bieżącego użytkownika"""
+    token = _pdf_download_serializer().dumps({
+        'k': cached_pdf.key,
+        'u': current_user.id,
+        'f': secure_filename(filename) or 'CV.pdf'
+    })
+    return {
+        'download_token': token,
+        'download_url': url_for('download_pdf', token=token),
+        'expires_in': app.config['PDF_DOWNLOAD_TOKEN_TTL']
+    }
+
+
+@app.route('/download/pdf/<token>')
+@login_required
+def download_pdf(token):
+    """Strumieniowe pobieranie PDF (Content-Length, ETag, żądania Range)"""
+    try:
+        payload = _pdf_download_serializer().loads(
+            token, max_age=app.config['PDF_DOWNLOAD_TOKEN_TTL'])
+    except SignatureExpired:
+        return jsonify({
+            'success': False,
+            'message': 'Link do pobrania wygasł - wygeneruj PDF ponownie'
+        }), 410
+    except BadSignature:
+        return jsonify({'success': False, 'message': 'Nieprawidłowy link'}), 404
+
+    if payload.get('u') != current_user.id:
+        return jsonify({'success': False, 'message': 'Nieprawidłowy link'}), 404
+
+    path = pdf_cache.get(payload.get('k', ''))
+    if path is None:
+        return jsonify({
+            'success': False,
+            'message': 'Plik nie jest już dostępny - wygeneruj PDF ponownie'
+        }), 410
+
+    # Klucz cache (hash danych CV, szablonu i wersji) jednoznacznie wyznacza treść pliku - nadaje się na ETag
+    response = send_file(path,
+                         mimetype='application/pdf',
+                         as_attachment=True,
+                         download_name=payload['f'],
+                         conditional=True,
+                         etag=payload['k'],
+                         max_age=0)
+    response.headers['Cache-Control'] = 'private, no-transform'
+    return response
+
+
+@app.route('/api/recruiter/batch', methods=['POST'])
+@login_required
+@rate_limit('cv_process')
+def recruiter_batch_ranking():
+    """
+    Ranking CV z archiwum ZIP względem jednej oferty.
+    format=ndjson (domyślnie): strumień zdarzeń postępu zakończony zdarzeniem 'result';
+    format=csv: ranking jako CSV po zakończeniu przetwarzania.
+    """
+    if not current_user.has_full_access():
+        return jsonify({
+            'success': False,
+            'message': 'Tryb rekrutera jest dostępny tylko dla użytkowników Premium.',
+            'premium_required': True
+        }), 403
+
+    archive = request.files.get('archive')
+    job_description = request.form.get('job_description', '').strip()
+    output_format = request.form.get('format', 'ndjson')
+    if not archive or not job_description:
+        return jsonify({
+            'success': False,
+            'message': 'Wymagane są archiwum ZIP z plikami PDF oraz opis stanowiska'
+        }), 400
+    if output_format not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'Nieobsługiwany format wyniku'}), 400
+
+    try:
+        top_n = int(request.form.get('top_n', app.config['RECRUITER_BATCH_TOP_N']))
+    except ValueError:
+        top_n = -1
+    if top_n < 0:
+        return jsonify({'success': False, 'message': 'Nieprawidłowa wartość top_n'}), 400
+    top_n = min(top_n, app.config['RECRUITER_BATCH_TOP_N'])
+
+    events = recruiter_batch.run(archive.stream, job_description, top_n=top_n,
+                                 language=request.form.get('language', 'pl'))
+    try:
+        # Archiwum jest wypakowywane przed pierwszym zdarzeniem - błędy wracają jako zwykła odpowiedź
+        started = next(events)
+    except BatchError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    logger.info(f"Recruiter batch: {started['files']} CV, user {current_user.id}")
+
+    if output_format == 'csv':
+        def generate_csv():
+            for event in events:
+                if event['event'] == 'result':
+                    yield from ranking_to_csv_rows(event['ranking'])
+
+        return Response(stream_with_context(generate_csv()),
+                        mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=ranking_cv.csv'})
+
+    def generate_ndjson():
+        yield json.dumps(started, ensure_ascii=False) + '\n'
+        for event in events:
+            yield json.dumps(event, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+# Opcje zapisywane jako optymalizacja CV (porównanie wersji, analityka)
+CV_OPTIMIZATION_OPTIONS = ('optimize', 'position_optimization', 'advanced_position_optimization')
 
 
 @app.route('/process-cv', methods=['POST'])
@@ -1538,7 +1610,10 @@ def process_cv():
     try:
         job_description = data.get('job_description',
                                    extracted_job_description)
+        # Opis stanowiska zapisywany z wynikiem analizy (i porównywany przy ponownym użyciu wyniku)
+        analysis_job_description = extracted_job_description if extracted_job_description else job_description
         result = None
+        incremental = None
 
         options_handlers = {
             'optimize': optimize_cv,
@@ -1616,8 +1691,24 @@ def process_cv():
                     'cv_builder_payment_required': True
                 }), 403
 
+        # Ta sama analiza prawie identycznego CV (ta sama oferta i język) - bez ponownego wywołania LLM
+        reused_from = None
+        try:
+            reused_result, similar = cv_similarity.find_reusable_result(
+                current_user.id, cv_text, selected_option, analysis_job_description, language)
+            if similar is not None:
+                result = reused_result
+                reused_from = {'cv_upload_id': similar.cv_upload_id, 'similarity': round(similar.similarity, 2)}
+                logger.info(f"Reusing {selected_option} result of CV upload {similar.cv_upload_id} "
+                            f"(similarity {similar.similarity:.2f})")
+        except Exception as e:
+            logger.error(f"Error looking up similar CV analysis: {str(e)}")
+
         # Obsługa funkcji według poziomów dostępu
-        if selected_option == 'optimize':
+        if reused_from is not None:
+            pass
+
+        elif selected_option == 'optimize':
             # Funkcja za 9,99 PLN lub Premium z ulepszoną optymalizacją
             if not is_developer and not payment_verified and not is_premium_active:
                 ai_result = optimize_cv(cv_text,
@@ -1628,18 +1719,36 @@ def process_cv():
                 result = parse_ai_json_response(ai_result)
                 result = add_watermark_to_cv(result)
             else:
-                # Użyj nowej zaawansowanej funkcji dla płacących
-                from utils.openrouter_api import enhanced_cv_optimization_with_reasoning
-
-                logger.info(
-                    "Używam zaawansowanej optymalizacji CV z AI reasoning")
-                ai_result = enhanced_cv_optimization_with_reasoning(
-                    cv_text,
-                    job_description,
-                    language,
-                    is_premium=is_premium_active,
-                    payment_verified=True)
-                result = parse_ai_json_response(ai_result)
+                # Poprawione CV zoptymalizowane wcześniej - LLM dostaje tylko zmienione sekcje
+                try:
+                    incremental = incremental_cv_optimization(
+                        cv_text, analysis_job_description, language, is_premium_active)
+                except Exception as e:
+                    logger.error(f"Incremental CV optimization failed, running full optimization: {str(e)}")
+
+                if incremental is None and len(cv_text) >= app.config['CV_PARALLEL_MIN_CHARS']:
+                    # Długie CV - porcje sekcji optymalizowane równolegle
+                    try:
+                        result = parallel_cv_optimization(
+                            cv_text, job_description, language, is_premium_active)
+                    except Exception as e:
+                        logger.error(f"Parallel CV optimization failed, running full optimization: {str(e)}")
+
+                if incremental is not None:
+                    result = incremental.text
+                elif result is None:
+                    # Użyj nowej zaawansowanej funkcji dla płacących
+                    from utils.openrouter_api import enhanced_cv_optimization_with_reasoning
+
+                    logger.info(
+                        "Używam zaawansowanej optymalizacji CV z AI reasoning")
+                    ai_result = enhanced_cv_optimization_with_reasoning(
+                        cv_text,
+                        job_description,
+                        language,
+                        is_premium=is_premium_active,
+                        payment_verified=True)
+                    result = parse_ai_json_response(ai_result)
 
         elif selected_option == 'ats_optimization_check':
             # Funkcja za 9,99 PLN lub Premium
@@ -1699,16 +1808,9 @@ def process_cv():
                                                        job_description,
                                                        language)
 
-        # Store optimized CV for comparison (only for optimization options) - skrócona wersja
-        if selected_option in [
-                'optimize', 'position_optimization',
-                'advanced_position_optimization'
-        ]:
-            if isinstance(result, str) and len(result) > 1500:
-                session[
-                    'last_optimized_cv'] = result[:1500] + "...[skrócono dla optymalizacji sesji]"
-            else:
-                session['last_optimized_cv'] = result
+        # Store optimized CV for comparison (only for optimization options)
+        if selected_option in CV_OPTIMIZATION_OPTIONS:
+            session['last_optimized_cv'] = result
 
         # Optymalizuj sesję po dodaniu nowych danych
         optimize_session_data()
@@ -1725,10 +1827,16 @@ def process_cv():
                             'result':
                             result,
                             'job_description':
-                            extracted_job_description
-                            if extracted_job_description else job_description,
+                            analysis_job_description,
+                            # Tekst źródłowy optymalizacji - baza dla optymalizacji przyrostowej
+                            'cv_text':
+                            cv_text if selected_option in CV_OPTIMIZATION_OPTIONS else None,
                             'job_url':
                             job_url,
+                            'language':
+                            language,
+                            'reused_from':
+                            reused_from,
                             'timestamp':
                             datetime.utcnow().isoformat()
                         },
@@ -1739,11 +1847,26 @@ def process_cv():
                 logger.error(f"Error saving analysis result: {str(e)}")
                 # Nie blokujemy odpowiedzi, tylko logujemy błąd
 
+        # Zdarzenie trafia do kolejki w pamięci - zapis do bazy robi wątek w tle
+        if selected_option in CV_OPTIMIZATION_OPTIONS:
+            event_type = 'cv_optimization'
+        elif selected_option == 'cover_letter':
+            event_type = 'cover_letter'
+        else:
+            event_type = 'ai_analysis'
+        analytics.track_event(current_user.id, event_type, {'option': selected_option, 'language': language})
+
         return jsonify({
             'success':
             True,
             'result':
             result,
+            'reused_from':
+            reused_from,
+            'incremental': {
+                'changed_sections': incremental.changed,
+                'reused_sections': incremental.reused
+            } if incremental is not None else None,
             'job_description':
             extracted_job_description if extracted_job_description else None
         })
@@ -1810,7 +1933,7 @@ def generate_improve_cv():
 
         # Store improved CV for comparison
         if isinstance(result, dict) and 'improved_cv' in result:
-            session['last_optimized_cv'] = result['improved_cv'][:1500] + "...[skrócono]" if len(result['improved_cv']) > 1500 else result['improved_cv']
+            session['last_optimized_cv'] = result['improved_cv']
             session['last_feedback_applied'] = True
 
         # Zapisz wynik w bazie danych
@@ -1985,16 +2108,9 @@ def analyze_job_posting():
 
         # Spróbuj sparsować JSON z odpowiedzi AI
         try:
-            import json
-            parsed_analysis = json.loads(analysis_result)
-        except json.JSONDecodeError:
-            # Jeśli nie da się sparsować jako JSON, wyciągnij JSON z tekstu
-            import re
-            json_match = re.search(r'\{.*\}', analysis_result, re.DOTALL)
-            if json_match:
-                parsed_analysis = json.loads(json_match.group())
-            else:
-                parsed_analysis = {'analysis': analysis_result}
+            parsed_analysis = extract_json(analysis_result)
+        except ResponseParseError:
+            parsed_analysis = {'analysis': analysis_result}
 
         return jsonify({
             'success': True,
@@ -2040,28 +2156,16 @@ def check_configuration():
 
 def initialize_app():
     """Initialize application database and users"""
-    with app.app_context():
-        # Create all database tables
-        db.create_all()
-        print("✅ Database tables created successfully!")
-
-        # Create or update developer account
-        dev_user = User.query.filter_by(username='developer').first()
-        if not dev_user:
-            dev_user = User(username='developer',
-                            email='dev@cvoptimizer.pro',
-                            first_name='System',
-                            last_name='Developer',
-                            is_active=True)
-            dev_user.set_password('NewDev2024!')
-            db.session.add(dev_user)
-            db.session.commit()
-            print("✅ Developer account created successfully!")
-        else:
-            # Update password to ensure it's current
-            dev_user.set_password('NewDev2024!')
-            db.session.commit()
-            print("✅ Developer account updated successfully!")
+    # Kroki startowe są wersjonowane - wykonane wcześniej są pomijane (bez zapisu i hashowania hasła)
+    applied = bootstrap.run(app, db)
+    if applied:
+        print(f"✅ Database bootstrap steps applied: {', '.join(applied)}")
+
+    # Bez puli procesów rozgrzej szablony PDF przed forkiem workerów (preload_app);
+    # procesy z puli robią to same w initializerze
+    if not app.config['PDF_RENDER_WORKERS']:
+        from utils.cv_templates import prewarm_templates
+        prewarm_templates()
 
 # Initialize app when imported (for production)
 if os.environ.get('FLASK_ENV') == 'production':
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark generowania PDF z szablonów CV (utils/cv_templates.py).
+
+Porównuje poprzednie zachowanie (nowy arkusz stylów i komplet ParagraphStyle przy każdym PDF)
+ze współdzielonym, zbudowanym raz rejestrem stylów - osobno dla każdego zarejestrowanego szablonu.
+Wynik w PDF/s.
+
+Użycie: python benchmarks/bench_cv_templates.py [--iterations 200] [--template modern_blue]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cv_templates import (CVTemplateGenerator, TEMPLATE_REGISTRY, build_style_registry,
+                                cv_template_generator)
+
+CV_DATA = {
+    'firstName': 'Anna',
+    'lastName': 'Nowak',
+    'jobTitle': 'Senior Data Analyst',
+    'email': 'anna.nowak@email.pl',
+    'phone': '+48 600 700 800',
+    'city': 'Kraków',
+    'linkedin': 'linkedin.com/in/annanowak',
+    'summary': 'Analityczka danych z 8-letnim doświadczeniem w raportowaniu, automatyzacji ETL '
+               'i budowie dashboardów dla zarządu. ' * 3,
+    'experiences': [{
+        'title': f'Data Analyst {i}',
+        'company': f'Firma {i} Sp. z o.o.',
+        'startDate': f'{2015 + i}-01',
+        'endDate': f'{2016 + i}-12',
+        'description': 'Projektowanie raportów w Power BI, optymalizacja zapytań SQL, '
+                       'automatyzacja procesów w Pythonie.',
+    } for i in range(6)],
+    'education': [{
+        'degree': 'Metody ilościowe w ekonomii',
+        'school': 'Szkoła Główna Handlowa',
+        'startYear': '2010',
+        'endYear': '2015',
+    }],
+    'skills': 'Python, pandas, SQL, Power BI, Excel, dbt, Airflow, komunikacja, praca zespołowa',
+}
+
+
+def legacy_render(template):
+    # Poprzednio: getSampleStyleSheet() + wszystkie style budowane od nowa dla każdego PDF
+    generator = CVTemplateGenerator(build_style_registry())
+    return TEMPLATE_REGISTRY[template].render(generator, CV_DATA)
+
+
+def shared_render(template):
+    return TEMPLATE_REGISTRY[template].render(cv_template_generator, CV_DATA)
+
+
+def pdfs_per_second(fn, template, iterations):
+    fn(template)  # rozgrzewka (fonty, cache reportlab)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(template)
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--template', choices=sorted(TEMPLATE_REGISTRY),
+                        help='domyślnie wszystkie zarejestrowane szablony')
+    args = parser.parse_args()
+
+    templates = [args.template] if args.template else list(TEMPLATE_REGISTRY)
+    print(f"{'template':<14} {'before PDF/s':>13} {'after PDF/s':>12} {'speedup':>8} {'ms/PDF':>8}")
+    for template in templates:
+        before = pdfs_per_second(legacy_render, template, args.iterations)
+        after = pdfs_per_second(shared_render, template, args.iterations)
+        print(f"{template:<14} {before:>13.1f} {after:>12.1f} {after / before:>7.2f}x {1000 / after:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
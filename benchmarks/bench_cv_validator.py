@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark walidacji CV (utils/cv_validator.py) na korpusie syntetycznych CV.
+
+Porównuje poprzednią implementację (kilkukrotne lower(), osobne wyszukiwanie każdego
+słowa kluczowego i nieskompilowanych wzorców) z jednym przebiegiem skompilowanego
+skanera oraz validate_many. Sprawdza też zgodność wyników obu implementacji.
+
+Użycie: python benchmarks/bench_cv_validator.py [--corpus 500] [--repeat 5]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cv_validator import CVValidator
+
+HEADER = "{name}\n{email} | {phone}\nlinkedin.com/in/{login}\n"
+SECTIONS = {
+    'summary': "PODSUMOWANIE\nAnalityk z {years}-letnim doświadczeniem w raportowaniu i automatyzacji.\n",
+    'experience': ("DOŚWIADCZENIE ZAWODOWE\n" + "{role}, Firma {n} Sp. z o.o. ({start} - {end})\n"
+                   "- Projektowanie raportów w Power BI i automatyzacja procesów ETL w Pythonie\n"
+                   "- Optymalizacja zapytań SQL na bazie PostgreSQL, współpraca z działem sprzedaży\n"),
+    'education': "WYKSZTAŁCENIE\nSzkoła Główna Handlowa, Metody ilościowe w ekonomii (2014 - 2019)\n",
+    'skills': "UMIEJĘTNOŚCI\nPython, pandas, SQL, Power BI, Excel, komunikacja, praca zespołowa\n",
+    'interests': "ZAINTERESOWANIA\nBieganie, szachy, fotografia\n",
+}
+NOISE = ['lorem ipsum dolor', 'John Doe', 'example@example.com', 'placeholder', '']
+
+
+def build_corpus(size, seed=7):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        parts = [HEADER.format(name=f"Kandydat {i}",
+                               email=rng.choice([f"k{i}@mail.pl", "brak", f"kontakt.{i}@firma.com"]),
+                               phone=rng.choice(["+48 600 700 800", "600-700-800", "tel. do ustalenia"]),
+                               login=f"k{i}")]
+        for name, template in SECTIONS.items():
+            if rng.random() < 0.85:
+                repeat = rng.randint(1, 8) if name == 'experience' else 1
+                parts.append(''.join(template.format(years=rng.randint(1, 20), role='Data Analyst', n=j,
+                                                     start=f"0{rng.randint(1, 9)}.20{rng.randint(10, 19)}",
+                                                     end='obecnie') for j in range(repeat)))
+        parts.append(rng.choice(NOISE))
+        rng.shuffle(parts[1:])
+        corpus.append('\n'.join(parts))
+    return corpus
+
+
+class LegacyCVValidator(CVValidator):
+    """Poprzednia implementacja sprawdzeń (przed skanerem jednoprzebiegowym)"""
+
+    def validate_cv(self, cv_text):
+        results = {'is_valid': True, 'warnings': [], 'errors': [], 'suggestions': [], 'quality_score': 0}
+        if len(cv_text) < self.min_length:
+            results['errors'].append(f"CV jest zbyt krótkie ({len(cv_text)} znaków). Minimum: {self.min_length}")
+            results['is_valid'] = False
+        elif len(cv_text) > self.max_length:
+            results['warnings'].append(f"CV jest bardzo długie ({len(cv_text)} znaków). Może być trudne do przetworzenia.")
+
+        text_lower = cv_text.lower()
+        missing = []
+        if not any(s in text_lower for s in ['doświadczenie', 'experience', 'praca zawodowa']):
+            missing.append("Doświadczenie zawodowe")
+        if not any(s in text_lower for s in ['wykształcenie', 'education', 'edukacja']):
+            missing.append("Wykształcenie")
+        if missing:
+            results['warnings'].append(f"Brakuje sekcji: {', '.join(missing)}")
+
+        text_lower = cv_text.lower()
+        found = [p for p in self.suspicious_patterns if re.search(p, text_lower, re.IGNORECASE)]
+        if found:
+            results['warnings'].append(f"Wykryto podejrzane wzorce: {', '.join(found)}")
+
+        if not re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', cv_text):
+            results['suggestions'].append("Dodaj adres email")
+        if not re.search(r'(\+48\s?)?[\d\s\-\(\)]{9,15}', cv_text):
+            results['suggestions'].append("Dodaj numer telefonu")
+
+        results['quality_score'] = self._calculate_quality_score(cv_text, results)
+        return results
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.corpus)
+    legacy, validator = LegacyCVValidator(), CVValidator()
+
+    before = timed(lambda: [legacy.validate_cv(cv) for cv in corpus], args.repeat)
+    after = timed(lambda: validator.validate_many(corpus), args.repeat)
+
+    per_cv = lambda seconds: seconds / len(corpus) * 1e6
+    avg_len = sum(map(len, corpus)) / len(corpus)
+    print(f"korpus: {len(corpus)} CV, średnio {avg_len:.0f} znaków")
+    print(f"{'implementacja':<14} {'µs/CV':>10} {'CV/s':>10}")
+    print(f"{'legacy':<14} {per_cv(before):>10.1f} {len(corpus) / before:>10.0f}")
+    print(f"{'validate_many':<14} {per_cv(after):>10.1f} {len(corpus) / after:>10.0f}")
+    print(f"speedup: {before / after:.2f}x")
+
+    differences = sum(legacy.validate_cv(cv) != result for cv, result in zip(corpus, validator.validate_many(corpus)))
+    print(f"różne wyniki: {differences}/{len(corpus)}")
+
+
+if __name__ == '__main__':
+    main()
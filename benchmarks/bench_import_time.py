@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Pomiar czasu zimnego startu aplikacji (import app.py) na podstawie `python -X importtime`.
+
+Wypisuje najdroższe pakiety (czas własny zsumowany po pakiecie najwyższego poziomu),
+całkowity czas importu oraz sprawdza budżet startu i to, czy ciężkie biblioteki
+(ładowane leniwie przy pierwszym użyciu) nie wróciły do ścieżki importu.
+Kod wyjścia 1 przy przekroczeniu budżetu.
+
+Użycie: python benchmarks/bench_import_time.py [--runs 5] [--top 15] [--budget-ms 600]
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Docelowy budżet importu app.py (ms) - przed leniwymi importami było to ~900 ms
+STARTUP_BUDGET_MS = 600
+
+# Biblioteki, które mają być importowane dopiero przy pierwszym użyciu
+LAZY_MODULES = ('stripe', 'reportlab', 'bs4', 'PyPDF2', 'docx', 'PIL', 'cryptography', 'requests')
+
+
+def run_importtime():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_import.db')}")
+    env.setdefault('RATELIMIT_STORAGE_URL', 'memory://')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Import app.py nie powiódł się:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # "import time:   self [us] | cumulative | imported package"
+        self_part, cumulative_part, name = line.split('|', 2)
+        modules.append((name.strip(), int(self_part.split(':')[1]), int(cumulative_part)))
+    return modules
+
+
+def summarize(modules):
+    total_ms = next(cum for name, _, cum in modules if name == 'app') / 1000
+    per_package = defaultdict(int)
+    for name, self_us, _ in modules:
+        per_package[name.split('.')[0]] += self_us
+    imported = {name.split('.')[0] for name, _, _ in modules}
+    return total_ms, per_package, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    # Najlepszy z kilku przebiegów - pierwszy często płaci za zimny cache dysku
+    runs = [summarize(run_importtime()) for _ in range(args.runs)]
+    total_ms, per_package, imported = min(runs, key=lambda r: r[0])
+
+    print(f"{'pakiet':<28} {'czas własny ms':>15}")
+    for package, self_us in sorted(per_package.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"{package:<28} {self_us / 1000:>15.1f}")
+
+    print(f"\nimport app: {total_ms:.0f} ms (najlepszy z {args.runs}), budżet {args.budget_ms:.0f} ms")
+
+    eager = sorted(m for m in LAZY_MODULES if m in imported)
+    if eager:
+        print(f"Importowane przy starcie, choć powinny być leniwe: {', '.join(eager)}")
+
+    if total_ms > args.budget_ms or eager:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
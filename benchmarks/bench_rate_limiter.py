@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark rate limitera - liczba decyzji na sekundę dla każdego backendu.
+
+Użycie: python benchmarks/bench_rate_limiter.py [--decisions 20000] [--keys 1000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_limiter import RateLimiter, MemoryBackend, SQLBackend
+
+
+def run(limiter, decisions, keys):
+    start = time.perf_counter()
+    allowed = 0
+    for i in range(decisions):
+        if limiter.hit(f"bench_{i % keys}", 'general').allowed:
+            allowed += 1
+    elapsed = time.perf_counter() - start
+    return decisions / elapsed, allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--decisions', type=int, default=20000)
+    parser.add_argument('--keys', type=int, default=1000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_ratelimit.db')
+    backends = {
+        'memory': MemoryBackend(),
+        'sqlite': SQLBackend(f"sqlite:///{db_path}"),
+    }
+    if os.environ.get('BENCH_POSTGRES_URL'):
+        backends['postgres'] = SQLBackend(os.environ['BENCH_POSTGRES_URL'])
+
+    print(f"{'backend':<10} {'decisions/s':>14} {'allowed':>10}")
+    for name, backend in backends.items():
+        rate, allowed = run(RateLimiter(backend), args.decisions, args.keys)
+        print(f"{name:<10} {rate:>14,.0f} {allowed:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Benchmark i fuzzing parsera odpowiedzi LLM (utils/response_parser.py).
+
+Korpus: zapisane odpowiedzi modelu (--corpus plik.jsonl, w każdej linii {"response": "..."})
+albo syntetyczne odpowiedzi odtwarzające spotykane formy: czysty JSON, blok ```json```,
+tekst przed i po obiekcie, przecinki przed nawiasem, surowe nowe linie w łańcuchach,
+ucięta odpowiedź, nawiasy w treści CV. Porównuje skuteczność i czas z dotychczasowym
+podejściem (zachłanny regex \\{.*\\} + json.loads), a fuzzing sprawdza, że losowo uszkodzone
+odpowiedzi kończą się wynikiem albo ResponseParseError - nigdy innym wyjątkiem.
+
+Użycie: python benchmarks/bench_response_parser.py [--size 10000] [--fuzz 20000] [--corpus plik.jsonl]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.response_parser import JSONScanner, ResponseParseError, extract_json
+
+CV_LINES = [
+    "Data Analyst, Firma {n} Sp. z o.o. (2019 - obecnie)",
+    "- Raporty w Power BI {{KPI}} dla zarządu, automatyzacja w Pythonie",
+    "- Optymalizacja zapytań SQL [PostgreSQL], skrócenie czasu o 40%",
+    "WYKSZTAŁCENIE: SGH \"Metody ilościowe\" (2014 - 2019)",
+]
+
+
+def legacy_parse(text):
+    """Dotychczasowe parsowanie (parse_ai_json_response / analyze_job_posting)"""
+    if '```json' in text:
+        start = text.find('```json') + 7
+        end = text.find('```', start)
+        if end != -1:
+            return json.loads(text[start:end].strip())
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        raise ValueError("brak JSON")
+    return json.loads(match.group())
+
+
+def make_payload(rng, size):
+    cv = '\n'.join(rng.choice(CV_LINES).format(n=i) for i in range(size))
+    return {
+        'optimized_cv': cv,
+        'improvements_made': [f"Poprawa {i}: lepsze czasowniki akcji" for i in range(rng.randint(1, 6))],
+        'ats_optimization': {'keyword_density': rng.randint(0, 100), 'structure_score': rng.randint(0, 100)},
+        'success_probability': f"{rng.randint(10, 95)}%",
+    }
+
+
+def trailing_commas(text):
+    # Przecinek przed każdym nawiasem zamykającym (w json.dumps z wcięciem stoją w osobnych liniach)
+    return re.sub(r'\n(\s*)([}\]])', r',\n\1\2', text)
+
+
+def raw_newlines(payload):
+    # Model wstawia prawdziwe znaki nowej linii w łańcuchy zamiast \n
+    return json.dumps(payload, ensure_ascii=False, indent=2).replace('\\n', '\n')
+
+
+def truncated(text, rng):
+    return text[:rng.randint(len(text) // 2, len(text) - 2)]
+
+
+VARIANTS = {
+    'czysty JSON': lambda p, rng: json.dumps(p, ensure_ascii=False, indent=2),
+    'blok ```json```': lambda p, rng: f"Oto wynik:\n```json\n{json.dumps(p, ensure_ascii=False, indent=2)}\n```\nPowodzenia!",
+    'tekst wokół': lambda p, rng: f"Analiza {{wstęp}}:\n{json.dumps(p, ensure_ascii=False)}\nUwagi: użyj {{nawiasów}} ostrożnie.",
+    'przecinki przed }': lambda p, rng: trailing_commas(json.dumps(p, ensure_ascii=False, indent=2)),
+    'surowe \\n w łańcuchach': lambda p, rng: raw_newlines(p),
+    'ucięta odpowiedź': lambda p, rng: truncated(json.dumps(p, ensure_ascii=False, indent=2), rng),
+}
+
+
+def build_corpus(size, seed=11):
+    rng = random.Random(seed)
+    names = list(VARIANTS)
+    corpus = []
+    for i in range(size):
+        name = names[i % len(names)]
+        # Co setna odpowiedź duża (długie CV) - tu zachłanny regex płaci za nawroty
+        payload = make_payload(rng, 400 if i % 100 == 0 else rng.randint(5, 40))
+        corpus.append((name, VARIANTS[name](payload, rng), payload))
+    return corpus
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [('zapisane', json.loads(line)['response'], None) for line in f if line.strip()]
+
+
+def run(parser, corpus):
+    ok = {}
+    start = time.perf_counter()
+    for name, text, _ in corpus:
+        try:
+            value = parser(text)
+            ok[name] = ok.get(name, 0) + isinstance(value, dict)
+        except (ValueError, ResponseParseError):
+            ok.setdefault(name, 0)
+    return ok, time.perf_counter() - start
+
+
+def check_streaming(corpus, rng):
+    """Przyrostowy skaner na losowo pociętych odpowiedziach daje te same obiekty co jednym kawałkiem"""
+    mismatches = 0
+    for _, text, _ in corpus[:2000]:
+        whole = JSONScanner().feed(text)
+        scanner, found, pos = JSONScanner(), [], 0
+        while pos < len(text):
+            step = rng.randint(1, 64)
+            found += scanner.feed(text[pos:pos + step])
+            pos += step
+        mismatches += found != whole
+    return mismatches
+
+
+def fuzz(corpus, iterations, rng):
+    alphabet = '{}[]",:\\\n ' + 'abc'
+    crashes = 0
+    slowest = 0.0
+    for _ in range(iterations):
+        text = list(rng.choice(corpus)[1])
+        for _ in range(rng.randint(1, 8)):
+            op = rng.random()
+            pos = rng.randrange(len(text) + 1)
+            if op < 0.4:
+                text.insert(pos, rng.choice(alphabet))
+            elif op < 0.8 and text:
+                del text[min(pos, len(text) - 1)]
+            else:
+                text = text[:pos]
+        text = ''.join(text)
+        start = time.perf_counter()
+        try:
+            extract_json(text)
+        except ResponseParseError:
+            pass
+        except Exception as e:  # noqa: BLE001 - każdy inny wyjątek to błąd parsera
+            crashes += 1
+            print(f"  wyjątek {type(e).__name__}: {e} dla {text[:80]!r}")
+        slowest = max(slowest, time.perf_counter() - start)
+    return crashes, slowest
+
+
+def pathological(size):
+    """Wiele otwartych nawiasów bez zamknięcia - zachłanny regex ma tu złożoność kwadratową"""
+    text = 'Uwagi: ' + '{ punkt ' * size
+    timings = []
+    for parser in (legacy_parse, extract_json):
+        start = time.perf_counter()
+        try:
+            parser(text)
+        except (ValueError, ResponseParseError):
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--fuzz', type=int, default=20000)
+    parser.add_argument('--corpus', help='zapisane odpowiedzi (JSONL z polem "response")')
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus(args.size)
+    total_chars = sum(len(text) for _, text, _ in corpus)
+    print(f"korpus: {len(corpus)} odpowiedzi, {total_chars / 1e6:.1f} mln znaków")
+
+    legacy_ok, legacy_time = run(legacy_parse, corpus)
+    new_ok, new_time = run(extract_json, corpus)
+    print(f"\n{'wariant':<24} {'legacy':>8} {'nowy':>8} {'z':>6}")
+    for name in sorted(new_ok):
+        count = sum(1 for n, _, _ in corpus if n == name)
+        print(f"{name:<24} {legacy_ok.get(name, 0):>8} {new_ok[name]:>8} {count:>6}")
+    print(f"{'razem':<24} {sum(legacy_ok.values()):>8} {sum(new_ok.values()):>8} {len(corpus):>6}")
+    print(f"czas: legacy {legacy_time * 1e3:.0f} ms, nowy {new_time * 1e3:.0f} ms "
+          f"({new_time / len(corpus) * 1e6:.0f} µs/odpowiedź)")
+
+    if not args.corpus:
+        exact = sum(extract_json(text) == payload for name, text, payload in corpus
+                    if name not in ('ucięta odpowiedź', 'surowe \\n w łańcuchach'))
+        print(f"wyniki zgodne z oryginałem (bez uciętych): {exact}")
+
+    print(f"\nstreaming: różnice po pocięciu na fragmenty: {check_streaming(corpus, rng)}")
+    for size in (2000, 8000):
+        legacy_t, new_t = pathological(size)
+        print(f"{size} otwartych nawiasów: legacy {legacy_t * 1e3:.0f} ms, nowy {new_t * 1e3:.1f} ms")
+
+    crashes, slowest = fuzz(corpus, args.fuzz, rng)
+    print(f"fuzzing: {args.fuzz} uszkodzonych odpowiedzi, nieobsłużone wyjątki: {crashes}, "
+          f"najwolniejsza: {slowest * 1e3:.1f} ms")
+    return 1 if crashes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark skanowania podejrzanych wzorców w SecurityMiddleware na realistycznych danych CV.
+
+Porównuje poprzednią pętlę (lower() + wyszukiwanie osobno dla każdego wzorca)
+z jednym skompilowanym wyrażeniem skanującym ograniczony prefiks.
+
+Użycie: python benchmarks/bench_security_scan.py [--iterations 2000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.security_middleware import SecurityMiddleware
+
+CV_SECTION = """
+DOŚWIADCZENIE ZAWODOWE
+Senior Data Analyst, ABC Sp. z o.o., Warszawa (03.2020 - obecnie)
+- Projektowanie raportów w Power BI i automatyzacja procesów ETL w Pythonie
+- Optymalizacja zapytań SQL (SELECT, JOIN, agregacje) na bazie PostgreSQL
+- Współpraca z działem sprzedaży przy analizie lejka konwersji
+- Description of dashboards for management, update of KPI definitions
+
+WYKSZTAŁCENIE
+Szkoła Główna Handlowa, Metody ilościowe w ekonomii (2014 - 2019)
+
+UMIEJĘTNOŚCI
+Python, pandas, SQL, Power BI, Excel, JavaScript, komunikacja, praca zespołowa
+"""
+
+
+def build_payloads():
+    cv_text = "Jan Kowalski\njan.kowalski@email.pl | +48 600 700 800\n" + CV_SECTION * 8
+    return [
+        {'cv_text': cv_text, 'job_description': CV_SECTION * 2, 'selected_option': 'optimize', 'language': 'pl'},
+        {'cv_text': cv_text[:2000], 'job_url': 'https://www.pracuj.pl/praca/analityk', 'selected_option': 'cv_score'},
+    ]
+
+
+def legacy_scan(patterns, data):
+    found = []
+    for key, value in data.items():
+        if isinstance(value, str):
+            for pattern in patterns:
+                if pattern.lower() in value.lower():
+                    found.append((key, pattern))
+    return found
+
+
+def compiled_scan(middleware, data):
+    found = []
+    for key, value in data.items():
+        if isinstance(value, str):
+            found.extend((key, p) for p in middleware.find_suspicious_patterns(value))
+    return found
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    middleware = SecurityMiddleware()
+    payloads = build_payloads()
+
+    print(f"{'payload':<10} {'size':>8} {'legacy µs':>12} {'compiled µs':>12} {'speedup':>8}")
+    for i, payload in enumerate(payloads):
+        size = sum(len(v) for v in payload.values())
+        legacy = timed(lambda: legacy_scan(middleware.suspicious_patterns, payload), args.iterations)
+        compiled = timed(lambda: compiled_scan(middleware, payload), args.iterations)
+        print(f"{i:<10} {size:>8} {legacy:>12.1f} {compiled:>12.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test spójności stemmingu dopasowania słów kluczowych (utils/keyword_matcher.py).
+
+1. Wszystkie formy fleksyjne jednego słowa muszą dawać ten sam rdzeń.
+2. Odmienione frazy ze słownika umiejętności (np. "w uczeniu maszynowym") muszą być
+   rozpoznane jako ta sama umiejętność co forma z oferty ("uczenie maszynowe").
+3. found/missing zawierają tylko nazwy umiejętności albo formy z treści oferty -
+   nigdy odmienione słowa z CV.
+4. Umiejętności łączone '/' lub '.' ("Python/Django") są dzielone, a znane terminy
+   (ci/cd, pl/sql, node.js) zostają jednym tokenem.
+
+Użycie: python benchmarks/check_keyword_stems.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.keyword_matcher import SKILL_SYNONYMS, KeywordMatcher, stem, tokenize
+
+INFLECTIONS = [
+    'uczenie uczenia uczeniu uczeniem uczeniach',
+    'maszynowy maszynowa maszynowe maszynowego maszynowemu maszynowym maszynowej maszynową maszynowych maszynowymi',
+    'zarządzanie zarządzania zarządzaniu zarządzaniem',
+    'programowanie programowania programowaniu programowaniem',
+    'doświadczenie doświadczenia doświadczeniu doświadczeniem',
+    'analiza analizy analizie analizę analizą',
+    'komunikacja komunikacji komunikację komunikacją',
+    'umiejętność umiejętności umiejętnością umiejętnościami umiejętnościach',
+    'angielski angielskiego angielskiemu angielskim angielska angielskiej angielską angielskie angielskich',
+    'projekt projektu projekty projektów projektami projektach projektem',
+    'klient klienta klientów klientami klientem klientom',
+    'język języka języku językiem',
+    'sprzedaż sprzedaży sprzedażą',
+    'obsługa obsługi obsługę obsługą',
+    'zespół zespołu zespołem zespołowi zespołów',
+    'metodyki metodykach metodykami',
+    'zwinne zwinnych zwinnymi zwinnym',
+    'księgowość księgowości księgowością',
+    'przywództwo przywództwa przywództwem',
+]
+
+# (fragment CV, fragment oferty, umiejętność, która ma być znaleziona)
+PHRASES = [
+    ('Doświadczenie w uczeniu maszynowym i Python', 'Wymagane: uczenie maszynowe, Python', 'Machine Learning'),
+    ('Odpowiadałem za zarządzanie projektami IT', 'Doświadczenie w zarządzaniu projektami', 'Project Management'),
+    ('Biegła znajomość języka angielskiego', 'Wymagany język angielski', 'English'),
+    ('Praca w metodykach zwinnych', 'Znajomość metodyk zwinnych', 'Agile/Scrum'),
+    ('Kierowałem zespołem 5 osób - zarządzanie zespołem', 'Doświadczenie w zarządzaniu zespołem', 'Leadership'),
+    ('Prowadzenie analizy danych sprzedażowych', 'Analiza danych', 'Data Analysis'),
+    ('Programista Python, Django, SQL; angielski B2',
+     'Wymagana znajomość Python/Django, SQL/NoSQL oraz języka angielskiego.', 'Python'),
+    ('Programista Python, Django, SQL; angielski B2',
+     'Wymagana znajomość Python/Django, SQL/NoSQL oraz języka angielskiego.', 'SQL'),
+]
+
+# (tekst, oczekiwane tokeny)
+JOINED = [
+    ('Python/Django, SQL/NoSQL', ['python', 'django', 'sql', 'nosql']),
+    ('Vue.js. Excel.', ['vue', 'js', 'excel']),
+    ('CI/CD, PL/SQL, T-SQL, Node.js, React.js', ['ci/cd', 'pl/sql', 't-sql', 'node.js', 'react.js']),
+]
+
+
+def check_inflections():
+    failures = []
+    for line in INFLECTIONS:
+        forms = line.split()
+        stems = {form: stem(form) for form in forms}
+        if len(set(stems.values())) != 1:
+            failures.append(', '.join(f"{form}->{s}" for form, s in stems.items()))
+    return failures
+
+
+def check_phrases(matcher):
+    failures = []
+    canonical = set(SKILL_SYNONYMS)
+    for cv_text, job_text, skill in PHRASES:
+        result = matcher.match(cv_text, job_text)
+        if skill not in result.found:
+            failures.append(f"{skill!r} nieznalezione: CV {cv_text!r}, oferta {job_text!r} -> {result}")
+        job_tokens = set(tokenize(job_text))
+        for term in result.found + result.missing:
+            if term not in canonical and term not in job_tokens:
+                failures.append(f"{term!r} nie pochodzi z oferty ani słownika (CV {cv_text!r})")
+    return failures
+
+
+def check_joined():
+    failures = []
+    for text, expected in JOINED:
+        tokens = tokenize(text)
+        if tokens != expected:
+            failures.append(f"{text!r} -> {tokens}, oczekiwano {expected}")
+    return failures
+
+
+def main():
+    # Bez wątku korpusu - wagi to samo TF, wynik nie zależy od bazy
+    matcher = KeywordMatcher()
+    matcher.start_refresher = lambda: None
+
+    failures = check_inflections() + check_phrases(matcher) + check_joined()
+    for failure in failures:
+        print(f"BŁĄD  {failure}")
+    total = len(INFLECTIONS) + len(PHRASES) + len(JOINED)
+    print(f"{len(INFLECTIONS)} zestawów form, {len(PHRASES)} fraz, {len(JOINED)} tokenizacji; błędów: {len(failures)} (sprawdzeń: {total})")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test "golden output" silnika układu CV (utils/cv_templates.py).
+
+Renderuje każdy zarejestrowany szablon dla zestawu danych testowych w trybie
+deterministycznym reportlab (rl_config.invariant) i porównuje sha256 PDF-ów
+z zapisanymi w benchmarks/golden/cv_templates.json. Każde renderowanie jest
+powtarzane, żeby wykryć wpływ cache akapitów na wynik.
+
+Po zamierzonej zmianie wyglądu szablonu: podbij jego wersję w register_layout
+i zaktualizuj plik poleceniem --update.
+
+Użycie: python benchmarks/check_pdf_golden.py [--update]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reportlab
+from reportlab import rl_config
+
+rl_config.invariant = 1
+
+from utils.cv_templates import TEMPLATE_REGISTRY, PREWARM_CV_DATA, cv_template_generator
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'cv_templates.json')
+
+FIXTURES = {
+    'full': {
+        'firstName': 'Anna',
+        'lastName': 'Nowak',
+        'jobTitle': 'Senior Data Analyst',
+        'email': 'anna.nowak@email.pl',
+        'phone': '+48 600 700 800',
+        'city': 'Kraków',
+        'linkedin': 'linkedin.com/in/annanowak',
+        'summary': 'Analityczka danych z 8-letnim doświadczeniem w raportowaniu, automatyzacji ETL '
+                   'i budowie dashboardów dla zarządu. ' * 3,
+        'experiences': [{
+            'title': f'Data Analyst {i}',
+            'company': f'Firma {i} Sp. z o.o.',
+            'startDate': f'{2015 + i}-01',
+            'endDate': f'{2016 + i}-12',
+            'description': 'Projektowanie raportów w Power BI, optymalizacja zapytań SQL, '
+                           'automatyzacja procesów w Pythonie.',
+        } for i in range(6)],
+        'education': [{
+            'degree': 'Metody ilościowe w ekonomii',
+            'school': 'Szkoła Główna Handlowa',
+            'startYear': '2010',
+            'endYear': '2015',
+        }],
+        'skills': 'Python, pandas, SQL, Power BI, Excel, dbt, Airflow, komunikacja, praca zespołowa',
+    },
+    'prewarm': PREWARM_CV_DATA,
+    'name_only': {'firstName': 'Ewa', 'lastName': 'Zięba'},
+    'partial': {
+        'firstName': 'A',
+        'email': 'a@example.com',
+        'linkedin': 'linkedin.com/in/a',
+        'experiences': [{'title': '', 'company': 'X'}, {'company': 'Y', 'startDate': '2020', 'endDate': ''}],
+        'education': [{'school': 'S'}],
+        'skills': ' , a ,,b',
+    },
+    # Wiele stron - akapity dzielone między stronami (split) przy współdzielonym cache
+    'multi_page': {
+        'firstName': 'Piotr',
+        'lastName': 'Wiśniewski',
+        'summary': 'Zażółć gęślą jaźń. ' * 120,
+        'experiences': [{'title': f'Stanowisko {i}', 'company': 'Firma', 'startDate': '2001',
+                         'description': 'Opis obowiązków. ' * 30} for i in range(25)],
+    },
+}
+
+
+def render_hashes():
+    hashes = {}
+    for name, spec in sorted(TEMPLATE_REGISTRY.items()):
+        for fixture, cv_data in FIXTURES.items():
+            first = spec.render(cv_template_generator, cv_data).getvalue()
+            second = spec.render(cv_template_generator, cv_data).getvalue()
+            if first != second:
+                raise SystemExit(f"{name}/{fixture}: powtórne renderowanie dało inny PDF")
+            hashes[f"{name}/{fixture}"] = {
+                'version': spec.version,
+                'sha256': hashlib.sha256(first).hexdigest(),
+            }
+    return hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--update', action='store_true', help='zapisz bieżące wyniki jako wzorzec')
+    args = parser.parse_args()
+
+    hashes = render_hashes()
+
+    if args.update:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump({'reportlab': reportlab.Version, 'outputs': hashes}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Zapisano {len(hashes)} wzorców do {GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH) as f:
+        golden = json.load(f)
+    if golden['reportlab'] != reportlab.Version:
+        print(f"Uwaga: wzorce z reportlab {golden['reportlab']}, zainstalowany {reportlab.Version}")
+
+    failures = [key for key in sorted(set(hashes) | set(golden['outputs']))
+                if hashes.get(key) != golden['outputs'].get(key)]
+    for key in failures:
+        print(f"RÓŻNICA  {key}: oczekiwano {golden['outputs'].get(key)}, jest {hashes.get(key)}")
+    print(f"{len(hashes) - len(failures)}/{len(hashes)} zgodnych")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
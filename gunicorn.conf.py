@@ -27,3 +27,25 @@ proc_name = "cv-optimizer-pro"
 
 # Memory management
 worker_tmp_dir = "/dev/shm"
+
+
+def post_fork(server, worker):
+    # Uruchom i rozgrzej procesy renderujące PDF zanim przyjdzie pierwszy request
+    from utils.pdf_renderer import pdf_renderer
+    pdf_renderer.prewarm()
+
+    # Tabela IDF słów kluczowych budowana w tle od startu workera, nie w pierwszym requeście
+    from utils.keyword_matcher import keyword_matcher
+    keyword_matcher.start_refresher()
+
+
+def worker_exit(server, worker):
+    # Zapisz zdarzenia analityczne z kolejki workera przed jego zakończeniem
+    from utils.analytics import analytics
+    analytics.shutdown()
+
+    from utils.pdf_renderer import pdf_renderer
+    pdf_renderer.shutdown()
+
+    from utils.recruiter_batch import recruiter_batch
+    recruiter_batch.shutdown()
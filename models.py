@@ -101,7 +101,7 @@ class CVUpload(db.Model):
     __tablename__ = 'cv_uploads'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     original_text = db.Column(db.Text, nullable=False)
     job_title = db.Column(db.String(200))
@@ -118,7 +118,7 @@ class AnalysisResult(db.Model):
     __tablename__ = 'analysis_results'
     
     id = db.Column(db.Integer, primary_key=True)
-    cv_upload_id = db.Column(db.Integer, db.ForeignKey('cv_uploads.id'), nullable=False)
+    cv_upload_id = db.Column(db.Integer, db.ForeignKey('cv_uploads.id'), nullable=False, index=True)
     analysis_type = db.Column(db.String(50), nullable=False)
     result_data = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -132,3 +132,82 @@ class AnalysisResult(db.Model):
     
     def __repr__(self):
         return f'<AnalysisResult {self.analysis_type}>'
+
+class CVFingerprint(db.Model):
+    __tablename__ = 'cv_fingerprints'
+    
+    cv_upload_id = db.Column(db.Integer, db.ForeignKey('cv_uploads.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # MinHash, 64 x uint32
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CVFingerprint {self.cv_upload_id}>'
+
+class CVFingerprintBand(db.Model):
+    __tablename__ = 'cv_fingerprint_bands'
+    
+    band_key = db.Column(db.BigInteger, primary_key=True)  # Hash pasma LSH (z user_id)
+    cv_upload_id = db.Column(db.Integer, db.ForeignKey('cv_uploads.id', ondelete='CASCADE'), primary_key=True)
+    
+    def __repr__(self):
+        return f'<CVFingerprintBand {self.band_key} {self.cv_upload_id}>'
+
+class SessionRecord(db.Model):
+    __tablename__ = 'server_sessions'
+    
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<SessionRecord {self.id[:8]}>'
+
+class AnalyticsEvent(db.Model):
+    __tablename__ = 'analytics_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    occurred_at = db.Column(db.Float, nullable=False, index=True)  # Unix epoch (sekundy)
+    meta = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<AnalyticsEvent {self.event_type}>'
+
+class AnalyticsDailyCounter(db.Model):
+    __tablename__ = 'analytics_daily_counters'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Integer, primary_key=True)  # Dni od 1970-01-01 (UTC)
+    event_type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    first_score = db.Column(db.Float)
+    last_score = db.Column(db.Float)
+    
+    def __repr__(self):
+        return f'<AnalyticsDailyCounter {self.user_id} {self.day} {self.event_type}>'
+
+class Payment(db.Model):
+    __tablename__ = 'payments'
+    
+    id = db.Column(db.String(255), primary_key=True)  # Stripe PaymentIntent id
+    user_id = db.Column(db.Integer, index=True)
+    service = db.Column(db.String(50))
+    amount = db.Column(db.Integer)  # W groszach
+    currency = db.Column(db.String(3))
+    status = db.Column(db.String(30), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<Payment {self.id} {self.status}>'
+
+class BootstrapStep(db.Model):
+    __tablename__ = 'bootstrap_steps'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<BootstrapStep {self.name} v{self.version}>'
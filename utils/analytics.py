@@ -1,65 +1,347 @@
-
-from datetime import datetime, timedelta
-from collections import defaultdict
+import os
 import json
-
+import time
+import queue
+import logging
+import threading
+from array import array
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+SCORED_EVENT_TYPE = 'cv_optimization'
+
+
+def epoch_day(timestamp):
+    """Numer dnia (UTC) od 1970-01-01"""
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+class EventBuffer:
+    """Kolumnowy bufor zdarzeń oczekujących na zapis: epoch, user_id i id typu w tablicach"""
 
-class AnalyticsTracker:
     def __init__(self):
-        self.events = defaultdict(list)
-    
+        self.clear()
+
+    def clear(self):
+        self.timestamps = array('d')
+        self.user_ids = array('q')
+        self.type_ids = array('H')
+        self.metadata = []
+
+    def append(self, timestamp, user_id, type_id, metadata):
+        self.timestamps.append(timestamp)
+        self.user_ids.append(user_id)
+        self.type_ids.append(type_id)
+        self.metadata.append(metadata)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class AnalyticsTracker:
+    def __init__(self, retention_days=90, flush_interval=30, flush_batch_size=500, queue_size=10000):
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.dropped_events = 0
+
+        # Ograniczona kolejka per worker - track_event nigdy nie blokuje requestu
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._type_ids = {}
+        self._type_names = []
+        self._buffer = EventBuffer()
+        # Zagregowane dzienne liczniki jeszcze niezapisane do bazy: user_id -> day -> type_id -> [count, first, last]
+        self._daily = defaultdict(lambda: defaultdict(dict))
+        self._last_flush = time.time()
+        self._last_retention = 0.0
+        self._app = None
+
+    def init_app(self, app):
+        """Włącz okresowy zapis do bazy danych (bez init_app dane zostają tylko w pamięci)"""
+        self.retention_days = app.config.get('ANALYTICS_RETENTION_DAYS', self.retention_days)
+        self.flush_interval = app.config.get('ANALYTICS_FLUSH_INTERVAL', self.flush_interval)
+        self._queue = queue.Queue(maxsize=app.config.get('ANALYTICS_QUEUE_SIZE', self._queue.maxsize))
+        self._app = app
+
+    def _intern(self, event_type):
+        type_id = self._type_ids.get(event_type)
+        if type_id is None:
+            type_id = self._type_ids[event_type] = len(self._type_names)
+            self._type_names.append(event_type)
+        return type_id
+
     def track_event(self, user_id, event_type, metadata=None):
-        """Track user event"""
-        event = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'event_type': event_type,
-            'metadata': metadata or {}
-        }
-        self.events[user_id].append(event)
-    
+        """Track user event - bez bazy danych w ścieżce requestu (kolejka + wątek w tle)"""
+        now = time.time()
+        if self._app is None:
+            self._ingest(now, user_id, event_type, metadata)
+            return
+
+        self._ensure_flusher()
+        try:
+            self._queue.put_nowait((now, user_id, event_type, metadata))
+        except queue.Full:
+            # Backpressure: przy pełnej kolejce zdarzenie jest odrzucane, request nie czeka
+            self.dropped_events += 1
+            metrics.inc('analytics_events_dropped_total')
+            if self.dropped_events % 1000 == 1:
+                logger.warning(f"Kolejka analityki pełna - odrzucono już {self.dropped_events} zdarzeń")
+
+    def _ingest(self, now, user_id, event_type, metadata):
+        """Dopisz zdarzenie do bufora kolumnowego i dziennych liczników"""
+        score = (metadata or {}).get('score') if event_type == SCORED_EVENT_TYPE else None
+
+        with self._lock:
+            type_id = self._intern(event_type)
+            if self._app is not None:
+                self._buffer.append(now, user_id, type_id, metadata)
+
+            entry = self._daily[user_id][epoch_day(now)].get(type_id)
+            if entry is None:
+                self._daily[user_id][epoch_day(now)][type_id] = [1, score, score]
+            else:
+                entry[0] += 1
+                if score is not None:
+                    if entry[1] is None:
+                        entry[1] = score
+                    entry[2] = score
+
+            should_evict = self._app is None and now - self._last_flush >= self.flush_interval
+
+        if should_evict:
+            self._last_flush = now
+            self.evict_expired()
+
+    def _ensure_flusher(self):
+        """Uruchom wątek zapisujący raz na proces (po forku workera gunicorna)"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._stop.clear()
+            threading.Thread(target=self._run_flusher, name='analytics-flusher', daemon=True).start()
+            self._flusher_pid = os.getpid()
+
+    def _drain(self, limit):
+        drained = 0
+        while drained < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._ingest(*item)
+            drained += 1
+        return drained
+
+    def _run_flusher(self):
+        while not self._stop.is_set():
+            timeout = max(0.1, self.flush_interval - (time.time() - self._last_flush))
+            try:
+                self._ingest(*self._queue.get(timeout=timeout))
+                self._drain(self.flush_batch_size)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.error(f"Błąd przetwarzania zdarzenia analitycznego: {e}")
+
+            metrics.set_gauge('analytics_queue_depth', self._queue.qsize())
+            if (len(self._buffer) >= self.flush_batch_size
+                    or time.time() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def shutdown(self):
+        """Zatrzymaj wątek i zapisz wszystko, co zostało w kolejce (wyjście workera gunicorna)"""
+        self._stop.set()
+        while self._drain(self.flush_batch_size):
+            pass
+        return self.flush()
+
     def get_user_stats(self, user_id, days=30):
-        """Get comprehensive user statistics"""
-        user_events = self.events.get(user_id, [])
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        recent_events = [
-            e for e in user_events 
-            if datetime.fromisoformat(e['timestamp']) > cutoff_date
-        ]
-        
+        """Get comprehensive user statistics - O(dni), z dziennych liczników"""
+        first_day = epoch_day(time.time()) - days
+        daily = self._load_daily(user_id, first_day)
+
+        totals = defaultdict(int)
+        weekday_counts = defaultdict(int)
+        first_score = last_score = None
+        for day in sorted(daily):
+            day_total = 0
+            for event_type, (count, day_first, day_last) in daily[day].items():
+                totals[event_type] += count
+                day_total += count
+                if event_type == SCORED_EVENT_TYPE and day_first is not None:
+                    if first_score is None:
+                        first_score = day_first
+                    last_score = day_last
+            weekday_counts[datetime.utcfromtimestamp(day * SECONDS_PER_DAY).strftime('%A')] += day_total
+
         stats = {
-            'total_events': len(recent_events),
-            'cv_optimizations': len([e for e in recent_events if e['event_type'] == 'cv_optimization']),
-            'ai_analyses': len([e for e in recent_events if e['event_type'] == 'ai_analysis']),
-            'cover_letters': len([e for e in recent_events if e['event_type'] == 'cover_letter']),
-            'most_active_day': self._get_most_active_day(recent_events),
-            'improvement_trend': self._calculate_improvement_trend(recent_events)
+            'total_events': sum(totals.values()),
+            'cv_optimizations': totals['cv_optimization'],
+            'ai_analyses': totals['ai_analysis'],
+            'cover_letters': totals['cover_letter'],
+            'most_active_day': max(weekday_counts.items(), key=lambda x: x[1])[0] if weekday_counts else None,
+            # Simple trend calculation
+            'improvement_trend': (last_score - first_score) if first_score is not None else 0
         }
-        
+
         return stats
-    
-    def _get_most_active_day(self, events):
-        """Find most active day of the week"""
-        day_counts = defaultdict(int)
-        for event in events:
-            day = datetime.fromisoformat(event['timestamp']).strftime('%A')
-            day_counts[day] += 1
-        
-        return max(day_counts.items(), key=lambda x: x[1])[0] if day_counts else None
-    
-    def _calculate_improvement_trend(self, events):
-        """Calculate improvement trend based on CV scores"""
-        cv_scores = []
-        for event in events:
-            if event['event_type'] == 'cv_optimization' and 'score' in event.get('metadata', {}):
-                cv_scores.append(event['metadata']['score'])
-        
-        if len(cv_scores) < 2:
+
+    def _load_daily(self, user_id, first_day):
+        """Połącz liczniki z bazy (wspólne dla workerów) z jeszcze niezapisanymi w pamięci"""
+        daily = defaultdict(dict)
+
+        if self._app is not None:
+            try:
+                from models import AnalyticsDailyCounter
+                with self._app.app_context():
+                    rows = AnalyticsDailyCounter.query.filter(
+                        AnalyticsDailyCounter.user_id == user_id,
+                        AnalyticsDailyCounter.day >= first_day).all()
+                for row in rows:
+                    daily[row.day][row.event_type] = (row.count, row.first_score, row.last_score)
+            except Exception as e:
+                logger.error(f"Błąd odczytu statystyk analitycznych: {e}")
+
+        with self._lock:
+            pending = {day: dict(types) for day, types in self._daily.get(user_id, {}).items()
+                       if day >= first_day}
+
+        for day, types in pending.items():
+            for type_id, (count, first, last) in types.items():
+                event_type = self._type_names[type_id]
+                stored = daily[day].get(event_type)
+                if stored is None:
+                    daily[day][event_type] = (count, first, last)
+                else:
+                    daily[day][event_type] = (stored[0] + count,
+                                              stored[1] if stored[1] is not None else first,
+                                              last if last is not None else stored[2])
+        return daily
+
+    def flush(self):
+        """Zapisz zbuforowane zdarzenia i dzienne liczniki do bazy jednym batchem"""
+        if self._app is None:
             return 0
-        
-        # Simple trend calculation
-        return cv_scores[-1] - cv_scores[0]
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, EventBuffer()
+            daily, self._daily = self._daily, defaultdict(lambda: defaultdict(dict))
+            type_names = list(self._type_names)
+            self._last_flush = time.time()
+
+        if not len(buffer) and not daily:
+            return 0
+
+        try:
+            with self._app.app_context():
+                self._write(buffer, daily, type_names)
+                self._apply_retention()
+        except Exception as e:
+            logger.error(f"Błąd zapisu danych analitycznych ({len(buffer)} zdarzeń): {e}")
+            self._restore(buffer, daily)
+            return 0
+
+        return len(buffer)
+
+    def _write(self, buffer, daily, type_names):
+        from models import db, AnalyticsEvent, AnalyticsDailyCounter
+
+        events = [{
+            'user_id': buffer.user_ids[i],
+            'event_type': type_names[buffer.type_ids[i]],
+            'occurred_at': buffer.timestamps[i],
+            'meta': json.dumps(buffer.metadata[i], ensure_ascii=False) if buffer.metadata[i] else None,
+        } for i in range(len(buffer))]
+
+        counters = [{
+            'user_id': user_id,
+            'day': day,
+            'event_type': type_names[type_id],
+            'count': count,
+            'first_score': first,
+            'last_score': last,
+        } for user_id, days in daily.items()
+            for day, types in days.items()
+            for type_id, (count, first, last) in types.items()]
+
+        table = AnalyticsDailyCounter.__table__
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        from sqlalchemy import func
+
+        upsert = insert(table)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.event_type],
+            set_={
+                'count': table.c.count + upsert.excluded.count,
+                'first_score': func.coalesce(table.c.first_score, upsert.excluded.first_score),
+                'last_score': func.coalesce(upsert.excluded.last_score, table.c.last_score),
+            })
+
+        with db.engine.begin() as conn:
+            if events:
+                conn.execute(AnalyticsEvent.__table__.insert(), events)
+            if counters:
+                conn.execute(upsert, counters)
+
+    def _apply_retention(self):
+        """Usuń dane starsze niż okno retencji (najwyżej raz na godzinę)"""
+        now = time.time()
+        if now - self._last_retention < 3600:
+            return
+        self._last_retention = now
+
+        from models import db, AnalyticsEvent, AnalyticsDailyCounter
+        cutoff = now - self.retention_days * SECONDS_PER_DAY
+        with db.engine.begin() as conn:
+            conn.execute(AnalyticsEvent.__table__.delete().where(AnalyticsEvent.occurred_at < cutoff))
+            conn.execute(AnalyticsDailyCounter.__table__.delete().where(
+                AnalyticsDailyCounter.day < epoch_day(cutoff)))
+
+    def _restore(self, buffer, daily):
+        """Po nieudanym zapisie przywróć dane do bufora (z zachowaniem limitu retencji)"""
+        cutoff_day = epoch_day(time.time()) - self.retention_days
+        with self._lock:
+            for i in range(len(buffer)):
+                self._buffer.append(buffer.timestamps[i], buffer.user_ids[i],
+                                    buffer.type_ids[i], buffer.metadata[i])
+            for user_id, days in daily.items():
+                for day, types in days.items():
+                    if day < cutoff_day:
+                        continue
+                    for type_id, (count, first, last) in types.items():
+                        entry = self._daily[user_id][day].get(type_id)
+                        if entry is None:
+                            self._daily[user_id][day][type_id] = [count, first, last]
+                        else:
+                            entry[0] += count
+                            entry[1] = first if first is not None else entry[1]
+                            if entry[2] is None:
+                                entry[2] = last
+
+    def evict_expired(self):
+        """Usuń z pamięci dzienne liczniki starsze niż okno retencji"""
+        cutoff_day = epoch_day(time.time()) - self.retention_days
+        with self._lock:
+            for user_id in list(self._daily):
+                days = self._daily[user_id]
+                for day in [d for d in days if d < cutoff_day]:
+                    del days[day]
+                if not days:
+                    del self._daily[user_id]
 
 analytics = AnalyticsTracker()
@@ -0,0 +1,284 @@
+import re
+import logging
+from collections import namedtuple
+
+from utils.cv_validator import cv_validator
+
+logger = logging.getLogger(__name__)
+
+ATSFinding = namedtuple('ATSFinding', ['rule', 'severity', 'message', 'penalty'])
+
+SEVERITY_ORDER = {'critical': 0, 'warning': 1, 'info': 2}
+
+SECTION_LABELS = {
+    'experience': 'Doświadczenie zawodowe',
+    'education': 'Wykształcenie',
+    'skills': 'Umiejętności',
+    'summary': 'Podsumowanie / profil',
+    'languages': 'Języki',
+    'certificates': 'Certyfikaty / kursy',
+    'interests': 'Zainteresowania',
+}
+
+SECTION_LABELS_EN = {
+    'experience': 'Work experience',
+    'education': 'Education',
+    'skills': 'Skills',
+    'summary': 'Summary / profile',
+    'languages': 'Languages',
+    'certificates': 'Certificates / courses',
+    'interests': 'Interests',
+}
+
+# Pełne nazwy miesięcy (PL w mianowniku, dopełniaczu i miejscowniku, EN) i ich standardowe skróty -
+# sam prefiks z dowolną końcówką łapał "Marketing 2020" czy "Junior 2020"
+MONTH_NAMES = (
+    'styczeń', 'stycznia', 'styczniu', 'luty', 'lutego', 'lutym', 'marzec', 'marca', 'marcu',
+    'kwiecień', 'kwietnia', 'kwietniu', 'maj', 'maja', 'maju', 'czerwiec', 'czerwca', 'czerwcu',
+    'lipiec', 'lipca', 'lipcu', 'sierpień', 'sierpnia', 'sierpniu', 'wrzesień', 'września', 'wrześniu',
+    'październik', 'października', 'październiku', 'listopad', 'listopada', 'listopadzie',
+    'grudzień', 'grudnia', 'grudniu',
+    'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september',
+    'october', 'november', 'december',
+)
+MONTH_ABBREVIATIONS = (
+    'sty', 'lut', 'mar', 'kwi', 'cze', 'lip', 'sie', 'wrz', 'paź', 'lis', 'gru',
+    'jan', 'feb', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+)
+MONTHS = rf"(?:{'|'.join(MONTH_NAMES + MONTH_ABBREVIATIONS)})\b\.?"
+
+# Rozpoznawane formaty dat - w jednym CV powinien być użyty jeden
+DATE_FORMATS = {
+    'MM/RRRR': re.compile(r'\b(?:0?[1-9]|1[0-2])/(?:19|20)\d{2}\b'),
+    'MM.RRRR': re.compile(r'\b(?:0?[1-9]|1[0-2])\.(?:19|20)\d{2}\b'),
+    'RRRR-MM': re.compile(r'\b(?:19|20)\d{2}-(?:0[1-9]|1[0-2])\b'),
+    'miesiąc RRRR': re.compile(rf'\b{MONTHS}\s+(?:19|20)\d{{2}}\b', re.IGNORECASE),
+}
+DATE_FORMAT_LABELS_EN = {'MM/RRRR': 'MM/YYYY', 'MM.RRRR': 'MM.YYYY', 'RRRR-MM': 'YYYY-MM',
+                         'miesiąc RRRR': 'month YYYY'}
+YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+
+BULLET_RE = re.compile(r'^\s*(?:[•●▪◦·∙■□➢➤►‣*–-]|\d{1,2}[.)])\s+')
+LINKEDIN_RE = re.compile(r'linkedin\.com/in/', re.IGNORECASE)
+
+# Artefakty ekstrakcji tekstu z PDF (PyPDF2) i znaki, których ATS nie odczyta
+PDF_ARTIFACTS = {
+    'replacement': re.compile('\ufffd'),
+    'cid': re.compile(r'\(cid:\d+\)'),
+    'ligatures': re.compile('[\ufb00-\ufb06]'),
+    'private_use': re.compile('[\ue000-\uf8ff]'),
+    'control': re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]'),
+    'emoji': re.compile('[\u2600-\u27bf\U0001f300-\U0001faff]'),
+    'spaced_letters': re.compile(r'(?:\b\w ){5,}\w\b'),
+    'hyphenation': re.compile(r'[a-ząćęłńóśźż]-\n[a-ząćęłńóśźż]'),
+}
+
+ARTIFACT_LABELS = {
+    'pl': {
+        'replacement': 'nieodczytane znaki (\ufffd)',
+        'cid': 'kody glifów (cid:NN)',
+        'ligatures': 'ligatury (ﬁ, ﬂ)',
+        'private_use': 'znaki z prywatnego obszaru Unicode (ikony fontów)',
+        'control': 'znaki sterujące',
+        'emoji': 'emoji i symbole graficzne',
+        'spaced_letters': 'rozstrzelone litery (np. "D o ś w i a d c z e n i e")',
+        'hyphenation': 'wyrazy przerwane łącznikiem na końcu linii',
+    },
+    'en': {
+        'replacement': 'unreadable characters (\ufffd)',
+        'cid': 'glyph codes (cid:NN)',
+        'ligatures': 'ligatures (ﬁ, ﬂ)',
+        'private_use': 'Unicode private use characters (font icons)',
+        'control': 'control characters',
+        'emoji': 'emoji and pictographic symbols',
+        'spaced_letters': 'spaced-out letters (e.g. "E x p e r i e n c e")',
+        'hyphenation': 'words hyphenated at line ends',
+    },
+}
+
+# Treść ustaleń; język raportu jak język analizy (nieznany -> polski)
+MESSAGES = {
+    'pl': {
+        'missing_section': 'Brak wyraźnego nagłówka sekcji "{label}" - ATS może nie przypisać treści',
+        'missing_summary': 'Brak sekcji podsumowania zawodowego',
+        'interests_first': 'Sekcja zainteresowań znajduje się przed doświadczeniem zawodowym',
+        'missing_email': 'Brak adresu e-mail',
+        'missing_phone': 'Brak numeru telefonu',
+        'missing_linkedin': 'Brak linku do profilu LinkedIn',
+        'mixed_dates': 'Niespójne formaty dat: {formats} - użyj jednego formatu',
+        'missing_dates': 'Brak dat zatrudnienia i nauki',
+        'few_bullets': 'Mało wypunktowań ({bullets} z {lines} linii) - opisz obowiązki i osiągnięcia w punktach',
+        'long_paragraphs': 'Bardzo długie akapity ({count}) - podziel je na krótsze punkty',
+        'artifacts': 'Problematyczne znaki: {label} ({count}x)',
+        'too_short': 'CV jest bardzo krótkie ({words} słów)',
+        'too_long': 'CV jest długie ({words} słów) - rozważ skrócenie do 2 stron',
+        'low_keywords': 'Niskie pokrycie słów kluczowych oferty ({percentage}%), brakuje: {missing}',
+        'partial_keywords': 'Częściowe pokrycie słów kluczowych oferty ({percentage}%), brakuje: {missing}',
+    },
+    'en': {
+        'missing_section': 'No clear "{label}" section heading - an ATS may not assign the content',
+        'missing_summary': 'No professional summary section',
+        'interests_first': 'The interests section comes before work experience',
+        'missing_email': 'No e-mail address',
+        'missing_phone': 'No phone number',
+        'missing_linkedin': 'No LinkedIn profile link',
+        'mixed_dates': 'Inconsistent date formats: {formats} - use a single format',
+        'missing_dates': 'No employment or education dates',
+        'few_bullets': 'Few bullet points ({bullets} of {lines} lines) - list duties and achievements as bullets',
+        'long_paragraphs': 'Very long paragraphs ({count}) - split them into shorter bullets',
+        'artifacts': 'Problematic characters: {label} ({count}x)',
+        'too_short': 'The CV is very short ({words} words)',
+        'too_long': 'The CV is long ({words} words) - consider cutting it to 2 pages',
+        'low_keywords': 'Low coverage of job keywords ({percentage}%), missing: {missing}',
+        'partial_keywords': 'Partial coverage of job keywords ({percentage}%), missing: {missing}',
+    },
+}
+
+
+def section_labels(language='pl'):
+    return SECTION_LABELS_EN if language == 'en' else SECTION_LABELS
+
+
+def _message(language, key, **params):
+    return MESSAGES.get(language, MESSAGES['pl'])[key].format(**params)
+
+
+class ATSChecker:
+    """
+    Regułowa analiza CV pod kątem systemów ATS - szybki pierwszy etap bez LLM.
+    Każda reguła zwraca listę ustaleń z karą punktową; wynik to 100 minus suma kar.
+    """
+
+    def __init__(self, validator=None):
+        self.validator = validator or cv_validator
+        self.rules = [
+            self._check_sections,
+            self._check_contact,
+            self._check_dates,
+            self._check_bullets,
+            self._check_artifacts,
+            self._check_length,
+        ]
+
+    def check(self, cv_text, job_description='', language='pl'):
+        """
+        Ustrukturyzowany wynik: score 0-100, rating 1-10, sekcje, ustalenia (od najważniejszych).
+        Treść ustaleń w języku `language` ('pl', 'en').
+        """
+        lines = cv_text.splitlines()
+        scan = self.validator.scan(cv_text)
+
+        findings = []
+        for rule in self.rules:
+            findings.extend(rule(cv_text, lines, scan, language))
+
+        keyword_coverage = None
+        if job_description:
+            from utils.keyword_matcher import keyword_matcher
+
+            match = keyword_matcher.match(cv_text, job_description)
+            keyword_coverage = {
+                'match_percentage': match.match_percentage,
+                'found_keywords': match.found,
+                'missing_keywords': match.missing,
+            }
+            findings.extend(self._check_keywords(match, language))
+
+        findings.sort(key=lambda f: (SEVERITY_ORDER[f.severity], -f.penalty))
+        score = max(0, 100 - sum(f.penalty for f in findings))
+        return {
+            'score': score,
+            'rating': max(1, round(score / 10)),
+            'sections': {name: name in scan.sections for name in SECTION_LABELS},
+            'keyword_coverage': keyword_coverage,
+            'findings': [f._asdict() for f in findings],
+        }
+
+    def _check_sections(self, cv_text, lines, scan, language):
+        sections = scan.sections
+        findings = []
+        for name in ('experience', 'education', 'skills'):
+            if name not in sections:
+                findings.append(ATSFinding(
+                    'sections', 'critical' if name == 'experience' else 'warning',
+                    _message(language, 'missing_section', label=section_labels(language)[name]),
+                    15 if name == 'experience' else 8))
+        if 'summary' not in sections:
+            findings.append(ATSFinding('sections', 'info', _message(language, 'missing_summary'), 2))
+
+        # Kolejność: doświadczenie przed zainteresowaniami (częsty błąd po ekstrakcji z dwóch kolumn)
+        if 'interests' in sections and 'experience' in sections and sections['interests'] < sections['experience']:
+            findings.append(ATSFinding('sections', 'info', _message(language, 'interests_first'), 2))
+        return findings
+
+    def _check_contact(self, cv_text, lines, scan, language):
+        findings = []
+        if not scan.has_email:
+            findings.append(ATSFinding('contact', 'critical', _message(language, 'missing_email'), 12))
+        if not scan.has_phone:
+            findings.append(ATSFinding('contact', 'warning', _message(language, 'missing_phone'), 6))
+        if not LINKEDIN_RE.search(cv_text):
+            findings.append(ATSFinding('contact', 'info', _message(language, 'missing_linkedin'), 1))
+        return findings
+
+    def _check_dates(self, cv_text, lines, scan, language):
+        used = {name: len(pattern.findall(cv_text)) for name, pattern in DATE_FORMATS.items()}
+        used = {name: count for name, count in used.items() if count}
+        if len(used) > 1:
+            labels = DATE_FORMAT_LABELS_EN if language == 'en' else {}
+            formats = ', '.join(f"{labels.get(name, name)} ({count}x)"
+                                for name, count in sorted(used.items(), key=lambda x: -x[1]))
+            return [ATSFinding('dates', 'warning', _message(language, 'mixed_dates', formats=formats), 6)]
+        if not used and not YEAR_RE.search(cv_text):
+            return [ATSFinding('dates', 'warning', _message(language, 'missing_dates'), 8)]
+        return []
+
+    def _check_bullets(self, cv_text, lines, scan, language):
+        content = [line for line in lines if len(line.strip()) > 3]
+        if len(content) < 10:
+            return []
+        bullets = sum(1 for line in content if BULLET_RE.match(line))
+        findings = []
+        density = bullets / len(content)
+        if density < 0.15:
+            findings.append(ATSFinding(
+                'bullets', 'warning',
+                _message(language, 'few_bullets', bullets=bullets, lines=len(content)), 5))
+        long_lines = sum(1 for line in content if len(line) > 300)
+        if long_lines:
+            findings.append(ATSFinding('bullets', 'info', _message(language, 'long_paragraphs', count=long_lines), 2))
+        return findings
+
+    def _check_artifacts(self, cv_text, lines, scan, language):
+        findings = []
+        labels = ARTIFACT_LABELS.get(language, ARTIFACT_LABELS['pl'])
+        for name, pattern in PDF_ARTIFACTS.items():
+            count = len(pattern.findall(cv_text))
+            if count:
+                findings.append(ATSFinding('characters', 'warning' if count >= 3 else 'info',
+                                           _message(language, 'artifacts', label=labels[name], count=count),
+                                           min(10, 2 + count)))
+        return findings
+
+    def _check_length(self, cv_text, lines, scan, language):
+        words = len(cv_text.split())
+        if words < 150:
+            return [ATSFinding('length', 'warning', _message(language, 'too_short', words=words), 8)]
+        if words > 1200:
+            return [ATSFinding('length', 'info', _message(language, 'too_long', words=words), 3)]
+        return []
+
+    def _check_keywords(self, match, language):
+        missing = ', '.join(match.missing[:8])
+        if match.match_percentage < 50:
+            return [ATSFinding('keywords', 'critical', _message(language, 'low_keywords',
+                                                                percentage=match.match_percentage, missing=missing),
+                               15)]
+        if match.match_percentage < 75:
+            return [ATSFinding('keywords', 'warning', _message(language, 'partial_keywords',
+                                                               percentage=match.match_percentage, missing=missing),
+                               7)]
+        return []
+
+
+ats_checker = ATSChecker()
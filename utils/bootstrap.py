@@ -0,0 +1,110 @@
+import os
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+BootstrapStepSpec = namedtuple('BootstrapStepSpec', ['name', 'version', 'run'])
+
+
+class Bootstrap:
+    """
+    Idempotentne, wersjonowane kroki startowe (schemat, konta startowe, indeksy).
+    Każdy wykonany krok jest zapisywany w tabeli bootstrap_steps z wersją;
+    przy kolejnym starcie krok jest pomijany, dopóki jego wersja się nie zmieni.
+    Gdy wszystko jest aktualne, start kosztuje jedno zapytanie SELECT i żadnego zapisu.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self._completed_pid = None
+
+    def step(self, name, version=1):
+        """Dekorator rejestrujący krok; kroki wykonują się w kolejności rejestracji"""
+        def decorator(fn):
+            self.steps.append(BootstrapStepSpec(name, version, fn))
+            return fn
+        return decorator
+
+    def run(self, app, db):
+        """Wykonaj zaległe kroki; zwraca nazwy wykonanych kroków"""
+        # initialize_app bywa wołane dwukrotnie w jednym procesie (import + create_app)
+        if self._completed_pid == os.getpid():
+            return []
+
+        from models import BootstrapStep
+
+        table = BootstrapStep.__table__
+        applied_now = []
+        with app.app_context():
+            table.create(bind=db.engine, checkfirst=True)
+            with db.engine.connect() as conn:
+                applied = dict(conn.execute(select(table.c.name, table.c.version)).all())
+
+            for spec in self.steps:
+                if applied.get(spec.name) == spec.version:
+                    continue
+                logger.info(f"Bootstrap: krok {spec.name} v{spec.version}")
+                spec.run(db)
+                self._record(db, table, spec, spec.name in applied)
+                applied_now.append(spec.name)
+
+        self._completed_pid = os.getpid()
+        if applied_now:
+            logger.info(f"Bootstrap: wykonano {', '.join(applied_now)}")
+        return applied_now
+
+    @staticmethod
+    def _record(db, table, spec, exists):
+        values = {'version': spec.version, 'applied_at': datetime.utcnow()}
+        try:
+            with db.engine.begin() as conn:
+                if exists:
+                    conn.execute(update(table).where(table.c.name == spec.name).values(**values))
+                else:
+                    conn.execute(insert(table).values(name=spec.name, **values))
+        except IntegrityError:
+            # Inny proces zapisał ten krok równolegle - kroki są idempotentne
+            logger.debug(f"Bootstrap: krok {spec.name} zapisany przez inny proces")
+
+
+bootstrap = Bootstrap()
+
+
+@bootstrap.step('schema', version=3)
+def create_schema(db):
+    # Podbij wersję przy dodaniu nowego modelu - create_all dotworzy brakujące tabele
+    db.create_all()
+
+
+@bootstrap.step('seed_developer', version=1)
+def seed_developer_account(db):
+    """Konto developerskie tworzone tylko, gdy nie istnieje (bez ponownego hashowania hasła)"""
+    from models import User
+
+    if User.query.filter_by(username='developer').first():
+        return
+
+    dev_user = User(username='developer',
+                    email='dev@cvoptimizer.pro',
+                    first_name='System',
+                    last_name='Developer',
+                    is_active=True)
+    dev_user.set_password('NewDev2024!')
+    db.session.add(dev_user)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+
+@bootstrap.step('indexes', version=1)
+def create_indexes(db):
+    """Indeksy dodane do modeli po utworzeniu tabel - create_all nie dodaje ich do istniejących tabel"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -0,0 +1,186 @@
+import re
+import logging
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cv_validator import cv_validator
+
+logger = logging.getLogger(__name__)
+
+# key: nazwa sekcji z numerem kolejnego wystąpienia ('experience', 'experience#2'),
+# tekst sekcji zaczyna się od linii nagłówka; 'header' to dane przed pierwszym nagłówkiem
+Section = namedtuple('Section', ['key', 'name', 'text'])
+
+IncrementalResult = namedtuple('IncrementalResult', ['text', 'changed', 'reused'])
+
+YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+BULLET_RE = re.compile(r'^\s*(?:[•●▪◦·∙■□➢➤►‣*–-]|\d{1,2}[.)])\s')
+
+
+def split_sections(cv_text, validator=None):
+    """
+    Podział CV na sekcje po nagłówkach rozpoznawanych przez CVValidator.
+    Bezstratny: join_sections(s.text for s in split_sections(t)) == t.
+    """
+    validator = validator or cv_validator
+    lines = cv_text.split('\n')
+    boundaries = [(0, 'header')] + validator.heading_lines(cv_text)
+
+    sections = []
+    counts = Counter()
+    for i, (start, name) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(lines)
+        if start == end:
+            continue
+        counts[name] += 1
+        key = name if counts[name] == 1 else f"{name}#{counts[name]}"
+        sections.append(Section(key, name, '\n'.join(lines[start:end])))
+    return sections
+
+
+def join_sections(texts):
+    return '\n'.join(texts)
+
+
+def split_entries(section):
+    """
+    Podział sekcji doświadczenia na stanowiska: nowy wpis zaczyna się od linii z rokiem,
+    która nie jest punktem listy (np. "Data Analyst, Firma A (2019 - obecnie)").
+    Nagłówek sekcji zostaje z pierwszym wpisem; zwraca teksty łączone z powrotem przez '\n'.
+    """
+    lines = section.text.split('\n')
+    starts = [0]
+    for i, line in enumerate(lines[1:], start=1):
+        if YEAR_RE.search(line) and not BULLET_RE.match(line) and any(l.strip() for l in lines[starts[-1] + 1:i]):
+            starts.append(i)
+    return ['\n'.join(lines[start:end]) for start, end in zip(starts, starts[1:] + [len(lines)])]
+
+
+def chunk_sections(sections, max_chars):
+    """
+    Kolejne fragmenty CV pogrupowane w porcje do osobnych wywołań LLM (do max_chars znaków;
+    większy pojedynczy fragment to osobna porcja). Długie sekcje doświadczenia dzielone na stanowiska.
+    Zwraca listę porcji, każda to lista tekstów fragmentów w kolejności CV.
+    """
+    pieces = []
+    for section in sections:
+        if section.name == 'experience' and len(section.text) > max_chars:
+            pieces.extend(split_entries(section))
+        else:
+            pieces.append(section.text)
+
+    chunks = []
+    size = 0
+    for piece in pieces:
+        if chunks and size + len(piece) <= max_chars:
+            chunks[-1].append(piece)
+            size += len(piece)
+        else:
+            chunks.append([piece])
+            size = len(piece)
+    return chunks
+
+
+def _normalize(text):
+    # Zmiana samych odstępów/pustych linii nie jest zmianą treści
+    return ' '.join(text.split())
+
+
+def diff_sections(old_sections, new_sections):
+    """Klucze sekcji zmienionych lub dodanych w nowej wersji (kolejność nowej wersji) i usuniętych"""
+    old = {s.key: _normalize(s.text) for s in old_sections}
+    new_keys = {s.key for s in new_sections}
+    changed = [s.key for s in new_sections if old.get(s.key) != _normalize(s.text)]
+    removed = [key for key in old if key not in new_keys]
+    return changed, removed
+
+
+def _with_trailing(text, original):
+    """text z końcowymi pustymi liniami z original (odstęp przed następną sekcją)"""
+    stripped = original.rstrip('\n')
+    return text.rstrip('\n') + original[len(stripped):]
+
+
+def splice_sections(optimized_sections, new_sections, replacements, removed):
+    """
+    Poprzednia zoptymalizowana wersja z podmienionymi sekcjami (replacements: klucz -> tekst).
+    Sekcje bez odpowiednika w poprzedniej wersji trafiają za sekcję, która poprzedza je
+    w nowym tekście; sekcje dodane wcześniej przez LLM (np. podsumowanie) zostają.
+    """
+    result = [[s.key, s.text] for s in optimized_sections if s.key not in removed]
+    for key, text in replacements.items():
+        for item in result:
+            if item[0] == key:
+                item[1] = _with_trailing(text, item[1])
+
+    present = {item[0] for item in result}
+    previous_key = None
+    for section in new_sections:
+        if section.key not in present:
+            keys = [item[0] for item in result]
+            position = keys.index(previous_key) + 1 if previous_key in keys else 0
+            result.insert(position, [section.key, _with_trailing(replacements.get(section.key, section.text),
+                                                                 section.text)])
+            present.add(section.key)
+        previous_key = section.key
+    return join_sections(text for key, text in result)
+
+
+def incremental_optimize(new_text, base_text, previous_optimized, optimize_sections, max_changed_ratio=0.6):
+    """
+    Ponowna optymalizacja tylko zmienionych sekcji CV.
+    base_text - tekst, z którego powstała previous_optimized; optimize_sections(lista tekstów sekcji)
+    zwraca zoptymalizowane teksty w tej samej kolejności. Zwraca IncrementalResult albo None,
+    gdy CV nie da się sensownie podzielić lub zmieniło się zbyt wiele (wtedy pełna optymalizacja).
+    """
+    new_sections = split_sections(new_text)
+    base_sections = split_sections(base_text)
+    optimized_sections = split_sections(previous_optimized)
+    if len(new_sections) < 2 or len(base_sections) < 2 or len(optimized_sections) < 2:
+        return None
+    # Nagłówek przemianowany przez LLM ("HISTORIA KARIERY") - sekcja nie do odnalezienia, sklejenie by ją zdublowało
+    missing = {s.key for s in base_sections} - {s.key for s in optimized_sections}
+    if missing:
+        logger.debug(f"Brak sekcji {sorted(missing)} w poprzedniej optymalizacji - pełna optymalizacja")
+        return None
+
+    changed, removed = diff_sections(base_sections, new_sections)
+    by_key = {s.key: s for s in new_sections}
+    changed_length = sum(len(by_key[key].text) for key in changed)
+    if changed_length > max_changed_ratio * len(new_text):
+        logger.debug(f"Zmieniono {changed_length}/{len(new_text)} znaków CV - pełna optymalizacja")
+        return None
+
+    replacements = {}
+    if changed:
+        optimized = optimize_sections([by_key[key].text for key in changed])
+        if len(optimized) != len(changed):
+            return None
+        replacements = dict(zip(changed, optimized))
+
+    text = splice_sections(optimized_sections, new_sections, replacements, removed)
+    return IncrementalResult(text, changed, len(new_sections) - len(changed))
+
+
+def parallel_optimize(cv_text, optimize_sections, max_chunk_chars=2500, max_workers=4):
+    """
+    Optymalizacja długiego CV porcjami sekcji - osobne, równoległe wywołania LLM
+    (optimize_sections jak w incremental_optimize), wyniki składane w kolejności CV.
+    Dane kontaktowe przed pierwszym nagłówkiem nie są wysyłane. Zwraca tekst albo None,
+    gdy CV nie dzieli się na co najmniej dwie porcje; wyjątek z którejkolwiek porcji jest przekazywany.
+    """
+    sections = split_sections(cv_text)
+    header = [s.text for s in sections if s.key == 'header']
+    chunks = chunk_sections([s for s in sections if s.key != 'header'], max_chunk_chars)
+    if len(chunks) < 2:
+        return None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        results = list(pool.map(optimize_sections, chunks))
+
+    optimized = []
+    for chunk, texts in zip(chunks, results):
+        if len(texts) != len(chunk):
+            raise ValueError(f"Optymalizacja zwróciła {len(texts)} z {len(chunk)} fragmentów CV")
+        optimized.extend(_with_trailing(text, piece) for piece, text in zip(chunk, texts))
+    return join_sections(header + optimized)
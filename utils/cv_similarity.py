@@ -0,0 +1,191 @@
+import re
+import zlib
+import random
+import struct
+import hashlib
+import logging
+from collections import namedtuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'\w+')
+# Liczba permutacji = 8 pasm po 8 wartości; próg kandydata LSH ~ (1/8)^(1/8) = 0.77
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Liczba pierwsza Mersenne'a 2^61-1 - permutacje (a*x + b) mod P
+PRIME = (1 << 61) - 1
+
+# Analizy zależne tylko od tekstu CV, oferty i języka - dla prawie identycznego CV
+# wynik można pokazać ponownie zamiast wołać LLM (optymalizacje zawsze liczone od nowa)
+REUSABLE_ANALYSES = frozenset({'cv_score', 'ats_check', 'keyword_analysis', 'feedback'})
+
+SimilarCV = namedtuple('SimilarCV', ['cv_upload_id', 'similarity'])
+
+
+def _permutations(num_perm, seed=1):
+    # Stałe ziarno - sygnatury zapisane w bazie muszą być porównywalne między procesami i restartami
+    rng = random.Random(seed)
+    return [(rng.randrange(1, PRIME), rng.randrange(0, PRIME)) for _ in range(num_perm)]
+
+
+PERMUTATIONS = _permutations(NUM_PERM)
+
+
+def shingles(text):
+    """Hashe (crc32) 3-wyrazowych fragmentów tekstu po normalizacji (małe litery, bez interpunkcji)"""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {zlib.crc32(w.encode()) for w in words}
+    return {zlib.crc32(' '.join(words[i:i + SHINGLE_SIZE]).encode())
+            for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """Sygnatura MinHash (NUM_PERM wartości 32-bitowych) albo None dla pustego tekstu"""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    return [min([(a * h + b) % PRIME for h in hashes]) & 0xFFFFFFFF for a, b in PERMUTATIONS]
+
+
+def similarity(signature, other):
+    """Szacowane podobieństwo Jaccarda: odsetek zgodnych pozycji sygnatur"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+def pack(signature):
+    return struct.pack(f'<{NUM_PERM}I', *signature)
+
+
+def unpack(data):
+    return struct.unpack(f'<{NUM_PERM}I', data)
+
+
+def band_keys(user_id, signature):
+    """
+    Klucze pasm LSH (BigInteger). Użytkownik jest częścią klucza - kubełek zawiera tylko
+    CV jednego użytkownika, więc wynik analizy nie może trafić do innej osoby.
+    """
+    data = pack(signature)
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(f'{user_id}:{band}:'.encode() + data[band * ROWS * 4:(band + 1) * ROWS * 4],
+                                 digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+class CVSimilarityIndex:
+    """
+    Wykrywanie prawie identycznych CV (MinHash + LSH) do ponownego użycia wyników analiz.
+    Sygnatury (256 B) i klucze pasm są w bazie (cv_fingerprints, cv_fingerprint_bands):
+    indeks jest wspólny dla wszystkich workerów gunicorna, nie zajmuje ich pamięci
+    i nie wymaga wczytywania przy starcie - wyszukanie to jedno zapytanie po indeksie.
+    """
+
+    def __init__(self, threshold=0.8, reuse_threshold=0.95, max_candidates=20):
+        self.threshold = threshold
+        self.reuse_threshold = reuse_threshold
+        self.max_candidates = max_candidates
+
+    def init_app(self, app):
+        self.threshold = app.config.get('CV_SIMILARITY_THRESHOLD', self.threshold)
+        self.reuse_threshold = app.config.get('CV_SIMILARITY_REUSE', self.reuse_threshold)
+
+    def add(self, cv_upload_id, user_id, cv_text):
+        """Zapisz sygnaturę przesłanego CV; zwraca sygnaturę (lub None dla pustego tekstu)"""
+        from models import db, CVFingerprint, CVFingerprintBand
+
+        signature = minhash(cv_text)
+        if signature is None:
+            return None
+        with db.engine.begin() as conn:
+            conn.execute(CVFingerprint.__table__.insert().values(
+                cv_upload_id=cv_upload_id, user_id=user_id, signature=pack(signature)))
+            conn.execute(CVFingerprintBand.__table__.insert(), [
+                {'band_key': key, 'cv_upload_id': cv_upload_id} for key in set(band_keys(user_id, signature))])
+        return signature
+
+    def find_similar(self, user_id, cv_text=None, signature=None, exclude_id=None, threshold=None):
+        """Wcześniejsze CV użytkownika podobne co najmniej w `threshold`, od najbardziej podobnych"""
+        from models import db, CVFingerprint, CVFingerprintBand
+        from sqlalchemy import select
+
+        signature = signature or minhash(cv_text or '')
+        if signature is None:
+            return []
+        threshold = self.threshold if threshold is None else threshold
+
+        fingerprints = CVFingerprint.__table__
+        bands = CVFingerprintBand.__table__
+        query = (select(fingerprints.c.cv_upload_id, fingerprints.c.signature)
+                 .where(fingerprints.c.cv_upload_id.in_(
+                     select(bands.c.cv_upload_id).where(bands.c.band_key.in_(band_keys(user_id, signature)))))
+                 .where(fingerprints.c.user_id == user_id))
+        if exclude_id is not None:
+            query = query.where(fingerprints.c.cv_upload_id != exclude_id)
+        query = query.order_by(fingerprints.c.cv_upload_id.desc()).limit(self.max_candidates)
+
+        with db.engine.connect() as conn:
+            candidates = conn.execute(query).all()
+
+        # Kandydaci z LSH są weryfikowani pełną sygnaturą (kolizja jednego pasma to za mało)
+        matches = [SimilarCV(row.cv_upload_id, similarity(signature, unpack(row.signature)))
+                   for row in candidates]
+        matches = [m for m in matches if m.similarity >= threshold]
+        matches.sort(key=lambda m: (-m.similarity, -m.cv_upload_id))
+        return matches
+
+    @staticmethod
+    def _latest_result(cv_upload_id, analysis_type, job_description, language):
+        """Najnowsza analiza danego typu dla CV z tą samą ofertą i językiem (result_data) albo None"""
+        from models import AnalysisResult
+
+        previous = (AnalysisResult.query
+                    .filter_by(cv_upload_id=cv_upload_id, analysis_type=analysis_type)
+                    .order_by(AnalysisResult.created_at.desc())
+                    .limit(5).all())
+        for analysis in previous:
+            data = analysis.get_result_json()
+            # Starsze wpisy nie zapisywały języka - nie wiadomo, czy pasują
+            if data.get('language') == language and (data.get('job_description') or '') == (job_description or ''):
+                return data
+        return None
+
+    def find_reusable_result(self, user_id, cv_text, analysis_type, job_description, language):
+        """
+        Wynik tej samej analizy dla prawie identycznego CV (podobieństwo >= reuse_threshold)
+        z tą samą ofertą i językiem: (wynik, SimilarCV) albo (None, None).
+        """
+        if analysis_type not in REUSABLE_ANALYSES:
+            return None, None
+        for match in self.find_similar(user_id, cv_text, threshold=self.reuse_threshold):
+            data = self._latest_result(match.cv_upload_id, analysis_type, job_description, language)
+            if data is not None:
+                metrics.inc('cv_similarity_reuse_total', analysis=analysis_type)
+                return data.get('result'), match
+        return None, None
+
+    def find_previous_optimization(self, user_id, cv_text, analysis_type, job_description, language,
+                                   cv_upload_id=None):
+        """
+        Poprzednia optymalizacja tego CV dla tej samej oferty i języka - najpierw bieżącego uploadu
+        (cv_upload_id), potem podobnych CV użytkownika (podobieństwo >= threshold):
+        (tekst CV, z którego powstała, zoptymalizowany tekst, id uploadu) albo None.
+        """
+        from models import db, CVUpload
+
+        candidates = [cv_upload_id] if cv_upload_id is not None else []
+        candidates += [m.cv_upload_id for m in self.find_similar(user_id, cv_text) if m.cv_upload_id != cv_upload_id]
+        for candidate in candidates:
+            data = self._latest_result(candidate, analysis_type, job_description, language)
+            if data is not None and isinstance(data.get('result'), str):
+                base_text = data.get('cv_text') or db.session.get(CVUpload, candidate).original_text
+                return base_text, data['result'], candidate
+        return None
+
+cv_similarity = CVSimilarityIndex()
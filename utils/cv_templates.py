@@ -1,4 +1,10 @@
 import io
+import copy
+import time
+import logging
+from collections import ChainMap, namedtuple
+from functools import lru_cache
+from types import MappingProxyType
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
@@ -8,6 +14,48 @@ from reportlab.graphics.shapes import Drawing, Rect, Line
 from reportlab.platypus.flowables import Flowable
 import base64
 
+from utils.metrics import timed_phase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = 'modern_blue'
+
+# name -> TemplateSpec; wersja zmienia się przy każdej zmianie wyglądu szablonu
+TEMPLATE_REGISTRY = {}
+
+TemplateSpec = namedtuple('TemplateSpec', ['name', 'version', 'render'])
+
+# Szablon = tokeny stylu (STYLE_REGISTRY[name]) + marginesy + kolejne sekcje (nazwa, parametry)
+TemplateLayout = namedtuple('TemplateLayout', ['name', 'margin', 'sections'])
+
+
+def register_template(name, version=1):
+    """
+    Dekorator rejestrujący renderer szablonu: render(generator, cv_data) -> BytesIO.
+    Szablony oparte na sekcjach rejestruje register_layout; ten dekorator służy
+    szablonom, które potrzebują własnego kodu.
+    """
+    def decorator(f):
+        TEMPLATE_REGISTRY[name] = TemplateSpec(name, version, f)
+        return f
+    return decorator
+
+
+def register_layout(name, sections, margin=None, version=1):
+    """Zarejestruj szablon zdefiniowany jako lista sekcji silnika układu (bez własnego kodu)"""
+    layout = TemplateLayout(name, margin, tuple(sections))
+
+    def render(generator, cv_data):
+        return generator.render_layout(layout, cv_data)
+
+    register_template(name, version)(render)
+    return layout
+
+
+def get_template(name):
+    """Zwróć szablon o podanej nazwie, dla nieznanej nazwy - szablon domyślny"""
+    return TEMPLATE_REGISTRY.get(name) or TEMPLATE_REGISTRY[DEFAULT_TEMPLATE]
+
 class ColorBox(Flowable):
     """Custom flowable for colored boxes"""
     def __init__(self, width, height, color):
@@ -19,526 +67,458 @@ class ColorBox(Flowable):
         self.canv.setFillColor(self.color)
         self.canv.rect(0, 0, self.width, self.height, fill=1)
 
-class CVTemplateGenerator:
-    """Generate professional CV templates with different designs"""
+def build_style_registry():
+    """
+    Zbuduj wszystkie style akapitów i tabel raz - osobny, tylko do odczytu słownik dla każdego szablonu.
+    Style są współdzielone przez wszystkie renderowania (reportlab ich nie modyfikuje).
+    """
+    base = getSampleStyleSheet()
+
+    def style(name, parent, **kwargs):
+        return ParagraphStyle(name, parent=base[parent] if isinstance(parent, str) else parent, **kwargs)
+
+    # Modern Blue Template Styles
+    modern_blue = {
+        'title': style('ModernTitle', 'Heading1', fontSize=28, textColor=colors.HexColor('#2c3e50'),
+                       spaceAfter=10, alignment=1, fontName='Helvetica-Bold'),
+        'subtitle': style('ModernSubtitle', 'Heading2', fontSize=16, textColor=colors.HexColor('#3498db'),
+                          spaceAfter=20, alignment=1, fontName='Helvetica'),
+        'section': style('SectionHeader', 'Heading2', fontSize=14, textColor=colors.HexColor('#2c3e50'),
+                         spaceAfter=12, spaceBefore=20, fontName='Helvetica-Bold',
+                         borderWidth=0, borderColor=colors.HexColor('#3498db'), borderPadding=5),
+        'summary': style('Summary', 'Normal', fontSize=11, textColor=colors.HexColor('#2c3e50'),
+                         alignment=4, spaceAfter=15),  # Justify
+        'exp_title': style('ExpTitle', 'Normal', fontSize=12, textColor=colors.HexColor('#2c3e50'),
+                           fontName='Helvetica-Bold', spaceAfter=3),
+        'exp_company': style('ExpCompany', 'Normal', fontSize=11, textColor=colors.HexColor('#3498db'),
+                             fontName='Helvetica-Bold', spaceAfter=5),
+        'exp_date': style('ExpDate', 'Normal', fontSize=10, textColor=colors.HexColor('#7f8c8d'),
+                          spaceAfter=8),
+        'exp_desc': style('ExpDesc', 'Normal', fontSize=10, textColor=colors.HexColor('#2c3e50'),
+                          leftIndent=20, spaceAfter=15),
+        'education': style('Education', 'Normal', fontSize=11, textColor=colors.HexColor('#2c3e50'),
+                           spaceAfter=8),
+        'edu_year': style('EduYear', 'Normal', fontSize=10, textColor=colors.HexColor('#7f8c8d'),
+                          spaceAfter=12),
+        'contact_table': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#7f8c8d')),
+        ]),
+        'skills_table': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2c3e50')),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+    }
+
+    # Creative Template Styles
+    creative_title = style('CreativeTitle', 'Heading1', fontSize=26, textColor=colors.HexColor('#e74c3c'),
+                           spaceAfter=8, alignment=0, fontName='Helvetica-Bold')
+    creative = {
+        'title': creative_title,
+        'white_title': style('WhiteTitle', creative_title, textColor=colors.white, alignment=1),
+        'subtitle': style('CreativeSubtitle', 'Heading2', fontSize=14, textColor=colors.HexColor('#e74c3c'),
+                          spaceAfter=20, alignment=1, fontName='Helvetica-Oblique'),
+        'contact_header': style('ContactHeader', 'Heading3', fontSize=12, textColor=colors.HexColor('#e74c3c'),
+                                fontName='Helvetica-Bold', spaceAfter=10),
+        'contact': style('ContactStyle', 'Normal', fontSize=9, textColor=colors.HexColor('#2c3e50'),
+                         spaceAfter=5),
+        'section': style('CreativeSection', 'Heading3', fontSize=12, textColor=colors.HexColor('#e74c3c'),
+                         fontName='Helvetica-Bold', spaceAfter=10, spaceBefore=15),
+        'layout_table': TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (0, -1), 0),
+            ('RIGHTPADDING', (1, 0), (1, -1), 0),
+        ]),
+    }
+
+    # Executive Template Styles
+    executive = {
+        'title': style('ExecutiveTitle', 'Heading1', fontSize=24, textColor=colors.HexColor('#34495e'),
+                       spaceAfter=12, alignment=1, fontName='Times-Bold'),
+        'section': style('ExecSection', 'Heading2', fontSize=14, textColor=colors.HexColor('#34495e'),
+                         fontName='Times-Bold', spaceAfter=12, spaceBefore=20,
+                         borderWidth=1, borderColor=colors.HexColor('#bdc3c7'), borderPadding=5),
+        'contact_table': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#34495e')),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+        ]),
+    }
+
+    # Minimalist Template Styles
+    minimalist = {
+        'title': style('MinimalTitle', 'Heading1', fontSize=22, textColor=colors.black,
+                       spaceAfter=15, alignment=0, fontName='Helvetica'),
+        'section': style('MinimalSection', 'Heading3', fontSize=12, textColor=colors.black,
+                         fontName='Helvetica', spaceAfter=15, spaceBefore=25, leftIndent=0),
+    }
+
+    # Classic Template Styles (PDF po płatności w kreatorze CV)
+    classic = {
+        'title': style('CustomTitle', 'Heading1', fontSize=24, textColor=colors.HexColor('#6366f1'),
+                       spaceAfter=30, alignment=1),  # Center
+        'subtitle': style('CustomSubtitle', 'Heading2', fontSize=16, textColor=colors.HexColor('#4f46e5'),
+                          spaceAfter=20),
+        'normal': style('CustomNormal', 'Normal', fontSize=11, spaceAfter=12),
+    }
+
+    return MappingProxyType({
+        'base': MappingProxyType(dict(base.byName)),
+        'modern_blue': MappingProxyType(modern_blue),
+        'creative': MappingProxyType(creative),
+        'executive': MappingProxyType(executive),
+        'minimalist': MappingProxyType(minimalist),
+        'classic': MappingProxyType(classic),
+    })
+
+
+# Tworzone raz przy imporcie modułu (w gunicornie z preload_app - raz w procesie mastera)
+STYLE_REGISTRY = build_style_registry()
+
+
+@lru_cache(maxsize=2048)
+def _parsed_paragraph(text, style):
+    return Paragraph(text, style)
+
+
+def cached_paragraph(text, style):
+    """
+    Akapit ze wspólnego cache sparsowanych akapitów - tylko stały tekst szablonu (nagłówki sekcji,
+    etykiety); treść CV użytkownika nie trafia do cache procesu. Zwraca płytką kopię - wrap/split
+    zapisują stan układu w instancji, a sparsowane fragmenty tekstu są tylko czytane.
+    """
+    return copy.copy(_parsed_paragraph(text, style))
+
+
+CONTACT_FIELDS = ('email', 'phone', 'city', 'linkedin')
+
+# Sekcje silnika układu: nazwa -> funkcja(ctx, cv_data, **tokeny) zwracająca listę flowables
+SECTIONS = {}
+
+
+def register_section(name):
+    def decorator(f):
+        SECTIONS[name] = f
+        return f
+    return decorator
+
+
+class LayoutContext:
+    """Style szablonu (z dostępem do stylów bazowych) i szerokość ramki dokumentu"""
+
+    def __init__(self, styles, width):
+        self.styles = styles
+        self.width = width
 
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.setup_custom_styles()
-
-    def setup_custom_styles(self):
-        """Setup custom paragraph styles for different templates"""
-
-        # Modern Blue Template Styles
-        self.modern_title = ParagraphStyle(
-            'ModernTitle',
-            parent=self.styles['Heading1'],
-            fontSize=28,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=10,
-            alignment=1,
-            fontName='Helvetica-Bold'
-        )
-
-        self.modern_subtitle = ParagraphStyle(
-            'ModernSubtitle',
-            parent=self.styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#3498db'),
-            spaceAfter=20,
-            alignment=1,
-            fontName='Helvetica'
-        )
-
-        self.section_header = ParagraphStyle(
-            'SectionHeader',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=12,
-            spaceBefore=20,
-            fontName='Helvetica-Bold',
-            borderWidth=0,
-            borderColor=colors.HexColor('#3498db'),
-            borderPadding=5
-        )
-
-        # Creative Template Styles
-        self.creative_title = ParagraphStyle(
-            'CreativeTitle',
-            parent=self.styles['Heading1'],
-            fontSize=26,
-            textColor=colors.HexColor('#e74c3c'),
-            spaceAfter=8,
-            alignment=0,
-            fontName='Helvetica-Bold'
-        )
-
-        # Executive Template Styles
-        self.executive_title = ParagraphStyle(
-            'ExecutiveTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#34495e'),
-            spaceAfter=12,
-            alignment=1,
-            fontName='Times-Bold'
-        )
-
-        # Minimalist Template Styles
-        self.minimal_title = ParagraphStyle(
-            'MinimalTitle',
-            parent=self.styles['Heading1'],
-            fontSize=22,
-            textColor=colors.black,
-            spaceAfter=15,
-            alignment=0,
-            fontName='Helvetica-Light'
-        )
-
-    def generate_modern_blue_cv(self, cv_data):
-        """Generate modern blue professional CV template"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, 
-                               topMargin=2*cm, bottomMargin=2*cm)
-        story = []
+    def para(self, text, style):
+        """Akapit z treścią CV - budowany bez cache"""
+        return Paragraph(text, self.styles[style])
 
-        # Header with blue accent
-        story.append(ColorBox(doc.width, 0.5*cm, colors.HexColor('#3498db')))
-        story.append(Spacer(1, 0.3*cm))
-
-        # Name and title
-        name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip()
-        story.append(Paragraph(name, self.modern_title))
-
-        job_title = cv_data.get('jobTitle', '')
-        if job_title:
-            story.append(Paragraph(job_title, self.modern_subtitle))
-
-        # Contact info in table
-        contact_data = []
-        contact_info = []
-        if cv_data.get('email'):
-            contact_info.append(f"✉ {cv_data['email']}")
-        if cv_data.get('phone'):
-            contact_info.append(f"📞 {cv_data['phone']}")
-        if cv_data.get('city'):
-            contact_info.append(f"📍 {cv_data['city']}")
-        if cv_data.get('linkedin'):
-            contact_info.append(f"🔗 {cv_data['linkedin']}")
-
-        if contact_info:
-            # Split into two columns
-            half = len(contact_info) // 2
-            left_col = contact_info[:half]
-            right_col = contact_info[half:]
-
-            max_rows = max(len(left_col), len(right_col))
-            for i in range(max_rows):
-                left = left_col[i] if i < len(left_col) else ""
-                right = right_col[i] if i < len(right_col) else ""
-                contact_data.append([left, right])
-
-            contact_table = Table(contact_data, colWidths=[doc.width/2, doc.width/2])
-            contact_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#7f8c8d')),
-            ]))
-            story.append(contact_table)
-
-        story.append(Spacer(1, 0.5*cm))
-
-        # Professional summary with blue accent
-        if cv_data.get('summary'):
-            story.append(ColorBox(doc.width, 0.2*cm, colors.HexColor('#ecf0f1')))
-            story.append(Spacer(1, 0.2*cm))
-            story.append(Paragraph("PROFIL ZAWODOWY", self.section_header))
-            summary_style = ParagraphStyle(
-                'Summary',
-                parent=self.styles['Normal'],
-                fontSize=11,
-                textColor=colors.HexColor('#2c3e50'),
-                alignment=4,  # Justify
-                spaceAfter=15
-            )
-            story.append(Paragraph(cv_data['summary'], summary_style))
-
-        # Experience section
-        experiences = cv_data.get('experiences', [])
-        if any(exp.get('title') or exp.get('company') for exp in experiences):
-            story.append(Paragraph("DOŚWIADCZENIE ZAWODOWE", self.section_header))
-
-            for exp in experiences:
-                if exp.get('title') or exp.get('company'):
-                    # Experience header
-                    exp_title = exp.get('title', 'Stanowisko')
-                    exp_company = exp.get('company', 'Firma')
-
-                    title_style = ParagraphStyle(
-                        'ExpTitle',
-                        parent=self.styles['Normal'],
-                        fontSize=12,
-                        textColor=colors.HexColor('#2c3e50'),
-                        fontName='Helvetica-Bold',
-                        spaceAfter=3
-                    )
-
-                    company_style = ParagraphStyle(
-                        'ExpCompany',
-                        parent=self.styles['Normal'],
-                        fontSize=11,
-                        textColor=colors.HexColor('#3498db'),
-                        fontName='Helvetica-Bold',
-                        spaceAfter=5
-                    )
-
-                    story.append(Paragraph(exp_title, title_style))
-                    story.append(Paragraph(exp_company, company_style))
-
-                    # Dates
-                    start_date = exp.get('startDate', '')
-                    end_date = exp.get('endDate', 'obecnie')
-                    if start_date:
-                        date_style = ParagraphStyle(
-                            'ExpDate',
-                            parent=self.styles['Normal'],
-                            fontSize=10,
-                            textColor=colors.HexColor('#7f8c8d'),
-                            spaceAfter=8
-                        )
-                        story.append(Paragraph(f"{start_date} - {end_date}", date_style))
-
-                    # Description
-                    if exp.get('description'):
-                        desc_style = ParagraphStyle(
-                            'ExpDesc',
-                            parent=self.styles['Normal'],
-                            fontSize=10,
-                            textColor=colors.HexColor('#2c3e50'),
-                            leftIndent=20,
-                            spaceAfter=15
-                        )
-                        story.append(Paragraph(f"• {exp['description']}", desc_style))
-
-        # Education section
-        education = cv_data.get('education', [])
-        if any(edu.get('degree') or edu.get('school') for edu in education):
-            story.append(Paragraph("WYKSZTAŁCENIE", self.section_header))
-
-            for edu in education:
-                if edu.get('degree') or edu.get('school'):
-                    degree = edu.get('degree', 'Kierunek')
-                    school = edu.get('school', 'Uczelnia')
-
-                    edu_style = ParagraphStyle(
-                        'Education',
-                        parent=self.styles['Normal'],
-                        fontSize=11,
-                        textColor=colors.HexColor('#2c3e50'),
-                        spaceAfter=8
-                    )
-
-                    story.append(Paragraph(f"<b>{degree}</b> - {school}", edu_style))
-
-                    start_year = edu.get('startYear', '')
-                    end_year = edu.get('endYear', '')
-                    if start_year or end_year:
-                        year_style = ParagraphStyle(
-                            'EduYear',
-                            parent=self.styles['Normal'],
-                            fontSize=10,
-                            textColor=colors.HexColor('#7f8c8d'),
-                            spaceAfter=12
-                        )
-                        story.append(Paragraph(f"{start_year} - {end_year}", year_style))
-
-        # Skills section
-        skills = cv_data.get('skills', '')
-        if skills:
-            story.append(Paragraph("UMIEJĘTNOŚCI", self.section_header))
-            skills_list = [skill.strip() for skill in skills.split(',') if skill.strip()]
-
-            # Create skills in columns
-            skills_data = []
-            for i in range(0, len(skills_list), 3):
-                row = skills_list[i:i+3]
-                while len(row) < 3:
-                    row.append("")
-                skills_data.append([f"• {skill}" if skill else "" for skill in row])
-
-            skills_table = Table(skills_data, colWidths=[doc.width/3]*3)
-            skills_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2c3e50')),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            story.append(skills_table)
-
-        # Footer accent
-        story.append(Spacer(1, 1*cm))
-        story.append(ColorBox(doc.width, 0.3*cm, colors.HexColor('#3498db')))
-
-        doc.build(story)
-        buffer.seek(0)
-        return buffer
+    def heading(self, text, style):
+        """Nagłówek/etykieta szablonu - z cache sparsowanych akapitów"""
+        return cached_paragraph(text, self.styles[style])
 
-    def generate_creative_cv(self, cv_data):
-        """Generate creative CV template with modern design"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=1.5*cm, leftMargin=1.5*cm, 
-                               topMargin=1.5*cm, bottomMargin=1.5*cm)
+    def build(self, sections, cv_data):
         story = []
+        for name, tokens in sections:
+            story.extend(SECTIONS[name](self, cv_data, **tokens))
+        return story
 
-        # Creative header with gradient-like effect
-        story.append(ColorBox(doc.width, 1*cm, colors.HexColor('#e74c3c')))
-        story.append(Spacer(1, -0.8*cm))
-
-        # Name in white on red background
-        name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip()
-        white_title = ParagraphStyle(
-            'WhiteTitle',
-            parent=self.creative_title,
-            textColor=colors.white,
-            alignment=1
-        )
-        story.append(Paragraph(name, white_title))
-        story.append(Spacer(1, 0.3*cm))
-
-        # Job title
-        job_title = cv_data.get('jobTitle', '')
-        if job_title:
-            creative_subtitle = ParagraphStyle(
-                'CreativeSubtitle',
-                parent=self.styles['Heading2'],
-                fontSize=14,
-                textColor=colors.HexColor('#e74c3c'),
-                spaceAfter=20,
-                alignment=1,
-                fontName='Helvetica-Oblique'
-            )
-            story.append(Paragraph(job_title, creative_subtitle))
-
-        # Two-column layout for contact and content
-        main_content = []
-
-        # Contact sidebar
-        contact_content = []
-        contact_header = ParagraphStyle(
-            'ContactHeader',
-            parent=self.styles['Heading3'],
-            fontSize=12,
-            textColor=colors.HexColor('#e74c3c'),
-            fontName='Helvetica-Bold',
-            spaceAfter=10
-        )
-
-        contact_style = ParagraphStyle(
-            'ContactStyle',
-            parent=self.styles['Normal'],
-            fontSize=9,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=5
-        )
-
-        contact_content.append(Paragraph("KONTAKT", contact_header))
-
-        if cv_data.get('email'):
-            contact_content.append(Paragraph(f"📧 {cv_data['email']}", contact_style))
-        if cv_data.get('phone'):
-            contact_content.append(Paragraph(f"📱 {cv_data['phone']}", contact_style))
-        if cv_data.get('city'):
-            contact_content.append(Paragraph(f"🏙️ {cv_data['city']}", contact_style))
-        if cv_data.get('linkedin'):
-            contact_content.append(Paragraph(f"💼 {cv_data['linkedin']}", contact_style))
-
-        # Main content area
-        if cv_data.get('summary'):
-            creative_section = ParagraphStyle(
-                'CreativeSection',
-                parent=self.styles['Heading3'],
-                fontSize=12,
-                textColor=colors.HexColor('#e74c3c'),
-                fontName='Helvetica-Bold',
-                spaceAfter=10,
-                spaceBefore=15
-            )
-            main_content.append(Paragraph("O MNIE", creative_section))
-            main_content.append(Paragraph(cv_data['summary'], self.styles['Normal']))
-
-        # Combine in table layout
-        layout_data = []
-        max_len = max(len(contact_content), len(main_content))
-
-        for i in range(max_len):
-            left = contact_content[i] if i < len(contact_content) else Spacer(1, 0)
-            right = main_content[i] if i < len(main_content) else Spacer(1, 0)
-            layout_data.append([left, right])
-
-        layout_table = Table(layout_data, colWidths=[doc.width*0.3, doc.width*0.7])
-        layout_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (0, -1), 0),
-            ('RIGHTPADDING', (1, 0), (1, -1), 0),
-        ]))
-        story.append(layout_table)
 
-        doc.build(story)
-        buffer.seek(0)
-        return buffer
+@register_section('rule')
+def rule_section(ctx, cv_data, height, color):
+    return [ColorBox(ctx.width, height, color)]
 
-    def generate_executive_cv(self, cv_data):
-        """Generate executive/corporate CV template"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2.5*cm, leftMargin=2.5*cm, 
-                               topMargin=2.5*cm, bottomMargin=2.5*cm)
-        story = []
 
-        # Executive header
-        name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip()
-        story.append(Paragraph(name, self.executive_title))
-
-        # Elegant underline
-        story.append(ColorBox(doc.width, 0.1*cm, colors.HexColor('#34495e')))
-        story.append(Spacer(1, 0.5*cm))
-
-        # Contact in elegant table
-        if any([cv_data.get('email'), cv_data.get('phone'), cv_data.get('city')]):
-            contact_data = [[
-                cv_data.get('email', ''),
-                cv_data.get('phone', ''),
-                cv_data.get('city', '')
-            ]]
-
-            contact_table = Table(contact_data, colWidths=[doc.width/3]*3)
-            contact_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#34495e')),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-            ]))
-            story.append(contact_table)
-
-        # Professional sections with elegant styling
-        exec_section = ParagraphStyle(
-            'ExecSection',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#34495e'),
-            fontName='Times-Bold',
-            spaceAfter=12,
-            spaceBefore=20,
-            borderWidth=1,
-            borderColor=colors.HexColor('#bdc3c7'),
-            borderPadding=5
-        )
-
-        if cv_data.get('summary'):
-            story.append(Paragraph("EXECUTIVE SUMMARY", exec_section))
-            story.append(Paragraph(cv_data['summary'], self.styles['Normal']))
-
-        doc.build(story)
-        buffer.seek(0)
-        return buffer
+@register_section('spacer')
+def spacer_section(ctx, cv_data, height):
+    return [Spacer(1, height)]
 
-    def generate_minimalist_cv(self, cv_data):
-        """Generate clean minimalist CV template"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=3*cm, leftMargin=3*cm, 
-                               topMargin=3*cm, bottomMargin=3*cm)
-        story = []
 
-        # Minimalist header
-        name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip()
-        story.append(Paragraph(name, self.minimal_title))
-
-        # Simple line
-        story.append(ColorBox(doc.width, 0.05*cm, colors.black))
-        story.append(Spacer(1, 1*cm))
-
-        # Clean typography throughout
-        minimal_section = ParagraphStyle(
-            'MinimalSection',
-            parent=self.styles['Heading3'],
-            fontSize=12,
-            textColor=colors.black,
-            fontName='Helvetica',
-            spaceAfter=15,
-            spaceBefore=25,
-            leftIndent=0
-        )
-
-        # Content with lots of white space
-        if cv_data.get('summary'):
-            story.append(Paragraph("About", minimal_section))
-            story.append(Paragraph(cv_data['summary'], self.styles['Normal']))
-
-        doc.build(story)
-        buffer.seek(0)
-        return buffer
+@register_section('name')
+def name_section(ctx, cv_data, style='title'):
+    name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip()
+    return [ctx.para(name, style)]
 
-def generate_cv_with_template(cv_data, template_style="modern_blue"):
-    """Main function to generate CV with selected template"""
-    generator = CVTemplateGenerator()
-
-    if template_style == "modern_blue":
-        return generator.generate_modern_blue_cv(cv_data)
-    elif template_style == "creative":
-        return generator.generate_creative_cv(cv_data)
-    elif template_style == "executive":
-        return generator.generate_executive_cv(cv_data)
-    elif template_style == "minimalist":
-        return generator.generate_minimalist_cv(cv_data)
-    else:
-        # Default to modern blue
-        return generator.generate_modern_blue_cv(cv_data)
-import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 
-def generate_cv_with_template(cv_data, template_style='modern_blue'):
-    """Generate CV PDF with selected template style"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
+@register_section('job_title')
+def job_title_section(ctx, cv_data, style='subtitle'):
+    job_title = cv_data.get('jobTitle', '')
+    return [ctx.para(job_title, style)] if job_title else []
+
+
+@register_section('contact')
+def contact_section(ctx, cv_data, layout, style=None, icons=None, fields=CONTACT_FIELDS,
+                    table_style=None, header=None, header_style=None):
+    """layout: 'columns' (tabela w dwóch kolumnach), 'row' (jeden wiersz), 'line' (jedna linia), 'list'"""
+    if layout == 'row':
+        if not any(cv_data.get(field) for field in fields):
+            return []
+        table = Table([[cv_data.get(field, '') for field in fields]], colWidths=[ctx.width / len(fields)] * len(fields))
+        table.setStyle(ctx.styles[table_style])
+        return [table]
+
+    items = [f"{icons[field]} {cv_data[field]}" if icons else cv_data[field]
+             for field in fields if cv_data.get(field)]
+
+    if layout == 'list':
+        return [ctx.heading(header, header_style)] + [ctx.para(item, style) for item in items]
+
+    if not items:
+        return []
+
+    if layout == 'line':
+        return [ctx.para(' | '.join(items), style)]
+
+    # Split into two columns
+    half = len(items) // 2
+    left_col, right_col = items[:half], items[half:]
+    rows = [[left_col[i] if i < len(left_col) else "", right_col[i] if i < len(right_col) else ""]
+            for i in range(max(len(left_col), len(right_col)))]
+    table = Table(rows, colWidths=[ctx.width / 2, ctx.width / 2])
+    table.setStyle(ctx.styles[table_style])
+    return [table]
+
+
+@register_section('summary')
+def summary_section(ctx, cv_data, heading, heading_style='section', style='Normal', accent=None,
+                    space_after=None):
+    if not cv_data.get('summary'):
+        return []
     story = []
+    if accent:
+        height, color, gap = accent
+        story += [ColorBox(ctx.width, height, color), Spacer(1, gap)]
+    story += [ctx.heading(heading, heading_style), ctx.para(cv_data['summary'], style)]
+    if space_after:
+        story.append(Spacer(1, space_after))
+    return story
+
+
+@register_section('experience')
+def experience_section(ctx, cv_data, heading, heading_style, title_style, date_style, desc_style,
+                       company_style=None, desc_prefix='', space_after=None):
+    """company_style=None - stanowisko i firma w jednej linii"""
+    experiences = cv_data.get('experiences', [])
+    if not any(exp.get('title') or exp.get('company') for exp in experiences):
+        return []
+
+    story = [ctx.heading(heading, heading_style)]
+    for exp in experiences:
+        if not (exp.get('title') or exp.get('company')):
+            continue
+        title = exp.get('title', 'Stanowisko')
+        company = exp.get('company', 'Firma')
+        if company_style:
+            story += [ctx.para(title, title_style), ctx.para(company, company_style)]
+        else:
+            story.append(ctx.para(f"<b>{title}</b> - {company}", title_style))
+
+        start_date = exp.get('startDate', '')
+        if start_date:
+            story.append(ctx.para(f"{start_date} - {exp.get('endDate', 'obecnie')}", date_style))
+
+        if exp.get('description'):
+            story.append(ctx.para(f"{desc_prefix}{exp['description']}", desc_style))
+
+        if space_after:
+            story.append(Spacer(1, space_after))
+    return story
+
+
+@register_section('education')
+def education_section(ctx, cv_data, heading, heading_style, style, year_style, space_after=None):
+    education = cv_data.get('education', [])
+    if not any(edu.get('degree') or edu.get('school') for edu in education):
+        return []
+
+    story = [ctx.heading(heading, heading_style)]
+    for edu in education:
+        if not (edu.get('degree') or edu.get('school')):
+            continue
+        story.append(ctx.para(f"<b>{edu.get('degree', 'Kierunek')}</b> - {edu.get('school', 'Uczelnia')}", style))
+
+        start_year = edu.get('startYear', '')
+        end_year = edu.get('endYear', '')
+        if start_year or end_year:
+            story.append(ctx.para(f"{start_year} - {end_year}", year_style))
+
+        if space_after:
+            story.append(Spacer(1, space_after))
+    return story
+
+
+@register_section('skills')
+def skills_section(ctx, cv_data, heading, heading_style, style=None, table_style=None, columns=3):
+    """Z table_style - tabela z `columns` kolumnami, bez niej - jedna linia rozdzielona kropkami"""
+    skills = cv_data.get('skills', '')
+    if not skills:
+        return []
+
+    skills_list = [skill.strip() for skill in skills.split(',') if skill.strip()]
+    story = [ctx.heading(heading, heading_style)]
+    if not table_style:
+        story.append(ctx.para(' • '.join(skills_list), style))
+        return story
+
+    rows = []
+    for i in range(0, len(skills_list), columns):
+        row = skills_list[i:i + columns]
+        row += [""] * (columns - len(row))
+        rows.append([f"• {skill}" if skill else "" for skill in row])
+
+    table = Table(rows, colWidths=[ctx.width / columns] * columns)
+    table.setStyle(ctx.styles[table_style])
+    return story + [table]
+
+
+@register_section('columns')
+def columns_section(ctx, cv_data, widths, left, right, table_style):
+    """Dwie kolumny z sekcjami, zestawione wiersz po wierszu w tabeli"""
+    left_content = ctx.build(left, cv_data)
+    right_content = ctx.build(right, cv_data)
+
+    rows = []
+    for i in range(max(len(left_content), len(right_content))):
+        rows.append([left_content[i] if i < len(left_content) else Spacer(1, 0),
+                     right_content[i] if i < len(right_content) else Spacer(1, 0)])
+
+    table = Table(rows, colWidths=[ctx.width * width for width in widths])
+    table.setStyle(ctx.styles[table_style])
+    return [table]
 
-    # Template-specific styling
-    if template_style == 'modern_blue':
-        title_color = colors.HexColor('#2563eb')
-        accent_color = colors.HexColor('#1e40af')
-    elif template_style == 'professional_gray':
-        title_color = colors.HexColor('#374151')
-        accent_color = colors.HexColor('#6b7280')
-    else:
-        title_color = colors.HexColor('#6366f1')
-        accent_color = colors.HexColor('#4f46e5')
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=title_color,
-        spaceAfter=30,
-        alignment=1
-    )
-
-    # Header
-    name = f"{cv_data.get('firstName', '')} {cv_data.get('lastName', '')}".strip()
-    story.append(Paragraph(name, title_style))
 
-    # Add other CV sections...
-    if cv_data.get('summary'):
-        story.append(Paragraph("Professional Summary", styles['Heading2']))
-        story.append(Paragraph(cv_data['summary'], styles['Normal']))
-        story.append(Spacer(1, 12))
+class CVTemplateGenerator:
+    """Generate professional CV templates with different designs"""
 
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    def __init__(self, registry=None):
+        self.registry = registry or STYLE_REGISTRY
+        self.styles = self.registry['base']
+
+    def render_layout(self, layout, cv_data):
+        """Złóż dokument z sekcji szablonu i zwróć bufor z PDF"""
+        buffer = io.BytesIO()
+        if layout.margin is None:
+            doc = SimpleDocTemplate(buffer, pagesize=A4)
+        else:
+            doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=layout.margin, leftMargin=layout.margin,
+                                    topMargin=layout.margin, bottomMargin=layout.margin)
+
+        ctx = LayoutContext(ChainMap(self.registry[layout.name], self.styles), doc.width)
+        doc.build(ctx.build(layout.sections, cv_data))
+        buffer.seek(0)
+        return buffer
+
+
+# Modern Blue - niebieskie akcenty, kontakt w dwóch kolumnach, umiejętności w trzech
+register_layout('modern_blue', margin=2*cm, sections=[
+    ('rule', {'height': 0.5*cm, 'color': colors.HexColor('#3498db')}),
+    ('spacer', {'height': 0.3*cm}),
+    ('name', {}),
+    ('job_title', {}),
+    ('contact', {'layout': 'columns', 'table_style': 'contact_table',
+                 'icons': {'email': '✉', 'phone': '📞', 'city': '📍', 'linkedin': '🔗'}}),
+    ('spacer', {'height': 0.5*cm}),
+    ('summary', {'heading': "PROFIL ZAWODOWY", 'style': 'summary',
+                 'accent': (0.2*cm, colors.HexColor('#ecf0f1'), 0.2*cm)}),
+    ('experience', {'heading': "DOŚWIADCZENIE ZAWODOWE", 'heading_style': 'section',
+                    'title_style': 'exp_title', 'company_style': 'exp_company',
+                    'date_style': 'exp_date', 'desc_style': 'exp_desc', 'desc_prefix': '• '}),
+    ('education', {'heading': "WYKSZTAŁCENIE", 'heading_style': 'section',
+                   'style': 'education', 'year_style': 'edu_year'}),
+    ('skills', {'heading': "UMIEJĘTNOŚCI", 'heading_style': 'section', 'table_style': 'skills_table'}),
+    ('spacer', {'height': 1*cm}),
+    ('rule', {'height': 0.3*cm, 'color': colors.HexColor('#3498db')}),
+])
+
+# Creative - czerwony nagłówek, kontakt w bocznej kolumnie
+register_layout('creative', margin=1.5*cm, sections=[
+    ('rule', {'height': 1*cm, 'color': colors.HexColor('#e74c3c')}),
+    ('spacer', {'height': -0.8*cm}),
+    ('name', {'style': 'white_title'}),
+    ('spacer', {'height': 0.3*cm}),
+    ('job_title', {}),
+    ('columns', {'widths': (0.3, 0.7), 'table_style': 'layout_table',
+                 'left': [('contact', {'layout': 'list', 'header': "KONTAKT", 'header_style': 'contact_header',
+                                       'style': 'contact',
+                                       'icons': {'email': '📧', 'phone': '📱', 'city': '🏙️', 'linkedin': '💼'}})],
+                 'right': [('summary', {'heading': "O MNIE"})]}),
+])
+
+# Executive - szeryfowe nagłówki, kontakt w jednym wierszu
+register_layout('executive', margin=2.5*cm, sections=[
+    ('name', {}),
+    ('rule', {'height': 0.1*cm, 'color': colors.HexColor('#34495e')}),
+    ('spacer', {'height': 0.5*cm}),
+    ('contact', {'layout': 'row', 'fields': ('email', 'phone', 'city'), 'table_style': 'contact_table'}),
+    ('summary', {'heading': "EXECUTIVE SUMMARY"}),
+])
+
+# Minimalist - dużo białej przestrzeni
+register_layout('minimalist', margin=3*cm, sections=[
+    ('name', {}),
+    ('rule', {'height': 0.05*cm, 'color': colors.black}),
+    ('spacer', {'height': 1*cm}),
+    ('summary', {'heading': "About"}),
+])
+
+# Classic - PDF po płatności w kreatorze CV
+register_layout('classic', sections=[
+    ('name', {}),
+    ('job_title', {'style': 'Heading3'}),
+    ('contact', {'layout': 'line', 'style': 'normal'}),
+    ('spacer', {'height': 20}),
+    ('summary', {'heading': "O mnie", 'heading_style': 'subtitle', 'style': 'normal', 'space_after': 15}),
+    ('experience', {'heading': "Doświadczenie zawodowe", 'heading_style': 'subtitle', 'title_style': 'normal',
+                    'date_style': 'normal', 'desc_style': 'normal', 'space_after': 10}),
+    ('education', {'heading': "Wykształcenie", 'heading_style': 'subtitle', 'style': 'normal',
+                   'year_style': 'normal', 'space_after': 10}),
+    ('skills', {'heading': "Umiejętności", 'heading_style': 'subtitle', 'style': 'normal'}),
+])
+
+# Jeden generator na proces - style są tylko do odczytu, więc można go współdzielić między wątkami
+cv_template_generator = CVTemplateGenerator()
+
+PREWARM_CV_DATA = {
+    'firstName': 'Jan',
+    'lastName': 'Kowalski',
+    'jobTitle': 'Specjalista',
+    'email': 'jan.kowalski@example.com',
+    'phone': '+48 600 000 000',
+    'city': 'Warszawa',
+    'summary': 'Zażółć gęślą jaźń.',
+    'experiences': [{'title': 'Stanowisko', 'company': 'Firma', 'startDate': '2020', 'description': 'Opis'}],
+    'education': [{'degree': 'Kierunek', 'school': 'Uczelnia', 'startYear': '2015', 'endYear': '2020'}],
+    'skills': 'Python, SQL, Excel',
+}
+
+
+def prewarm_templates():
+    """
+    Wyrenderuj każdy szablon raz przy starcie (fonty, metryki glifów, cache reportlab).
+    Przy preload_app w gunicornie workery dziedziczą rozgrzany stan po forku.
+    Zwraca listę szablonów, których nie udało się wyrenderować.
+    """
+    failed = []
+    for spec in TEMPLATE_REGISTRY.values():
+        start = time.perf_counter()
+        try:
+            spec.render(cv_template_generator, PREWARM_CV_DATA)
+        except Exception as e:
+            logger.error(f"Szablon CV '{spec.name}' nie działa: {e}")
+            failed.append(spec.name)
+            continue
+        logger.debug(f"Szablon CV '{spec.name}' rozgrzany w {(time.perf_counter() - start) * 1000:.1f} ms")
+    return failed
+
+
+@timed_phase('pdf_render')
+def generate_cv_with_template(cv_data, template_style=DEFAULT_TEMPLATE):
+    """Main function to generate CV with selected template"""
+    return get_template(template_style).render(cv_template_generator, cv_data)
@@ -1,15 +1,28 @@
 
 import re
-from typing import Dict, List, Tuple
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+# Wynik jednego przebiegu po tekście CV
+CVScan = namedtuple('CVScan', ['sections', 'has_experience', 'has_education', 'suspicious',
+                               'has_email', 'has_phone'])
+
+EMAIL_RE = re.compile(r'\b[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z|]{2,}\b')
+# Numer telefonu (format polski) - co najmniej 9 znaków, zaczyna i kończy się cyfrą
+PHONE_RE = re.compile(r'(?:\+48\s?)?\(?\d[\d\s\-\(\)]{7,13}\d')
+HEADING_PREFIX = r'[ \t:#*\[\-–•]*'
 
-import re
-from typing import Dict, List
 
 class CVValidator:
     def __init__(self):
         self.min_length = 200
         self.max_length = 10000
         self.required_sections = ['doświadczenie', 'experience', 'praca', 'work', 'wykształcenie', 'education']
+        # Słowa kluczowe sekcji wymaganych - wystarczy wystąpienie w dowolnym miejscu tekstu
+        self.required_section_keywords = {
+            'experience': ['doświadczenie', 'experience', 'praca zawodowa'],
+            'education': ['wykształcenie', 'education', 'edukacja'],
+        }
         self.suspicious_patterns = [
             r'lorem ipsum',
             r'placeholder',
@@ -18,9 +31,84 @@ class CVValidator:
             r'john doe',
             r'jane doe'
         ]
-    
-    def validate_cv(self, cv_text: str) -> Dict:
+        # Nagłówki sekcji CV (PL/EN) - rozpoznawane na początku krótkiej linii
+        self.section_headings = {
+            'experience': ['doświadczenie', 'experience', 'praca zawodowa', 'historia zatrudnienia',
+                           'przebieg kariery', 'employment', 'work history'],
+            'education': ['wykształcenie', 'education', 'edukacja'],
+            'skills': ['umiejętności', 'kompetencje', 'skills', 'technologie'],
+            'summary': ['podsumowanie', 'profil zawodowy', 'o mnie', 'cel zawodowy', 'summary',
+                        'profile', 'about me'],
+            'languages': ['języki', 'languages'],
+            'certificates': ['certyfikaty', 'kursy', 'szkolenia', 'certifications', 'courses'],
+            'interests': ['zainteresowania', 'hobby', 'interests'],
+        }
+        self.max_heading_length = 40
+        self.compile()
+
+    def compile(self):
+        """
+        Prekompilacja wzorców - wywołaj ponownie po zmianie list wzorców/nagłówków.
+        Wzorce zaczynają się od literału (początek linii jako '\\n'), dzięki czemu silnik re
+        przeskakuje tekst szybko zamiast próbować każdej alternatywy na każdej pozycji.
+        """
+        self._heading_keywords = {}
+        for name, keywords in self.section_headings.items():
+            for keyword in keywords:
+                self._heading_keywords.setdefault(keyword, name)
+        alternation = '|'.join(re.escape(k) for k in sorted(self._heading_keywords, key=len, reverse=True))
+        # Tekst skanowany jest z dopisanym '\n' na początku - pierwsza linia też jest "po '\n'"
+        self._heading_re = re.compile(rf"\n{HEADING_PREFIX}({alternation})")
+
+        # Bez nazwanych grup (z grupami skanowanie jest kilkukrotnie wolniejsze) - trafienia,
+        # zwykle żadne, są przypisywane do wzorców osobno
+        self._suspicious_re = re.compile('|'.join(f"(?:{p})" for p in self.suspicious_patterns))
+        self._suspicious_patterns_re = [(p, re.compile(p)) for p in self.suspicious_patterns]
+
+    def scan(self, cv_text: str) -> CVScan:
+        """Jeden lower() dla wszystkich sprawdzeń: nagłówki sekcji, słowa kluczowe, kontakt, wzorce podejrzane"""
+        text = '\n' + cv_text.lower()
+
+        sections = dict((name, line_no) for line_no, name in self._headings(text, first_only=True))
+
+        found = {p for match in self._suspicious_re.finditer(text)
+                 for p, regex in self._suspicious_patterns_re if regex.fullmatch(match.group())}
+        keywords = self.required_section_keywords
+
+        return CVScan(
+            sections=sections,
+            has_experience='experience' in sections or any(k in text for k in keywords['experience']),
+            has_education='education' in sections or any(k in text for k in keywords['education']),
+            suspicious=[p for p in self.suspicious_patterns if p in found],
+            has_email=EMAIL_RE.search(text) is not None,
+            has_phone=PHONE_RE.search(text) is not None,
+        )
+
+    def _headings(self, text: str, first_only: bool = False) -> Iterable[Tuple[int, str]]:
+        """(numer linii, sekcja) nagłówków; text to '\n' + tekst małymi literami"""
+        line_no = 0
+        last_pos = 0
+        seen = set()
+        for match in self._heading_re.finditer(text):
+            name = self._heading_keywords[match.group(1)]
+            if first_only and name in seen:
+                continue
+            line_end = text.find('\n', match.start() + 1)
+            line = text[match.start() + 1:line_end if line_end != -1 else len(text)]
+            if len(line.strip().strip(':#*[]-–•').strip()) > self.max_heading_length:
+                continue
+            line_no += text.count('\n', last_pos, match.start())
+            last_pos = match.start()
+            seen.add(name)
+            yield line_no, name
+
+    def heading_lines(self, cv_text: str) -> List[Tuple[int, str]]:
+        """Wszystkie nagłówki sekcji (także powtórzone) jako (numer linii, sekcja) - podział CV na sekcje"""
+        return list(self._headings('\n' + cv_text.lower()))
+
+    def validate_cv(self, cv_text: str, scan: CVScan = None) -> Dict:
         """Comprehensive CV validation"""
+        scan = scan or self.scan(cv_text)
         results = {
             'is_valid': True,
             'warnings': [],
@@ -28,95 +116,83 @@ class CVValidator:
             'suggestions': [],
             'quality_score': 0
         }
-        
+
         # Length validation
         if len(cv_text) < self.min_length:
             results['errors'].append(f"CV jest zbyt krótkie ({len(cv_text)} znaków). Minimum: {self.min_length}")
             results['is_valid'] = False
         elif len(cv_text) > self.max_length:
             results['warnings'].append(f"CV jest bardzo długie ({len(cv_text)} znaków). Może być trudne do przetworzenia.")
-        
+
         # Check for required sections
-        missing_sections = self._check_required_sections(cv_text)
+        missing_sections = self._missing_sections(scan)
         if missing_sections:
             results['warnings'].append(f"Brakuje sekcji: {', '.join(missing_sections)}")
-        
+
         # Check for suspicious patterns
-        suspicious_found = self._check_suspicious_patterns(cv_text)
-        if suspicious_found:
-            results['warnings'].append(f"Wykryto podejrzane wzorce: {', '.join(suspicious_found)}")
-        
+        if scan.suspicious:
+            results['warnings'].append(f"Wykryto podejrzane wzorce: {', '.join(scan.suspicious)}")
+
         # Check for contact information
-        contact_info = self._check_contact_info(cv_text)
-        if not contact_info['has_email']:
+        if not scan.has_email:
             results['suggestions'].append("Dodaj adres email")
-        if not contact_info['has_phone']:
+        if not scan.has_phone:
             results['suggestions'].append("Dodaj numer telefonu")
-        
+
         # Calculate quality score
         results['quality_score'] = self._calculate_quality_score(cv_text, results)
-        
+
         return results
-    
-    def _check_required_sections(self, cv_text: str) -> List[str]:
-        """Check for required CV sections"""
-        text_lower = cv_text.lower()
+
+    def validate_many(self, cv_texts: Iterable[str]) -> List[Dict]:
+        """Walidacja wielu CV (np. import hurtowy) - wyniki w kolejności wejścia"""
+        return [self.validate_cv(cv_text) for cv_text in cv_texts]
+
+    def detect_sections(self, cv_text: str) -> Dict[str, int]:
+        """Sekcje CV rozpoznane po nagłówkach: nazwa -> numer linii nagłówka (pierwsze wystąpienie)"""
+        return self.scan(cv_text).sections
+
+    @staticmethod
+    def _missing_sections(scan: CVScan) -> List[str]:
         missing = []
-        
-        has_experience = any(section in text_lower for section in ['doświadczenie', 'experience', 'praca zawodowa'])
-        has_education = any(section in text_lower for section in ['wykształcenie', 'education', 'edukacja'])
-        
-        if not has_experience:
+        if not scan.has_experience:
             missing.append("Doświadczenie zawodowe")
-        if not has_education:
+        if not scan.has_education:
             missing.append("Wykształcenie")
-        
         return missing
-    
+
+    def _check_required_sections(self, cv_text: str) -> List[str]:
+        """Check for required CV sections"""
+        return self._missing_sections(self.scan(cv_text))
+
     def _check_suspicious_patterns(self, cv_text: str) -> List[str]:
         """Check for suspicious patterns that might indicate fake/template content"""
-        found_patterns = []
-        text_lower = cv_text.lower()
-        
-        for pattern in self.suspicious_patterns:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                found_patterns.append(pattern)
-        
-        return found_patterns
-    
+        return self.scan(cv_text).suspicious
+
     def _check_contact_info(self, cv_text: str) -> Dict:
         """Check for contact information"""
-        text_lower = cv_text.lower()
-        
-        # Email pattern
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        has_email = bool(re.search(email_pattern, cv_text))
-        
-        # Phone pattern (Polish format)
-        phone_pattern = r'(\+48\s?)?[\d\s\-\(\)]{9,15}'
-        has_phone = bool(re.search(phone_pattern, cv_text))
-        
+        scan = self.scan(cv_text)
         return {
-            'has_email': has_email,
-            'has_phone': has_phone
+            'has_email': scan.has_email,
+            'has_phone': scan.has_phone
         }
-    
+
     def _calculate_quality_score(self, cv_text: str, results: Dict) -> int:
         """Calculate overall quality score"""
         base_score = 50
-        
+
         # Length bonus
         if 500 <= len(cv_text) <= 2000:
             base_score += 20
         elif len(cv_text) > 2000:
             base_score += 10
-        
+
         # Penalty for errors
         base_score -= len(results['errors']) * 10
         base_score -= len(results['warnings']) * 5
-        
+
         return max(0, min(100, base_score))
-    
-    
+
+
 
 cv_validator = CVValidator()
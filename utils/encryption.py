@@ -1,5 +1,4 @@
 
-from cryptography.fernet import Fernet
 import os
 import base64
 from werkzeug.security import generate_password_hash
@@ -7,6 +6,18 @@ import secrets
 
 class DataEncryption:
     def __init__(self):
+        # Szyfr tworzony przy pierwszym użyciu - import cryptography jest kosztowny
+        self._cipher = None
+
+    @property
+    def cipher(self):
+        if self._cipher is None:
+            self._cipher = self._create_cipher()
+        return self._cipher
+
+    def _create_cipher(self):
+        from cryptography.fernet import Fernet
+
         # Generate or load encryption key
         key = os.environ.get('ENCRYPTION_KEY')
         if not key:
@@ -17,7 +28,7 @@ class DataEncryption:
         else:
             key = key.encode()
         
-        self.cipher = Fernet(key)
+        return Fernet(key)
     
     def encrypt_text(self, text):
         """Encrypt sensitive text data"""
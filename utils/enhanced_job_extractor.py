@@ -1,18 +1,21 @@
 import os
-import json
 import logging
-import requests
 import urllib.parse
-from bs4 import BeautifulSoup
 from utils.openrouter_api import send_api_request
+from utils.response_parser import extract_json, ResponseParseError
+from utils.metrics import timed_phase
 
 logger = logging.getLogger(__name__)
 
+@timed_phase('scraping')
 def extract_job_info_from_url(url):
     """
     Automatycznie wyciąga tytuł stanowiska i opis pracy z linku do oferty
     Zwraca: {'job_title': str, 'job_description': str, 'company': str}
     """
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         logger.info(f"Wyciąganie informacji z URL: {url}")
         
@@ -279,23 +282,19 @@ Zwróć TYLKO JSON w formacie:
         
         # Spróbuj sparsować odpowiedź AI
         try:
-            # Znajdź JSON w odpowiedzi
-            import re
-            json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-            if json_match:
-                enhanced_info = json.loads(json_match.group())
-                
-                # Sprawdź czy AI poprawiło informacje
-                if enhanced_info.get('job_title') and len(enhanced_info['job_title']) > 3:
-                    job_info['job_title'] = enhanced_info['job_title']
-                
-                if enhanced_info.get('job_description') and len(enhanced_info['job_description']) > 50:
-                    job_info['job_description'] = enhanced_info['job_description']
-                
-                if enhanced_info.get('company') and len(enhanced_info['company']) > 2:
-                    job_info['company'] = enhanced_info['company']
+            enhanced_info = extract_json(ai_response)
+            
+            # Sprawdź czy AI poprawiło informacje
+            if enhanced_info.get('job_title') and len(enhanced_info['job_title']) > 3:
+                job_info['job_title'] = enhanced_info['job_title']
+            
+            if enhanced_info.get('job_description') and len(enhanced_info['job_description']) > 50:
+                job_info['job_description'] = enhanced_info['job_description']
+            
+            if enhanced_info.get('company') and len(enhanced_info['company']) > 2:
+                job_info['company'] = enhanced_info['company']
                     
-        except (json.JSONDecodeError, KeyError) as e:
+        except (ResponseParseError, KeyError) as e:
             logger.warning(f"Nie udało się sparsować odpowiedzi AI: {e}")
             # Jeśli AI nie zwróciło poprawnego JSON, zostaw oryginalne dane
             
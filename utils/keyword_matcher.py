@@ -0,0 +1,285 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import Counter, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Litery polskie + znaki występujące w nazwach technologii (c++, c#, node.js, ci/cd)
+TOKEN_RE = re.compile(r"[0-9a-ząćęłńóśźż][0-9a-ząćęłńóśźż+#./-]*[0-9a-ząćęłńóśźż+#]|[a-ząćęłńóśźż]")
+# "Python/Django", "SQL/NoSQL" to osobne umiejętności - dzielone, chyba że cały token to znany termin
+JOINED_SPLIT_RE = re.compile(r'[/.]+')
+
+STOPWORDS = frozenset("""
+a aby ale albo ani aż bardzo bez bo być będzie będziesz by byś był była było były co czy dla do gdy gdzie go
+i ich im innych jak jako jest jeśli jego jej jeszcze już każdy kiedy kto które który która które lub ma mają
+mamy masz może możesz na nad nam nas naszego naszej naszym nasz nasza nasze nie niż o od oraz po pod poza
+przez przy są się sobie swoje ta tak takie także tam te tego tej ten też to tu twoje ty u w we wraz z za ze
+że oferujemy wymagania wymagamy mile widziane oczekujemy zakres obowiązków praca pracy osoba osób kandydat
+kandydata szukamy firma firmy rok lat lata min minimum dobra dobry dobrze bardzo m.in np itp itd
+an and are as at be by can for from has have in is it its of on or our the their to we will with you your
+who what which this that these those all any able about experience years year work working team role
+strong good great plus nice must should would etc
+""".split())
+
+# Końcówki fleksyjne (najdłuższe najpierw) - lekki stemming dla polskiej odmiany i prostych form angielskich.
+# Komplet przypadków dla rzeczowników odczasownikowych (-anie/-enie), przymiotników (-owy, -ski)
+# i rzeczowników na -ość/-ja/-ia, tak aby wszystkie formy jednego słowa dawały ten sam rdzeń
+# (sprawdza benchmarks/check_keyword_stems.py)
+SUFFIXES = sorted("""
+owaniami owaniach owaniem owania owanie owaniu ościami ościach ością ości ość
+owego owemu owymi owych owym owej ową owe owy owa
+iego iemu iej iami iach iem ami ach ego emu ymi imi ych ich owi om ów ąc em ie ia iu ii ią ej ym im
+ing ed es s ą ę y i a u e o
+""".split(), key=len, reverse=True)
+MIN_STEM = 4
+
+# Słowa typowe dla każdego ogłoszenia - nie są słowami kluczowymi (porównywane po rdzeniu)
+BOILERPLATE = """
+znajomość doświadczenie poszukujemy obowiązki obowiązków poziom poziomie umiejętność umiejętności wiedza wymagane
+oferta tworzenie język języka zadania zespół zespole klient klientów stanowisko projekt projekty
+knowledge skills requirements responsibilities looking level offer tasks ability
+""".split()
+
+# Umiejętność kanoniczna -> warianty (PL/EN, skróty); frazy wielowyrazowe dopasowywane po rdzeniach
+SKILL_SYNONYMS = {
+    'JavaScript': ['javascript', 'js', 'java script'],
+    'TypeScript': ['typescript', 'ts'],
+    'Python': ['python'],
+    'Java': ['java'],
+    'C#': ['c#', 'csharp'],
+    'C++': ['c++', 'cpp'],
+    'SQL': ['sql', 't-sql', 'pl/sql'],
+    'PostgreSQL': ['postgresql', 'postgres', 'psql'],
+    'React': ['react', 'react.js', 'reactjs'],
+    'Node.js': ['node.js', 'nodejs'],
+    'Docker': ['docker'],
+    'Kubernetes': ['kubernetes', 'k8s'],
+    'AWS': ['aws', 'amazon web services'],
+    'Azure': ['azure', 'microsoft azure'],
+    'GCP': ['gcp', 'google cloud'],
+    'CI/CD': ['ci/cd', 'continuous integration'],
+    'Git': ['git', 'github', 'gitlab'],
+    'Excel': ['excel', 'ms excel', 'microsoft excel', 'arkusze kalkulacyjne'],
+    'Power BI': ['power bi', 'powerbi'],
+    'Machine Learning': ['machine learning', 'ml', 'uczenie maszynowe'],
+    'Data Analysis': ['data analysis', 'analiza danych', 'analityka danych'],
+    'Project Management': ['project management', 'zarządzanie projektami'],
+    'Agile/Scrum': ['agile', 'scrum', 'metodyki zwinne', 'kanban'],
+    'Leadership': ['leadership', 'przywództwo', 'zarządzanie zespołem', 'team management'],
+    'Communication': ['communication', 'komunikacja', 'komunikatywność', 'umiejętności komunikacyjne'],
+    'Teamwork': ['teamwork', 'praca zespołowa', 'praca w zespole'],
+    'Customer Service': ['customer service', 'obsługa klienta'],
+    'Sales': ['sales', 'sprzedaż'],
+    'Accounting': ['accounting', 'księgowość', 'rachunkowość'],
+    'English': ['english', 'angielski', 'język angielski'],
+    'German': ['german', 'niemiecki', 'język niemiecki'],
+    'Driving License': ['driving license', 'prawo jazdy'],
+    'SAP': ['sap'],
+    'Jira': ['jira'],
+    'Linux': ['linux'],
+}
+
+# Terminy ze słownika zawierające '/' lub '.' (ci/cd, pl/sql, node.js) - nie są dzielone
+JOINED_TERMS = frozenset(variant for variants in SKILL_SYNONYMS.values() for variant in variants
+                         if ' ' not in variant and ('/' in variant or '.' in variant))
+
+KeywordMatch = namedtuple('KeywordMatch', ['match_percentage', 'found', 'missing', 'weights'])
+
+
+def stem(token):
+    """
+    Lekki stemming: odcięcie najdłuższej pasującej końcówki, rdzeń co najmniej MIN_STEM znaków.
+    Oboczność ó/o w rdzeniu jest ujednolicana (zespół/zespołu, zawód/zawodowy).
+    """
+    if len(token) <= MIN_STEM or not token.isalpha():
+        return token
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)].replace('ó', 'o')
+    return token.replace('ó', 'o')
+
+
+def tokenize(text):
+    """Tokeny (małe litery) bez słów funkcyjnych; terminy łączone '/' lub '.' rozbite na części"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if token in JOINED_TERMS or ('/' not in token and '.' not in token):
+            tokens.append(token)
+            continue
+        tokens.extend(part for part in (p.strip('-') for p in JOINED_SPLIT_RE.split(token))
+                      if part and part not in STOPWORDS)
+    return tokens
+
+
+def _build_phrase_index(synonyms):
+    index = {}
+    for canonical, variants in synonyms.items():
+        for variant in variants:
+            # Ta sama tokenizacja co dla tekstu - słowa funkcyjne w wariantach są pomijane
+            stems = tuple(stem(t) for t in tokenize(variant))
+            if stems:
+                index[stems] = canonical
+    return index
+
+
+class KeywordMatcher:
+    """
+    Lokalne dopasowanie słów kluczowych CV do oferty (bez wywołania LLM).
+    Umiejętności ze słownika synonimów są rozpoznawane niezależnie od języka i odmiany,
+    pozostałe terminy oferty są ważone TF-IDF względem zapisanych opisów stanowisk (cv_uploads).
+    Tabela IDF jest budowana i odświeżana w wątku tła - request nigdy nie czeka na korpus
+    (do pierwszego wczytania wagi to samo TF).
+    """
+
+    def __init__(self, corpus_size=2000, corpus_refresh=3600, top_terms=25):
+        self.corpus_size = corpus_size
+        self.corpus_refresh = corpus_refresh
+        self.top_terms = top_terms
+        self._phrases = _build_phrase_index(SKILL_SYNONYMS)
+        self._max_phrase = max(len(p) for p in self._phrases)
+        self._boilerplate = frozenset(stem(w) for w in BOILERPLATE)
+        # (częstości dokumentowe, liczba dokumentów) - jedna krotka, podmieniana w całości
+        self._corpus = (Counter(), 0)
+        self._app = None
+        self._refresher_pid = None
+        self._refresher_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.corpus_size = app.config.get('KEYWORD_CORPUS_SIZE', self.corpus_size)
+        self.corpus_refresh = app.config.get('KEYWORD_CORPUS_REFRESH', self.corpus_refresh)
+        self._app = app
+
+    def extract_terms(self, text):
+        """
+        Terminy tekstu: {klucz: (forma do wyświetlenia, liczba wystąpień)}.
+        Klucz umiejętności ze słownika to 'skill:<nazwa>', pozostałych słów - rdzeń.
+        """
+        tokens = tokenize(text)
+        stems = [stem(t) for t in tokens]
+        terms = {}
+        covered = set()
+        for n in range(self._max_phrase, 0, -1):
+            for i in range(len(stems) - n + 1):
+                if any(j in covered for j in range(i, i + n)):
+                    continue
+                canonical = self._phrases.get(tuple(stems[i:i + n]))
+                if canonical is None:
+                    continue
+                key = f"skill:{canonical}"
+                count = terms[key][1] + 1 if key in terms else 1
+                terms[key] = (canonical, count)
+                covered.update(range(i, i + n))
+
+        for i, (token, token_stem) in enumerate(zip(tokens, stems)):
+            if i in covered or len(token) < 3 or token.isdigit() or token_stem in self._boilerplate:
+                continue
+            surface, count = terms.get(token_stem, (token, 0))
+            terms[token_stem] = (surface, count + 1)
+        return terms
+
+    def _load_corpus(self):
+        """Częstości dokumentowe z ostatnich opisów stanowisk zapisanych w bazie"""
+        from models import db, CVUpload
+        from sqlalchemy import select
+
+        table = CVUpload.__table__
+        try:
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(table.c.job_description)
+                    .where(table.c.job_description.isnot(None))
+                    .order_by(table.c.id.desc())
+                    .limit(self.corpus_size)).scalars().all()
+        except Exception as e:
+            # Bez korpusu (np. poza kontekstem aplikacji) wagi to samo TF
+            logger.debug(f"Korpus opisów stanowisk niedostępny: {e}")
+            rows = []
+
+        doc_freq = Counter()
+        for description in rows:
+            doc_freq.update(self.extract_terms(description).keys())
+        return doc_freq, len(rows)
+
+    @staticmethod
+    def _idf(corpus, key):
+        doc_freq, doc_count = corpus
+        return math.log((doc_count + 1) / (doc_freq.get(key, 0) + 1)) + 1
+
+    def refresh_corpus(self):
+        """Wczytaj korpus i podmień tabelę IDF jednym przypisaniem (czytający widzą starą albo nową)"""
+        if self._app is not None:
+            with self._app.app_context():
+                corpus = self._load_corpus()
+        else:
+            corpus = self._load_corpus()
+        self._corpus = corpus
+        logger.debug(f"Korpus słów kluczowych: {corpus[1]} opisów stanowisk")
+
+    def start_refresher(self):
+        """Uruchom wątek odświeżający korpus raz na proces (również po forku workera gunicorna)"""
+        if self._refresher_pid == os.getpid():
+            return
+        with self._refresher_lock:
+            if self._refresher_pid == os.getpid():
+                return
+            threading.Thread(target=self._refresh_loop, name='keyword-corpus', daemon=True).start()
+            self._refresher_pid = os.getpid()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh_corpus()
+            except Exception as e:
+                logger.error(f"Błąd odświeżania korpusu słów kluczowych: {e}")
+            time.sleep(self.corpus_refresh)
+
+    def match(self, cv_text, job_description):
+        """Znalezione/brakujące terminy oferty (od najważniejszych) i ważone pokrycie 0-100"""
+        self.start_refresher()
+        corpus = self._corpus
+        job_terms = self.extract_terms(job_description)
+        cv_terms = self.extract_terms(cv_text)
+
+        weights = {}
+        for key, (surface, count) in job_terms.items():
+            # Umiejętności ze słownika zawsze ważniejsze od pojedynczych słów
+            boost = 2.0 if key.startswith('skill:') else 1.0
+            weights[key] = boost * (1 + math.log(count)) * self._idf(corpus, key)
+        top = sorted(weights, key=lambda k: (-weights[k], k))[:self.top_terms]
+
+        found = [job_terms[k][0] for k in top if k in cv_terms]
+        missing = [job_terms[k][0] for k in top if k not in cv_terms]
+        total = sum(weights[k] for k in top)
+        matched = sum(weights[k] for k in top if k in cv_terms)
+        percentage = round(100 * matched / total) if total else 0
+        return KeywordMatch(percentage, found, missing, {job_terms[k][0]: round(weights[k], 3) for k in top})
+
+    def analyze(self, cv_text, job_description, language='pl'):
+        """Wynik w formacie dotychczasowej odpowiedzi LLM dla analizy słów kluczowych"""
+        result = self.match(cv_text, job_description)
+        priority = result.missing[:5]
+        if language == 'en':
+            recommendations = [f"Add or highlight: {term}" for term in priority]
+            summary = (f"The CV covers {result.match_percentage}% of the weighted job keywords "
+                       f"({len(result.found)} found, {len(result.missing)} missing).")
+        else:
+            recommendations = [f"Dodaj lub podkreśl: {term}" for term in priority]
+            summary = (f"CV pokrywa {result.match_percentage}% ważonych słów kluczowych oferty "
+                       f"({len(result.found)} znalezionych, {len(result.missing)} brakujących).")
+        return {
+            'match_percentage': result.match_percentage,
+            'found_keywords': result.found,
+            'missing_keywords': result.missing,
+            'recommendations': recommendations,
+            'priority_additions': priority,
+            'summary': summary,
+        }
+
+
+keyword_matcher = KeywordMatcher()
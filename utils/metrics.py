@@ -0,0 +1,168 @@
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context
+
+# Domyślne przedziały (w bajtach) dla histogramów rozmiaru
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Przedziały (w sekundach) dla histogramów czasu odpowiedzi
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Fazy, na które dzielimy czas obsługi requestu
+PHASES = ('db', 'llm', 'pdf_parse', 'pdf_render', 'scraping')
+
+
+class Histogram:
+    """Histogram o stałych przedziałach - O(log n) na obserwację, bez przechowywania próbek"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = self.count
+        return {'buckets': buckets, 'count': self.count, 'sum': round(self.sum, 6)}
+
+
+class MetricsRegistry:
+    """Proste metryki procesu (liczniki i histogramy) z etykietami"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set_gauge(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, buckets=SIZE_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def snapshot(self):
+        """Zwróć kopię wszystkich metryk w formacie gotowym do JSON"""
+        with self._lock:
+            counters = defaultdict(list)
+            for (name, labels), value in self._counters.items():
+                counters[name].append({'labels': dict(labels), 'value': value})
+
+            gauges = defaultdict(list)
+            for (name, labels), value in self._gauges.items():
+                gauges[name].append({'labels': dict(labels), 'value': value})
+
+            histograms = defaultdict(list)
+            for (name, labels), histogram in self._histograms.items():
+                entry = histogram.snapshot()
+                entry['labels'] = dict(labels)
+                histograms[name].append(entry)
+
+        return {'counters': dict(counters), 'gauges': dict(gauges), 'histograms': dict(histograms)}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def start_request_timing():
+    """Rozpocznij pomiar requestu (zegar monotoniczny) i wyzeruj podział na fazy"""
+    g.request_started = time.perf_counter()
+    g.request_phases = defaultdict(float)
+    g.phase_stack = []
+
+
+def add_phase_time(name, seconds, inclusive=None):
+    """Dolicz czas do fazy bieżącego requestu (np. z event listenera bazy danych)"""
+    if has_request_context() and hasattr(g, 'request_phases'):
+        stack = g.phase_stack
+        if stack:
+            # Faza nadrzędna odejmie pełny czas fazy zagnieżdżonej - bez podwójnego liczenia
+            stack[-1][1] += seconds if inclusive is None else inclusive
+        g.request_phases[name] += seconds
+    metrics.observe('phase_seconds', seconds, LATENCY_BUCKETS, phase=name)
+
+
+@contextmanager
+def phase(name):
+    """Mierz czas bloku jako fazę requestu, np. `with phase('llm'): ...`"""
+    tracked = has_request_context() and hasattr(g, 'phase_stack')
+    frame = [name, 0.0]
+    if tracked:
+        g.phase_stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if tracked:
+            g.phase_stack.pop()
+        add_phase_time(name, elapsed - frame[1], inclusive=elapsed)
+
+
+def timed_phase(name):
+    """Dekorator - cały czas wywołania funkcji liczony jako faza `name`"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            with phase(name):
+                return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def install_db_timing():
+    """Licz czas zapytań SQLAlchemy jako fazę 'db'"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if getattr(install_db_timing, 'installed', False):
+        return
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if starts:
+            add_phase_time('db', time.perf_counter() - starts.pop())
+
+    install_db_timing.installed = True
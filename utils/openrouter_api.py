@@ -1,13 +1,13 @@
 import os
+import re
 import json
 import logging
-import requests
 import urllib.parse
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
 
-# Load environment variables from .env file with override
-load_dotenv(override=True)
+from utils.metrics import timed_phase
+
+# requests i bs4 są importowane przy pierwszym użyciu - import modułu nie kosztuje ~0.15 s.
+# Zmienne z .env ładuje app.py przed importem tego modułu.
 
 logger = logging.getLogger(__name__)
 
@@ -31,8 +31,15 @@ def validate_api_key():
     logger.info(f"✅ OpenRouter API key załadowany poprawnie (długość: {len(OPENROUTER_API_KEY)})")
     return True
 
-# Validate on module import
-API_KEY_VALID = validate_api_key()
+# Walidacja przy pierwszym zapytaniu do API, nie przy imporcie modułu
+API_KEY_VALID = None
+
+
+def is_api_key_valid():
+    global API_KEY_VALID
+    if API_KEY_VALID is None:
+        API_KEY_VALID = validate_api_key()
+    return API_KEY_VALID
 
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
 MODEL = "qwen/qwen-2.5-72b-instruct:free"
@@ -80,17 +87,29 @@ DEEP_REASONING_PROMPT = """Jesteś światowej klasy ekspertem w rekrutacji i opt
 - MOŻNA TYLKO lepiej sformułować istniejące prawdziwe informacje
 - Każda wymyślona informacja niszczy wiarygodność kandydata"""
 
+# Tryb structured output: 'json_schema' (schemat zadania), 'json_object' albo 'off'.
+# Modele/dostawcy bez obsługi response_format odrzucają zapytanie (400) - wtedy tryb jest
+# wyłączany do końca procesu, a walidacja i poprawki z utils.structured_output działają dalej.
+RESPONSE_FORMAT_MODE = os.environ.get("OPENROUTER_RESPONSE_FORMAT", "json_object").strip().lower()
+RESPONSE_FORMAT_SUPPORTED = True
+# Treść błędu 400 wskazująca na brak obsługi structured output (a nie np. zbyt długi prompt)
+RESPONSE_FORMAT_ERROR_RE = re.compile(r'response_format|json_schema|json_object|structured.output', re.IGNORECASE)
+
 headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {OPENROUTER_API_KEY}",
     "HTTP-Referer": "https://cv-optimizer-pro.repl.co/"
 }
 
-def send_api_request(prompt, max_tokens=2000, language='pl', user_tier='free', task_type='default', industry='general'):
+@timed_phase('llm')
+def send_api_request(prompt, max_tokens=2000, language='pl', user_tier='free', task_type='default', industry='general',
+                     response_format=None, with_finish_reason=False):
     """
-    Send a request to the OpenRouter API with enhanced configuration
+    Send a request to the OpenRouter API with enhanced configuration.
+    with_finish_reason=True zwraca (treść, finish_reason) - 'length' oznacza odpowiedź uciętą na max_tokens.
     """
-    if not OPENROUTER_API_KEY or not API_KEY_VALID:
+    global RESPONSE_FORMAT_SUPPORTED
+    if not OPENROUTER_API_KEY or not is_api_key_valid():
         error_msg = "OpenRouter API key nie jest poprawnie skonfigurowany w pliku .env"
         logger.error(error_msg)
         raise ValueError(error_msg)
@@ -123,17 +142,33 @@ def send_api_request(prompt, max_tokens=2000, language='pl', user_tier='free', t
             "language": language
         }
     }
+    if response_format and RESPONSE_FORMAT_SUPPORTED:
+        payload["response_format"] = response_format
+
+    import requests
 
     try:
         logger.debug(f"Sending request to OpenRouter API")
         response = requests.post(OPENROUTER_BASE_URL, headers=headers, json=payload)
+        if response.status_code == 400 and "response_format" in payload:
+            if RESPONSE_FORMAT_ERROR_RE.search(response.text):
+                logger.warning(f"Model odrzucił response_format ({response.text[:200]}) - wyłączam structured output")
+                RESPONSE_FORMAT_SUPPORTED = False
+            else:
+                # Inny błąd (np. długość kontekstu) - ponowienie tylko tego zapytania, tryb zostaje włączony
+                logger.warning(f"Błąd 400 z response_format ({response.text[:200]}) - ponawiam bez response_format")
+            del payload["response_format"]
+            response = requests.post(OPENROUTER_BASE_URL, headers=headers, json=payload)
         response.raise_for_status()
 
         result = response.json()
         logger.debug("Received response from OpenRouter API")
 
         if 'choices' in result and len(result['choices']) > 0:
-            return result['choices'][0]['message']['content']
+            choice = result['choices'][0]
+            if with_finish_reason:
+                return choice['message']['content'], choice.get('finish_reason')
+            return choice['message']['content']
         else:
             raise ValueError("Unexpected API response format")
 
@@ -145,6 +180,31 @@ def send_api_request(prompt, max_tokens=2000, language='pl', user_tier='free', t
         logger.error(f"Error parsing API response: {str(e)}")
         raise Exception(f"Failed to parse OpenRouter API response: {str(e)}")
 
+def send_structured_request(task_name, prompt, max_tokens=2000, language='pl', user_tier='free',
+                            task_type='default'):
+    """
+    Zapytanie z odpowiedzią JSON zgodną ze schematem zadania (utils.structured_output.TASKS).
+    Błędne pola są poprawiane osobnym, krótkim zapytaniem zamiast ponownej generacji całości.
+    Zwraca JSON jako tekst (jak send_api_request) albo surową odpowiedź, gdy JSON-a nie udało się uzyskać.
+    ValueError, gdy brakuje głównego pola zadania (np. optimized_cv uciętego i niepoprawionego) -
+    lepiej zgłosić błąd niż oddać połowę CV.
+    """
+    from utils.structured_output import TASKS, request_structured
+
+    def send(request_prompt, request_max_tokens, response_format):
+        return send_api_request(request_prompt, max_tokens=request_max_tokens, language=language,
+                                user_tier=user_tier, task_type=task_type, response_format=response_format,
+                                with_finish_reason=True)
+
+    task = TASKS[task_name]
+    mode = RESPONSE_FORMAT_MODE if RESPONSE_FORMAT_SUPPORTED else 'off'
+    data, raw = request_structured(task, prompt, send, max_tokens, mode)
+    if data is None:
+        return raw
+    if task.primary and task.primary not in data:
+        raise ValueError("Odpowiedź AI była niepełna (przekroczony limit długości). Spróbuj ponownie.")
+    return json.dumps(data, ensure_ascii=False)
+
 def analyze_cv_score(cv_text, job_description="", language='pl'):
     """
     Analizuje CV i przyznaje ocenę punktową 1-100 z szczegółowym uzasadnieniem
@@ -189,7 +249,8 @@ def analyze_cv_score(cv_text, job_description="", language='pl'):
         "summary": "Krótkie podsumowanie oceny CV"
     }}
     """
-    return send_api_request(
+    return send_structured_request(
+        'cv_score',
         prompt, 
         max_tokens=2500, 
         language=language,
@@ -197,43 +258,38 @@ def analyze_cv_score(cv_text, job_description="", language='pl'):
         task_type='cv_optimization'
     )
 
-def analyze_keywords_match(cv_text, job_description, language='pl'):
+def analyze_keywords_match(cv_text, job_description, language='pl', narrative=False):
     """
-    Analizuje dopasowanie słów kluczowych z CV do wymagań oferty pracy
+    Analizuje dopasowanie słów kluczowych z CV do wymagań oferty pracy.
+    Dopasowanie liczone lokalnie (utils/keyword_matcher.py); LLM tylko opcjonalnie pisze podsumowanie.
     """
     if not job_description:
         return "Brak opisu stanowiska do analizy słów kluczowych."
 
-    prompt = f"""
-    Przeanalizuj dopasowanie słów kluczowych między CV a wymaganiami oferty pracy.
+    from utils.keyword_matcher import keyword_matcher
 
-    CV:
-    {cv_text}
+    result = keyword_matcher.analyze(cv_text, job_description, language)
 
-    Oferta pracy:
-    {job_description}
+    if narrative:
+        prompt = f"""
+    Napisz krótkie (3-4 zdania) podsumowanie dopasowania CV do oferty pracy na podstawie analizy słów kluczowych.
 
-    Odpowiedź w formacie JSON:
-    {{
-        "match_percentage": [0-100],
-        "found_keywords": ["słowo1", "słowo2", "słowo3"],
-        "missing_keywords": ["brakujące1", "brakujące2", "brakujące3"],
-        "recommendations": [
-            "Dodaj umiejętność: [nazwa]",
-            "Podkreśl doświadczenie w: [obszar]",
-            "Użyj terminów branżowych: [terminy]"
-        ],
-        "priority_additions": ["najważniejsze słowo1", "najważniejsze słowo2"],
-        "summary": "Krótkie podsumowanie analizy dopasowania"
-    }}
+    Dopasowanie: {result['match_percentage']}%
+    Znalezione słowa kluczowe: {', '.join(result['found_keywords'])}
+    Brakujące słowa kluczowe: {', '.join(result['missing_keywords'])}
     """
-    return send_api_request(
-        prompt, 
-        max_tokens=2000, 
-        language=language,
-        user_tier='free',
-        task_type='cv_optimization'
-    )
+        try:
+            result['summary'] = send_api_request(
+                prompt,
+                max_tokens=400,
+                language=language,
+                user_tier='free',
+                task_type='cv_optimization'
+            ).strip()
+        except Exception as e:
+            logger.warning(f"Podsumowanie LLM analizy słów kluczowych niedostępne: {str(e)}")
+
+    return json.dumps(result, ensure_ascii=False, indent=2)
 
 def check_grammar_and_style(cv_text, language='pl'):
     """
@@ -543,7 +599,8 @@ def analyze_polish_job_posting(job_description, language='pl'):
         "summary": "zwięzłe podsumowanie stanowiska i wymagań"
     }}
     """
-    return send_api_request(
+    return send_structured_request(
+        'job_posting_analysis',
         prompt, 
         max_tokens=2000,
         language=language,
@@ -669,7 +726,8 @@ def generate_complete_cv_content(target_position, experience_level, industry, br
         "generation_notes": "Informacje o logice generowania tego CV"
     }}
     """
-    return send_api_request(
+    return send_structured_request(
+        'cv_content',
         prompt,
         max_tokens=4000,
         language=language,
@@ -756,6 +814,54 @@ def optimize_cv(cv_text, job_description, language='pl', is_premium=False, payme
         task_type='cv_optimization'
     )
 
+SECTION_MARKER_RE = re.compile(r'^[ \t]*=== SEKCJA (\d+) ===[ \t]*$', re.MULTILINE)
+
+
+def optimize_cv_sections(sections, job_description, language='pl', is_premium=False, payment_verified=False):
+    """
+    Optymalizacja wybranych sekcji CV (nie całego dokumentu) - odpowiedź zawiera tylko te sekcje,
+    więc liczba generowanych tokenów rośnie z rozmiarem zmian lub porcji, a nie całego CV.
+    Zwraca zoptymalizowane teksty w kolejności wejścia; ValueError, gdy brakuje którejś sekcji.
+    """
+    numbered = "\n\n".join(f"=== SEKCJA {i} ===\n{text.strip()}" for i, text in enumerate(sections, start=1))
+    prompt = f"""
+    ZADANIE: Zoptymalizuj poniższe sekcje CV używając WYŁĄCZNIE prawdziwych informacji z tych sekcji.
+    Pozostałe części CV są optymalizowane osobno - nie twórz ich.
+
+    ZASADY:
+    1. ❌ NIE dodawaj nowych firm, stanowisk, dat, osiągnięć, umiejętności
+    2. ✅ Przepisz treść bardziej profesjonalnie, używając czasowników akcji i słów kluczowych z oferty
+    3. ✅ Zachowaj nagłówek każdej sekcji (pierwszą linię) i jej zakres - nie łącz ani nie dziel sekcji
+    4. ✅ Zwróć KAŻDĄ sekcję poprzedzoną dokładnie tą samą linią "=== SEKCJA n ===" co na wejściu
+
+    OPIS STANOWISKA (dla kontekstu):
+    {job_description}
+
+    SEKCJE DO OPTYMALIZACJI:
+    {numbered}
+
+    ZWRÓĆ TYLKO SEKCJE ZE ZNACZNIKAMI - bez komentarzy, JSON ani metadanych.
+    """
+
+    # ~3 znaki na token w tekście polskim, zoptymalizowana sekcja bywa dłuższa od oryginału
+    total_chars = sum(len(text) for text in sections)
+    max_tokens = min(4000 if is_premium or payment_verified else 2500, max(400, total_chars // 2))
+
+    response = send_api_request(
+        prompt,
+        max_tokens=max_tokens,
+        language=language,
+        user_tier='premium' if is_premium else ('paid' if payment_verified else 'free'),
+        task_type='cv_optimization'
+    )
+
+    parts = SECTION_MARKER_RE.split(response)
+    optimized = {int(number): text.strip('\n') for number, text in zip(parts[1::2], parts[2::2])}
+    missing = [i for i in range(1, len(sections) + 1) if not optimized.get(i, '').strip()]
+    if missing:
+        raise ValueError(f"Odpowiedź nie zawiera sekcji: {missing}")
+    return [optimized[i] for i in range(1, len(sections) + 1)]
+
 def generate_recruiter_feedback(cv_text, job_description="", language='pl'):
     """
     Generate feedback on a CV as if from an AI recruiter
@@ -865,10 +971,14 @@ def generate_cover_letter(cv_text, job_description, language='pl'):
         task_type='cover_letter'
     )
 
+@timed_phase('scraping')
 def analyze_job_url(url):
     """
     Extract job description from a URL with improved handling for popular job sites
     """
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         logger.debug(f"Analyzing job URL: {url}")
 
@@ -990,94 +1100,83 @@ def summarize_job_description(job_text):
         task_type='cv_optimization'
     )
 
-def ats_optimization_check(cv_text, job_description="", language='pl'):
-    """
-    Check CV against ATS (Applicant Tracking System) and provide suggestions for improvement
-    """
-    context = ""
-    if job_description:
-        context = f"Ogłoszenie o pracę dla odniesienia:\n{job_description[:2000]}"
+def format_ats_report(report, language='pl'):
+    """Raport ATS (wynik utils/ats_checker.py) w formacie dotychczasowej odpowiedzi tekstowej"""
+    from utils.ats_checker import section_labels
 
-    prompt = f"""
-    TASK: Przeprowadź dogłębną analizę CV pod kątem kompatybilności z systemami ATS (Applicant Tracking System) i wykryj potencjalne problemy.
+    if language == 'en':
+        severity_labels = {'critical': 'CRITICAL ISSUES', 'warning': 'WARNINGS', 'info': 'MINOR NOTES'}
+        texts = {'title': "## ATS CV ANALYSIS", 'rating': "OVERALL RATING (scale 1-10)", 'none': 'none',
+                 'sections': "DETECTED SECTIONS", 'no_sections': 'no recognized headings',
+                 'keywords': "KEYWORD ANALYSIS", 'coverage': 'Coverage', 'found': 'Found', 'missing': 'Missing'}
+    else:
+        severity_labels = {'critical': 'PROBLEMY KRYTYCZNE', 'warning': 'OSTRZEŻENIA', 'info': 'DROBNE UWAGI'}
+        texts = {'title': "## ANALIZA ATS CV", 'rating': "OCENA OGÓLNA (skala 1-10)", 'none': 'brak',
+                 'sections': "WYKRYTE SEKCJE", 'no_sections': 'brak rozpoznanych nagłówków',
+                 'keywords': "ANALIZA SŁÓW KLUCZOWYCH", 'coverage': 'Pokrycie', 'found': 'Znalezione',
+                 'missing': 'Brakujące'}
+    lines = [texts['title'], "", f"1. {texts['rating']}: {report['rating']} ({report['score']}/100)"]
 
-    Przeprowadź następujące analizy:
+    for number, (severity, label) in enumerate(severity_labels.items(), start=2):
+        messages = [f['message'] for f in report['findings'] if f['severity'] == severity]
+        lines += ["", f"{number}. {label}:"] + [f"- {m}" for m in messages or [texts['none']]]
 
-    1. WYKRYWANIE PROBLEMÓW STRUKTURALNYCH:
-       - Znajdź sekcje, które są w nieodpowiednich miejscach (np. doświadczenie zawodowe w sekcji zainteresowań)
-       - Wskaż niespójności w układzie i formatowaniu
-       - Zidentyfikuj zduplikowane informacje w różnych sekcjach
-       - Zaznacz fragmenty tekstu, które wyglądają na wygenerowane przez AI
-       - Znajdź ciągi znaków bez znaczenia lub losowe znaki
+    labels = section_labels(language)
+    found = [labels[name] for name, present in report['sections'].items() if present]
+    lines += ["", f"5. {texts['sections']}:", f"- {', '.join(found) if found else texts['no_sections']}"]
 
-    2. ANALIZA FORMATOWANIA ATS:
-       - Wykryj problemy z formatowaniem, które mogą utrudnić odczyt przez systemy ATS
-       - Sprawdź, czy nagłówki sekcji są odpowiednio wyróżnione
-       - Zweryfikuj, czy tekst jest odpowiednio podzielony na sekcje
-       - Oceń czytelność dla systemów automatycznych
+    coverage = report['keyword_coverage']
+    if coverage:
+        lines += ["", f"6. {texts['keywords']}:",
+                  f"- {texts['coverage']}: {coverage['match_percentage']}%",
+                  f"- {texts['found']}: {', '.join(coverage['found_keywords']) or texts['none']}",
+                  f"- {texts['missing']}: {', '.join(coverage['missing_keywords']) or texts['none']}"]
+    return "\n".join(lines)
 
-    3. ANALIZA SŁÓW KLUCZOWYCH:
-       - Sprawdź gęstość słów kluczowych i trafność ich wykorzystania
-       - Zidentyfikuj brakujące słowa kluczowe z branży/stanowiska
-       - Oceń rozmieszczenie słów kluczowych w dokumencie
 
-    4. OCENA KOMPLETNOŚCI:
-       - Zidentyfikuj brakujące sekcje lub informacje, które są często wymagane przez ATS
-       - Wskaż informacje, które należy uzupełnić
+def ats_optimization_check(cv_text, job_description="", language='pl', enrich=True, max_enriched=5):
+    """
+    Check CV against ATS (Applicant Tracking System) and provide suggestions for improvement.
+    Ocena i ustalenia liczone regułowo (utils/ats_checker.py); LLM dostaje tylko najważniejsze
+    ustalenia i dopisuje do nich konkretne rekomendacje naprawcze.
+    """
+    from utils.ats_checker import ats_checker
 
-    5. WERYFIKACJA AUTENTYCZNOŚCI:
-       - Zaznacz fragmenty, które wyglądają na sztuczne lub wygenerowane przez AI
-       - Podkreśl niespójności między różnymi częściami CV
+    report = ats_checker.check(cv_text, job_description, language)
+    result = format_ats_report(report, language)
 
-    6. OCENA OGÓLNA:
-       - Oceń ogólną skuteczność CV w systemach ATS w skali 1-10
-       - Podaj główne powody obniżonej oceny
+    top_findings = report['findings'][:max_enriched]
+    if not enrich or not top_findings:
+        return result
 
-    {context}
+    findings_text = "\n".join(f"- [{f['severity']}] {f['message']}" for f in top_findings)
+    prompt = f"""
+    Automatyczna analiza ATS wykryła w CV następujące problemy:
+    {findings_text}
 
-    CV do analizy:
-    {cv_text}
+    Fragment CV (początek):
+    {cv_text[:1500]}
 
-    Odpowiedz w tym samym języku co CV. Jeśli CV jest po polsku, odpowiedz po polsku.
-    Dodaj główny nagłówek: "ANALIZA ATS CV"
+    Dla każdego problemu podaj jedną konkretną, praktyczną rekomendację naprawczą (1-2 zdania).
+    Nie dodawaj nowych problemów i nie oceniaj CV ponownie.
 
     Format odpowiedzi:
-
-    ## ANALIZA ATS CV
-
-    1. OCENA OGÓLNA (skala 1-10): [ocena]
-
-    2. PROBLEMY KRYTYCZNE:
-    [Lista wykrytych krytycznych problemów]
-
-    3. PROBLEMY ZE STRUKTURĄ:
-    [Lista problemów strukturalnych]
-
-    4. PROBLEMY Z FORMATOWANIEM ATS:
-    [Lista problemów z formatowaniem]
-
-    5. ANALIZA SŁÓW KLUCZOWYCH:
-    [Wyniki analizy słów kluczowych]
-
-    6. BRAKUJĄCE INFORMACJE:
-    [Lista brakujących informacji]
-
-    7. PODEJRZANE ELEMENTY:
-    [Lista elementów, które wydają się wygenerowane przez AI lub są niespójne]
-
-    8. REKOMENDACJE NAPRAWCZE:
-    [Konkretne sugestie, jak naprawić zidentyfikowane problemy]
-
-    9. PODSUMOWANIE:
-    [Krótkie podsumowanie i zachęta]
+    - [problem]: [rekomendacja]
     """
-    return send_api_request(
-        prompt,
-        max_tokens=1800,
-        language=language,
-        user_tier='free',
-        task_type='cv_optimization'
-    )
+    try:
+        recommendations = send_api_request(
+            prompt,
+            max_tokens=600,
+            language=language,
+            user_tier='free',
+            task_type='cv_optimization'
+        )
+    except Exception as e:
+        logger.warning(f"Rekomendacje LLM do analizy ATS niedostępne: {str(e)}")
+        return result
+
+    heading = "REMEDIATION RECOMMENDATIONS" if language == 'en' else "REKOMENDACJE NAPRAWCZE"
+    return f"{result}\n\n7. {heading}:\n{recommendations.strip()}"
 
 def analyze_cv_strengths(cv_text, job_title="analityk danych", language='pl'):
     """
@@ -1252,7 +1351,8 @@ def enhanced_cv_optimization_with_reasoning(cv_text, job_description, language='
 
     max_tokens = 6000 if is_premium or payment_verified else 3000
 
-    return send_api_request(
+    return send_structured_request(
+        'cv_optimization_reasoning',
         prompt,
         max_tokens=max_tokens,
         language=language,
@@ -1307,28 +1407,13 @@ def intelligent_response_parser(response_text, expected_format='json'):
     A more robust parser that tries to extract and validate structured data.
     """
     if expected_format == 'json':
-        import re
-        # Attempt to find JSON within the response
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            json_string = json_match.group(0)
-            try:
-                data = json.loads(json_string)
-                # Basic validation: check if it's a dictionary (common for JSON responses)
-                if isinstance(data, dict):
-                    return data
-                else:
-                    logger.warning("Parsed JSON is not a dictionary.")
-                    return {"error": "Parsed JSON is not a dictionary.", "raw_response": response_text}
-            except json.JSONDecodeError:
-                logger.warning("Failed to decode JSON from extracted string.")
-                return {"error": "Failed to decode JSON.", "extracted_json": json_string, "raw_response": response_text}
-            except Exception as e:
-                logger.error(f"An unexpected error occurred during JSON parsing: {e}")
-                return {"error": f"An unexpected error occurred during parsing: {e}", "raw_response": response_text}
-        else:
-            logger.warning("No JSON object found in the response.")
-            return {"error": "No JSON object found in the response.", "raw_response": response_text}
+        from utils.response_parser import extract_json, ResponseParseError
+
+        try:
+            return extract_json(response_text)
+        except ResponseParseError as e:
+            logger.warning(f"No valid JSON object found in the response: {e}")
+            return {"error": str(e), "raw_response": response_text}
     else:
         # If other formats are needed in the future, add them here
-        return {"error": f"Unsupported expected format: {expected_format}", "raw_response": response_text}
\ No newline at end of file
+        return {"error": f"Unsupported expected format: {expected_format}", "raw_response": response_text}
@@ -0,0 +1,153 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statusy PaymentIntent, które już się nie zmienią - przy nich ledger nie pyta Stripe
+FINAL_STATUSES = frozenset({'succeeded', 'canceled'})
+
+
+class PaymentLedger:
+    """
+    Lokalny rejestr płatności Stripe (tabela payments) zasilany webhookiem.
+    Sprawdzenie uprawnień czyta rejestr (udane płatności cache'owane w pamięci per użytkownik),
+    a Stripe jest odpytywany tylko, gdy płatności nie ma w rejestrze lub nie ma jeszcze
+    ostatecznego statusu - np. gdy klient weryfikuje płatność przed dotarciem webhooka.
+    """
+
+    def __init__(self, cache_ttl=60, cache_size=10000):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.webhook_secret = None
+        self._get_stripe = None
+        # (user_id, payment_intent_id) -> czas wygaśnięcia; tylko pozytywne wyniki -
+        # webhook trafia do jednego workera, więc negatywny wynik w cache innego byłby nieaktualny
+        self._paid = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, get_stripe):
+        self.cache_ttl = app.config.get('PAYMENT_CACHE_TTL', self.cache_ttl)
+        self.webhook_secret = app.config.get('STRIPE_WEBHOOK_SECRET')
+        self._get_stripe = get_stripe
+        if not self.webhook_secret:
+            logger.warning("⚠️ STRIPE_WEBHOOK_SECRET nie jest ustawiony - webhook Stripe jest wyłączony")
+
+    @staticmethod
+    def _values(intent):
+        """Kolumny tabeli payments z obiektu PaymentIntent (StripeObject lub dict z webhooka)"""
+        data = intent.to_dict() if hasattr(intent, 'to_dict') else intent
+        metadata = data.get('metadata') or {}
+        try:
+            user_id = int(metadata.get('user_id'))
+        except (TypeError, ValueError):
+            user_id = None
+        return {
+            'id': data['id'],
+            'user_id': user_id,
+            'service': metadata.get('service'),
+            'amount': data.get('amount'),
+            'currency': data.get('currency'),
+            'status': data['status'],
+            'updated_at': datetime.utcnow(),
+        }
+
+    def record_intent(self, intent):
+        """Zapisz (upsert) stan PaymentIntent w rejestrze i zwróć zapisane wartości"""
+        from models import db, Payment
+
+        values = self._values(intent)
+        table = Payment.__table__
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        from sqlalchemy import case
+
+        upsert = insert(table).values(**values)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={
+                # Webhooki mogą przyjść w innej kolejności - udanej płatności nie cofamy
+                'status': case((table.c.status == 'succeeded', table.c.status),
+                               else_=upsert.excluded.status),
+                'user_id': upsert.excluded.user_id,
+                'service': upsert.excluded.service,
+                'amount': upsert.excluded.amount,
+                'currency': upsert.excluded.currency,
+                'updated_at': upsert.excluded.updated_at,
+            })
+        with db.engine.begin() as conn:
+            conn.execute(upsert)
+        return values
+
+    def _load(self, payment_intent_id):
+        from models import db, Payment
+        from sqlalchemy import select
+
+        table = Payment.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(select(table.c.user_id, table.c.status)
+                               .where(table.c.id == payment_intent_id)).first()
+        return row._asdict() if row else None
+
+    def is_paid(self, payment_intent_id, user_id=None):
+        """
+        Czy PaymentIntent zakończył się sukcesem (i należy do user_id, jeśli rejestr zna właściciela).
+        Wyjątki Stripe z zapytania awaryjnego są przekazywane wyżej.
+        """
+        key = (user_id, payment_intent_id)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._paid.get(key)
+            if expires_at is not None and expires_at > now:
+                metrics.inc('payment_checks_total', source='cache')
+                return True
+
+        payment = self._load(payment_intent_id)
+        source = 'ledger'
+        if payment is None or payment['status'] not in FINAL_STATUSES:
+            payment = self.record_intent(self._get_stripe().PaymentIntent.retrieve(payment_intent_id))
+            source = 'stripe'
+        metrics.inc('payment_checks_total', source=source)
+
+        if payment['status'] != 'succeeded':
+            return False
+        if user_id is not None and payment['user_id'] not in (None, user_id):
+            logger.warning(f"Płatność {payment_intent_id} należy do innego użytkownika niż {user_id}")
+            return False
+
+        with self._lock:
+            self._paid[key] = now + self.cache_ttl
+            self._paid.move_to_end(key)
+            while len(self._paid) > self.cache_size:
+                self._paid.popitem(last=False)
+        return True
+
+    def handle_webhook(self, payload, signature):
+        """
+        Zweryfikuj podpis zdarzenia Stripe i zapisz zmiany PaymentIntent w rejestrze.
+        ValueError przy błędnym payloadzie lub podpisie.
+        """
+        if not self.webhook_secret:
+            raise ValueError('Webhook Stripe nie jest skonfigurowany')
+
+        stripe = self._get_stripe()
+        try:
+            event = stripe.Webhook.construct_event(payload, signature, self.webhook_secret)
+        except stripe.error.SignatureVerificationError as e:
+            raise ValueError(f'Nieprawidłowy podpis webhooka: {e}') from e
+
+        event_type = event['type']
+        metrics.inc('stripe_webhooks_total', type=event_type)
+        if event_type.startswith('payment_intent.'):
+            values = self.record_intent(event['data']['object'])
+            logger.info(f"Webhook Stripe {event_type}: {values['id']} -> {values['status']}")
+        return event_type
+
+
+payment_ledger = PaymentLedger()
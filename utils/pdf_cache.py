@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import namedtuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CachedPDF = namedtuple('CachedPDF', ['key', 'path', 'hit'])
+
+# Poniżej tego limitu świeżo wygenerowany PDF byłby usuwany zanim użytkownik go pobierze
+MIN_CACHE_BYTES = 16 * 1024 * 1024
+
+
+class PDFCache:
+    """
+    Dyskowy cache wygenerowanych PDF-ów, wspólny dla workerów na jednej maszynie.
+    Klucz to sha256 z kanonicznego JSON-a (cv_data, szablon, wersja szablonu);
+    rozmiar katalogu jest ograniczony, najdawniej używane pliki (mtime) są usuwane jako pierwsze.
+    Pliki z cache są też źródłem dla endpointu pobierania (send_file z obsługą Range).
+    """
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'cv_optimizer_pdf_cache')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Przybliżony rozmiar katalogu - przeliczany skanem dopiero po przekroczeniu limitu
+        self._approx_size = None
+
+    def init_app(self, app):
+        self.directory = app.config.get('PDF_CACHE_DIR') or self.directory
+        max_bytes = app.config.get('PDF_CACHE_MAX_BYTES', self.max_bytes)
+        if max_bytes < MIN_CACHE_BYTES:
+            logger.warning(f"PDF_CACHE_MAX_BYTES={max_bytes} za mały - pliki są źródłem pobierania, "
+                           f"używam {MIN_CACHE_BYTES}")
+            max_bytes = MIN_CACHE_BYTES
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def make_key(cv_data, template, version):
+        canonical = json.dumps({'cv_data': cv_data, 'template': template, 'version': version},
+                               sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        """Zwróć ścieżkę do pliku z cache lub None"""
+        if len(key) != 64 or not all(c in '0123456789abcdef' for c in key):
+            return None
+        path = self._path(key)
+        try:
+            # Odświeżenie mtime = "ostatnio używany" dla eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, data):
+        """Zapisz PDF atomowo (plik tymczasowy + rename) i zwróć jego ścieżkę"""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if self._approx_size is not None:
+                self._approx_size += len(data)
+            needs_eviction = self._approx_size is None or self._approx_size > self.max_bytes
+        if needs_eviction:
+            self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Usuń najdawniej używane pliki, aż katalog zmieści się w 90% limitu (poza keep - właśnie zapisanym)"""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith('.pdf'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        except OSError as e:
+            logger.error(f"Błąd skanowania cache PDF: {e}")
+            return 0
+
+        removed = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            if removed:
+                logger.info(f"Cache PDF: usunięto {removed} plików, rozmiar {total / 1024 / 1024:.1f} MB")
+
+        with self._lock:
+            self._approx_size = total
+        return removed
+
+    def render_cached(self, cv_data, template, version, render):
+        """
+        PDF dla (cv_data, template, version) - z cache albo po wyrenderowaniu przez `render()`,
+        który zwraca bajty PDF. Trafienie nie czyta pliku - zwraca tylko ścieżkę.
+        """
+        key = self.make_key(cv_data, template, version)
+        path = self.get(key)
+        if path is not None:
+            metrics.inc('pdf_cache_requests_total', result='hit')
+            return CachedPDF(key, path, True)
+
+        metrics.inc('pdf_cache_requests_total', result='miss')
+        start = time.perf_counter()
+        data = render()
+        logger.debug(f"PDF {template} v{version} wyrenderowany w {(time.perf_counter() - start) * 1000:.0f} ms")
+        return CachedPDF(key, self.put(key, data), False)
+
+
+pdf_cache = PDFCache()
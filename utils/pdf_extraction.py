@@ -1,12 +1,12 @@
 import logging
 import os
-import PyPDF2
-from docx import Document
-from PIL import Image
-import io
+
+from utils.metrics import timed_phase
 
 def extract_text(pdf_path):
     """Extract text using PyPDF2 as primary method"""
+    import PyPDF2
+
     try:
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
@@ -20,8 +20,11 @@ def extract_text(pdf_path):
 
 logger = logging.getLogger(__name__)
 
+@timed_phase('pdf_parse')
 def extract_text_from_pdf(file_path):
     """Extract text from PDF using PyPDF2 (lightweight)"""
+    import PyPDF2
+
     try:
         text = ""
         with open(file_path, 'rb') as file:
@@ -0,0 +1,112 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.metrics import metrics, phase
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_worker():
+    """Inicjalizacja procesu renderującego: style, fonty i szablony ładowane raz na proces"""
+    from utils.cv_templates import prewarm_templates
+    prewarm_templates()
+
+
+def _render_in_worker(template_style, cv_data):
+    from utils.cv_templates import generate_cv_with_template
+    return generate_cv_with_template(cv_data, template_style).getvalue()
+
+
+class PDFRenderer:
+    """
+    Renderowanie PDF (doc.build w reportlab) w osobnych procesach.
+    Layout trzyma GIL przez cały czas budowania dokumentu - w puli procesów nie blokuje
+    pozostałych wątków workera. Pula jest ograniczona (procesy i oczekujące zadania),
+    a każde zadanie ma limit czasu.
+    """
+
+    def __init__(self, workers=2, timeout=30, max_pending=16):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """PDF_RENDER_WORKERS=0 wyłącza pulę (renderowanie w wątku requestu)"""
+        self.workers = app.config.get('PDF_RENDER_WORKERS', self.workers)
+        self.timeout = app.config.get('PDF_RENDER_TIMEOUT', self.timeout)
+        self.max_pending = app.config.get('PDF_RENDER_MAX_PENDING', self.max_pending)
+
+    def _get_executor(self):
+        # Pula z procesu mastera nie przeżywa forku workera gunicorna - tworzymy ją w każdym procesie
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # spawn: czyste procesy bez skopiowanych wątków/połączeń do bazy z workera
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_worker)
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, template_style, cv_data):
+        """Zwróć bajty PDF; TimeoutError przy przekroczeniu limitu czasu lub pełnej kolejce"""
+        if not self.workers:
+            with phase('pdf_render'):
+                return _render_in_worker(template_style, cv_data)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.inc('pdf_render_rejected_total')
+                raise TimeoutError('Kolejka renderowania PDF jest pełna')
+            self._pending += 1
+            metrics.set_gauge('pdf_render_queue_depth', self._pending)
+            executor = self._get_executor()
+
+        try:
+            with phase('pdf_render'):
+                future = executor.submit(_render_in_worker, template_style, cv_data)
+                try:
+                    return future.result(timeout=self.timeout)
+                except TimeoutError:
+                    # Zadanie, które już działa, nie zostanie przerwane - zwalniamy tylko request
+                    future.cancel()
+                    metrics.inc('pdf_render_timeouts_total')
+                    logger.error(f"Renderowanie PDF ({template_style}) przekroczyło {self.timeout}s")
+                    raise
+        except BrokenProcessPool:
+            # Proces renderujący padł (np. OOM) - następne zadanie dostanie nową pulę
+            logger.error("Pula renderowania PDF uległa awarii, tworzę ją od nowa")
+            self._reset_executor()
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                metrics.set_gauge('pdf_render_queue_depth', self._pending)
+
+    def prewarm(self):
+        """Uruchom procesy renderujące z wyprzedzeniem (po forku workera)"""
+        if not self.workers:
+            return
+        with self._lock:
+            executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(os.getpid)
+
+    def shutdown(self):
+        self._reset_executor()
+
+
+pdf_renderer = PDFRenderer()
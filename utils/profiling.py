@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Próbkujący profiler wątków obsługujących requesty.
+    Jeden wątek w tle co `interval` sekund zapisuje stos każdego zarejestrowanego wątku;
+    dla wolnych requestów stosy są zrzucane w formacie "folded" (flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.enabled = False
+        self.output_dir = None
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+
+    def configure(self, enabled=False, interval=None, output_dir=None):
+        self.enabled = enabled
+        if interval:
+            self.interval = interval
+        self.output_dir = output_dir
+
+    def start(self, thread_id):
+        """Zacznij próbkować wątek (wywoływane na początku requestu)"""
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._samples[thread_id] = Counter()
+        self._wakeup.set()
+
+    def stop(self, thread_id):
+        """Zakończ próbkowanie wątku i zwróć zebrane stosy"""
+        with self._lock:
+            return self._samples.pop(thread_id, None)
+
+    def dump(self, samples, label, duration):
+        """Zapisz profil wolnego requestu do logu i (opcjonalnie) pliku .folded"""
+        if not samples:
+            return None
+
+        total = sum(samples.values())
+        top = '\n'.join(f"  {count / total:6.1%}  {stack.rsplit(';', 1)[-1]}"
+                        for stack, count in samples.most_common(10))
+        logger.warning(f"Profil wolnego requestu {label} ({duration:.2f}s, {total} próbek):\n{top}")
+
+        if not self.output_dir:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)
+        path = os.path.join(self.output_dir, f"{int(time.time())}_{os.getpid()}_{safe_label}.folded")
+        with open(path, 'w') as f:
+            for stack, count in samples.items():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _ensure_thread(self):
+        # Po forku workera gunicorna wątek z procesu mastera nie istnieje
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+            self._thread_pid = os.getpid()
+
+    def _fold(self, frame):
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(parts))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = bool(self._samples)
+            if not active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, counter in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counter[self._fold(frame)] += 1
+            time.sleep(self.interval)
+
+
+profiler = SamplingProfiler()
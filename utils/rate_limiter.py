@@ -1,46 +1,223 @@
-from functools import wraps
-from flask import request, jsonify
+import os
+import math
 import time
-from collections import defaultdict, deque
+import logging
+import tempfile
+import threading
+from functools import wraps
+from collections import namedtuple
+from flask import request, jsonify, make_response
+
+logger = logging.getLogger(__name__)
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset_after', 'retry_after'])
+
+
+class MemoryBackend:
+    """Stan GCRA w pamięci procesu - jeden float (TAT) na klucz. Dla dev i testów."""
 
-class RateLimiter:
     def __init__(self):
-        self.requests = defaultdict(deque)
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, now, emission_interval, period):
+        """Zwraca (allowed, tat) - tat po aktualizacji lub bieżący przy odmowie"""
+        with self._lock:
+            tat = self._tats.get(key, now)
+            new_tat = max(tat, now) + emission_interval
+            if new_tat - now > period:
+                return False, tat
+            self._tats[key] = new_tat
+            return True, new_tat
+
+    def peek(self, key):
+        return self._tats.get(key)
+
+    def evict(self, now):
+        with self._lock:
+            idle = [key for key, tat in self._tats.items() if tat <= now]
+            for key in idle:
+                del self._tats[key]
+        return len(idle)
+
+
+class SQLBackend:
+    """
+    Wspólny stan GCRA dla wszystkich workerów - SQLite (np. w /dev/shm) lokalnie, PostgreSQL na produkcji.
+    Decyzja to jeden atomowy upsert z warunkiem (INSERT ... ON CONFLICT DO UPDATE ... WHERE ... RETURNING).
+    Pula połączeń tworzona leniwie w każdym procesie - przy preload_app nie przechodzi przez fork.
+    """
+
+    def __init__(self, url):
+        if url.startswith('postgres://'):
+            url = url.replace('postgres://', 'postgresql://', 1)
+
+        self._url = url
+        if url.startswith('sqlite'):
+            self._engine_options = {'connect_args': {'timeout': 5}}
+            max_func = 'MAX'
+        else:
+            self._engine_options = {'pool_pre_ping': True, 'pool_size': 5, 'max_overflow': 5}
+            max_func = 'GREATEST'
+        self._engine = None
+        self._engine_pid = None
+        self._engine_lock = threading.Lock()
+
+        from sqlalchemy import text
+        self._update_sql = text(f"""
+            INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval)
+            ON CONFLICT (key) DO UPDATE
+                SET tat = {max_func}(rate_limits.tat, :now) + :interval
+                WHERE {max_func}(rate_limits.tat, :now) + :interval - :now <= :period
+            RETURNING tat
+        """)
+        self._peek_sql = text("SELECT tat FROM rate_limits WHERE key = :key")
+        self._evict_sql = text("DELETE FROM rate_limits WHERE tat <= :now")
+        # Schemat zakładany jednorazowym silnikiem, zamykanym od razu (w masterze gunicorna nie zostaje połączenie)
+        engine = self._create_engine()
+        try:
+            self._create_schema(engine, url.startswith('sqlite'))
+        finally:
+            engine.dispose()
+
+    def _create_engine(self):
+        from sqlalchemy import create_engine
+        return create_engine(self._url, **self._engine_options)
+
+    @property
+    def engine(self):
+        pid = os.getpid()
+        if self._engine_pid != pid:
+            with self._engine_lock:
+                if self._engine_pid != pid:
+                    if self._engine is not None:
+                        # Połączenia odziedziczone po rodzicu należą do niego - porzucamy bez zamykania
+                        self._engine.dispose(close=False)
+                    self._engine = self._create_engine()
+                    self._engine_pid = pid
+        return self._engine
+
+    @staticmethod
+    def _create_schema(engine, is_sqlite):
+        from sqlalchemy import text
+        with engine.begin() as conn:
+            if is_sqlite:
+                conn.execute(text("PRAGMA journal_mode=WAL"))
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS rate_limits (key VARCHAR(200) PRIMARY KEY, tat DOUBLE PRECISION NOT NULL)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rate_limits_tat ON rate_limits (tat)"))
+
+    def update(self, key, now, emission_interval, period):
+        with self.engine.begin() as conn:
+            row = conn.execute(self._update_sql, {
+                'key': key, 'now': now, 'interval': emission_interval, 'period': period
+            }).first()
+            if row is not None:
+                return True, row[0]
+            tat = conn.execute(self._peek_sql, {'key': key}).scalar()
+        return False, tat if tat is not None else now
+
+    def peek(self, key):
+        with self.engine.connect() as conn:
+            return conn.execute(self._peek_sql, {'key': key}).scalar()
+
+    def evict(self, now):
+        with self.engine.begin() as conn:
+            return conn.execute(self._evict_sql, {'now': now}).rowcount
+
+
+def default_storage_url():
+    """PostgreSQL z DATABASE_URL na produkcji, w innym wypadku SQLite w pamięci współdzielonej"""
+    database_url = os.environ.get('DATABASE_URL', '')
+    if database_url.startswith(('postgres://', 'postgresql://')):
+        return database_url
+    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return f"sqlite:///{os.path.join(shm_dir, 'cv_optimizer_ratelimit.db')}"
+
+
+class RateLimiter:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
         self.limits = {
             'cv_upload': (5, 300),  # 5 uploads per 5 minutes
             'cv_process': (10, 3600),  # 10 processes per hour
             'ai_analysis': (20, 3600),  # 20 AI calls per hour
             'general': (100, 3600)  # 100 general requests per hour
         }
+        self.eviction_interval = 600  # Co 10 minut usuwamy klucze bez aktywności
+        self._last_eviction = time.time()
 
-    def is_allowed(self, identifier, limit_type='general'):
+    def init_app(self, app):
+        """Wybierz wspólny backend (RATELIMIT_STORAGE_URL='memory://' wyłącza współdzielenie)"""
+        url = app.config.get('RATELIMIT_STORAGE_URL') or default_storage_url()
+        self.eviction_interval = app.config.get('RATELIMIT_EVICTION_INTERVAL', self.eviction_interval)
+        if url == 'memory://':
+            self.backend = MemoryBackend()
+            return
+        try:
+            self.backend = SQLBackend(url)
+            logger.info(f"Rate limiter backend: {url.split('://')[0]}")
+        except Exception as e:
+            logger.error(f"Nie udało się zainicjalizować wspólnego rate limitera, używam pamięci procesu: {e}")
+            self.backend = MemoryBackend()
+
+    def hit(self, identifier, limit_type='general'):
+        """Zarejestruj request i zwróć decyzję GCRA wraz z danymi do nagłówków X-RateLimit-*"""
         now = time.time()
         max_requests, time_window = self.limits.get(limit_type, (100, 3600))
+        emission_interval = time_window / max_requests
+        key = f"{limit_type}:{identifier}"
+
+        try:
+            allowed, tat = self.backend.update(key, now, emission_interval, time_window)
+        except Exception as e:
+            # Awaria magazynu nie może blokować użytkowników
+            logger.error(f"Błąd rate limitera: {e}")
+            return RateLimitResult(True, max_requests, max_requests, 0, 0)
 
-        # Clean old requests
-        user_requests = self.requests[identifier]
-        while user_requests and user_requests[0] < now - time_window:
-            user_requests.popleft()
+        self._maybe_evict(now)
 
-        # Check if limit exceeded
-        if len(user_requests) >= max_requests:
-            return False
+        if allowed:
+            remaining = int((time_window - (tat - now)) // emission_interval)
+            return RateLimitResult(True, max_requests, max(0, remaining), tat - now, 0)
 
-        # Add current request
-        user_requests.append(now)
-        return True
+        retry_after = tat + emission_interval - time_window - now
+        return RateLimitResult(False, max_requests, 0, tat - now, max(0.0, retry_after))
+
+    def is_allowed(self, identifier, limit_type='general'):
+        return self.hit(identifier, limit_type).allowed
 
     def get_reset_time(self, identifier, limit_type='general'):
         now = time.time()
-        _, time_window = self.limits.get(limit_type, (100, 3600))
-        user_requests = self.requests[identifier]
+        max_requests, time_window = self.limits.get(limit_type, (100, 3600))
+        tat = self.backend.peek(f"{limit_type}:{identifier}")
+        if tat is None:
+            return 0
+        return max(0, math.ceil(tat + time_window / max_requests - time_window - now))
+
+    def _maybe_evict(self, now):
+        """Klucz z TAT w przeszłości jest w pełni odnowiony - usunięcie go nie zmienia decyzji"""
+        if now - self._last_eviction < self.eviction_interval:
+            return
+        self._last_eviction = now
+        try:
+            evicted = self.backend.evict(now)
+            if evicted:
+                logger.debug(f"Rate limiter: usunięto {evicted} nieaktywnych kluczy")
+        except Exception as e:
+            logger.error(f"Błąd czyszczenia rate limitera: {e}")
 
-        if user_requests:
-            return int(user_requests[0] + time_window - now)
-        return 0
 
 rate_limiter = RateLimiter()
 
+
+def _set_rate_limit_headers(response, result):
+    response.headers['X-RateLimit-Limit'] = str(result.limit)
+    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+    response.headers['X-RateLimit-Reset'] = str(math.ceil(result.reset_after))
+    return response
+
+
 def rate_limit(limit_type='general'):
     def decorator(f):
         @wraps(f)
@@ -54,14 +231,17 @@ def rate_limit(limit_type='general'):
             except ImportError:
                 pass
 
-            if not rate_limiter.is_allowed(identifier, limit_type):
-                reset_time = rate_limiter.get_reset_time(identifier, limit_type)
-                return jsonify({
+            result = rate_limiter.hit(identifier, limit_type)
+            if not result.allowed:
+                retry_after = math.ceil(result.retry_after)
+                response = make_response(jsonify({
                     'success': False,
-                    'message': f'Rate limit exceeded. Try again in {reset_time} seconds.',
-                    'retry_after': reset_time
-                }), 429
+                    'message': f'Rate limit exceeded. Try again in {retry_after} seconds.',
+                    'retry_after': retry_after
+                }), 429)
+                response.headers['Retry-After'] = str(retry_after)
+                return _set_rate_limit_headers(response, result)
 
-            return f(*args, **kwargs)
+            return _set_rate_limit_headers(make_response(f(*args, **kwargs)), result)
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,250 @@
+import os
+import csv
+import io
+import math
+import shutil
+import posixpath
+import logging
+import tempfile
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = ['rank', 'file', 'score', 'keyword_match', 'ats_score', 'valid', 'missing_keywords',
+               'top_findings', 'llm_feedback']
+
+
+def _extract_in_worker(path):
+    from utils.pdf_extraction import extract_text_from_pdf
+    return extract_text_from_pdf(path)
+
+
+def _member_name(filename, used):
+    """
+    Nazwa kandydata: ścieżka pliku w archiwum (bez '..' i '/' na początku), unikalna w partii -
+    pliki o tej samej nazwie w różnych katalogach (a/cv.pdf, b/cv.pdf) to różni kandydaci.
+    """
+    parts = [part for part in posixpath.normpath(filename.replace('\\', '/')).split('/')
+             if part not in ('', '.', '..')]
+    name = '/'.join(parts) or 'cv.pdf'
+    candidate, number = name, 2
+    while candidate in used:
+        candidate = f"{name} ({number})"
+        number += 1
+    used.add(candidate)
+    return candidate
+
+
+class BatchError(ValueError):
+    """Archiwum, którego nie da się przetworzyć (komunikat dla użytkownika)"""
+
+
+class RecruiterBatchProcessor:
+    """
+    Ranking wielu CV (archiwum ZIP z PDF-ami) względem jednej oferty pracy.
+    Etapy: strumieniowe wypakowanie na dysk -> ekstrakcja tekstu w puli procesów ->
+    lokalna ocena (słowa kluczowe + ATS + walidacja) -> LLM tylko dla najlepszych N.
+    run() zwraca generator zdarzeń postępu zakończony zdarzeniem 'result' z rankingiem.
+    """
+
+    def __init__(self, workers=2, max_files=200, max_file_bytes=10 * 1024 * 1024,
+                 top_n=5, parse_timeout=20, llm_concurrency=4):
+        self.workers = workers
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.top_n = top_n
+        self.parse_timeout = parse_timeout
+        self.llm_concurrency = llm_concurrency
+        self._executor = None
+        self._executor_pid = None
+
+    def init_app(self, app):
+        """RECRUITER_BATCH_WORKERS=0 wyłącza pulę procesów (ekstrakcja w wątku requestu)"""
+        self.workers = app.config.get('RECRUITER_BATCH_WORKERS', self.workers)
+        self.max_files = app.config.get('RECRUITER_BATCH_MAX_FILES', self.max_files)
+        self.top_n = app.config.get('RECRUITER_BATCH_TOP_N', self.top_n)
+
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _unpack(self, archive, workdir):
+        """Wypakuj PDF-y z archiwum po jednym (kopiowanie strumieniowe z limitem rozmiaru)"""
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile as e:
+            raise BatchError('Plik nie jest poprawnym archiwum ZIP') from e
+
+        with zf:
+            members = [info for info in zf.infolist()
+                       if not info.is_dir() and info.filename.lower().endswith('.pdf')
+                       and not os.path.basename(info.filename).startswith(('.', '__MACOSX'))
+                       and '__MACOSX/' not in info.filename]
+            if not members:
+                raise BatchError('Archiwum nie zawiera plików PDF')
+            if len(members) > self.max_files:
+                raise BatchError(f'Archiwum zawiera {len(members)} plików PDF (maksymalnie {self.max_files})')
+
+            files = []
+            used = set()
+            for i, info in enumerate(members):
+                name = _member_name(info.filename, used)
+                if info.file_size > self.max_file_bytes:
+                    files.append((name, None, 'plik jest zbyt duży'))
+                    continue
+                path = os.path.join(workdir, f"{i}.pdf")
+                written = 0
+                with zf.open(info) as src, open(path, 'wb') as dst:
+                    # Rozmiar z nagłówka ZIP może być fałszywy - limit przy kopiowaniu
+                    while written <= self.max_file_bytes:
+                        chunk = src.read(64 * 1024)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        written += len(chunk)
+                if written > self.max_file_bytes:
+                    os.unlink(path)
+                    files.append((name, None, 'plik jest zbyt duży'))
+                else:
+                    files.append((name, path, None))
+            return files
+
+    def _extract(self, files):
+        """Ekstrakcja tekstu; zwraca (nazwa, tekst, błąd) w kolejności zakończenia"""
+        pending = [(name, path) for name, path, error in files if path]
+        for name, path, error in files:
+            if error:
+                yield name, '', error
+
+        if not self.workers:
+            for name, path in pending:
+                yield name, _extract_in_worker(path), None
+            return
+
+        executor = self._get_executor()
+        futures = {executor.submit(_extract_in_worker, path): name for name, path in pending}
+        total_timeout = self.parse_timeout * math.ceil(len(futures) / self.workers)
+        try:
+            for future in as_completed(futures, timeout=total_timeout):
+                try:
+                    yield futures[future], future.result(), None
+                except BrokenProcessPool:
+                    # Proces ekstrakcji padł (np. OOM) - następne zadanie dostanie nową pulę
+                    self.shutdown()
+                    yield futures[future], '', 'nie udało się odczytać PDF'
+                except Exception as e:
+                    logger.warning(f"Ekstrakcja {futures[future]} nie powiodła się: {e}")
+                    yield futures[future], '', 'nie udało się odczytać PDF'
+        except FutureTimeout:
+            for future, name in futures.items():
+                if not future.done():
+                    future.cancel()
+                    yield name, '', 'przekroczono limit czasu odczytu PDF'
+
+    @staticmethod
+    def _score(name, text, job_description, language='pl'):
+        from utils.ats_checker import ats_checker
+        from utils.cv_validator import cv_validator
+
+        validation = cv_validator.validate_cv(text)
+        report = ats_checker.check(text, job_description, language)
+        keyword_match = report['keyword_coverage']['match_percentage']
+        return {
+            'file': name,
+            # Dopasowanie do oferty ważniejsze od jakości samego dokumentu
+            'score': round(0.6 * keyword_match + 0.4 * report['score'], 1),
+            'keyword_match': keyword_match,
+            'ats_score': report['score'],
+            'valid': validation['is_valid'],
+            'missing_keywords': report['keyword_coverage']['missing_keywords'][:10],
+            'top_findings': [f['message'] for f in report['findings'][:3]],
+            'error': None,
+        }
+
+    def run(self, archive, job_description, top_n=None, language='pl'):
+        # Ujemne top_n w wycinku candidates[:top_n] wysłałoby do LLM prawie wszystkich kandydatów
+        top_n = self.top_n if top_n is None else max(0, top_n)
+        workdir = tempfile.mkdtemp(prefix='cv_batch_')
+        try:
+            files = self._unpack(archive, workdir)
+            total = len(files)
+            yield {'event': 'started', 'files': total}
+
+            candidates = []
+            texts = {}
+            for processed, (name, text, error) in enumerate(self._extract(files), start=1):
+                if not error and not text.strip():
+                    error = 'brak tekstu w PDF (skan?)'
+                if error:
+                    candidate = {'file': name, 'score': 0, 'error': error}
+                else:
+                    candidate = self._score(name, text, job_description, language)
+                    texts[name] = text
+                candidates.append(candidate)
+                yield {'event': 'progress', 'stage': 'score', 'processed': processed, 'total': total,
+                       'file': name, 'score': candidate['score'], 'error': error}
+
+            candidates.sort(key=lambda c: (c['error'] is not None, -c['score'], c['file']))
+            for rank, candidate in enumerate(candidates, start=1):
+                candidate['rank'] = rank
+
+            top = [c for c in candidates[:top_n] if c['error'] is None]
+            if top:
+                yield from self._enrich(top, texts, job_description, language)
+
+            metrics.inc('recruiter_batch_cvs_total', value=total)
+            yield {'event': 'result', 'ranking': candidates}
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _enrich(self, top, texts, job_description, language):
+        """Opinia LLM (generate_recruiter_feedback) tylko dla najlepszych kandydatów, równolegle"""
+        from utils.openrouter_api import generate_recruiter_feedback
+
+        with ThreadPoolExecutor(max_workers=min(self.llm_concurrency, len(top))) as pool:
+            futures = {pool.submit(generate_recruiter_feedback, texts[c['file']], job_description, language): c
+                       for c in top}
+            for processed, future in enumerate(as_completed(futures), start=1):
+                candidate = futures[future]
+                try:
+                    candidate['llm_feedback'] = future.result()
+                except Exception as e:
+                    logger.warning(f"Opinia LLM dla {candidate['file']} niedostępna: {e}")
+                    candidate['llm_feedback'] = None
+                yield {'event': 'progress', 'stage': 'llm', 'processed': processed, 'total': len(top),
+                       'file': candidate['file']}
+
+
+def ranking_to_csv_rows(ranking):
+    """Wiersze CSV (nagłówek + kandydaci) jako kolejne fragmenty tekstu do streamingu"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    for candidate in ranking:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([
+            candidate['rank'], candidate['file'], candidate['score'], candidate.get('keyword_match', ''),
+            candidate.get('ats_score', ''), candidate.get('valid', ''),
+            ', '.join(candidate.get('missing_keywords', [])),
+            ' | '.join(candidate.get('top_findings', [])) or candidate.get('error') or '',
+            candidate.get('llm_feedback') or '',
+        ])
+        yield buffer.getvalue()
+
+
+recruiter_batch = RecruiterBatchProcessor()
@@ -0,0 +1,343 @@
+import re
+import json
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+FENCE = '```'
+# Skaner przeskakuje (w C) do następnego znaku, który zmienia stan - pętla w Pythonie
+# odwiedza tylko nawiasy i cudzysłowy, nie każdy znak odpowiedzi
+_STRUCTURE_RE = re.compile(r'["{}\[\]]')
+_STRING_RE = re.compile(r'["\\]')
+# Naprawa zatrzymuje się dodatkowo na przecinkach i znakach sterujących w łańcuchach
+_REPAIR_STRUCTURE_RE = re.compile(r'["{}\[\],]')
+_REPAIR_STRING_RE = re.compile(r'["\\\x00-\x1f]')
+_CLOSERS = {'{': '}', '[': ']'}
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+# Ile razy przy naprawie uciętej odpowiedzi cofamy się do poprzedniego przecinka
+MAX_TRUNCATION_RETRIES = 3
+# Ile nawiasów otwierających próbujemy odczytać wprost (raw_decode), zanim ruszy skaner
+MAX_DIRECT_ATTEMPTS = 4
+
+# strict=False: surowe nowe linie i tabulatory w łańcuchach bez przepisywania tekstu
+_decoder = json.JSONDecoder(strict=False)
+
+# Pola z tekstem CV w odpowiedziach funkcji optymalizujących
+CV_TEXT_KEYS = ('optimized_cv', 'improved_cv', 'result')
+
+
+# value - odczytany obiekt, span - długość tekstu, z którego pochodzi,
+# truncated - obiekt był ucięty (koniec odpowiedzi) i został domknięty przy naprawie
+Extracted = namedtuple('Extracted', ['value', 'span', 'truncated'])
+
+
+class ResponseParseError(ValueError):
+    """W odpowiedzi modelu nie ma poprawnego (ani dającego się naprawić) obiektu JSON"""
+
+
+class JSONScanner:
+    """
+    Przyrostowy skaner zbalansowanych nawiasów - liniowy względem długości tekstu.
+    feed() przyjmuje kolejne fragmenty odpowiedzi (np. ze streamingu) i zwraca teksty
+    ukończonych obiektów najwyższego poziomu; pending() to początek obiektu w toku.
+    Nawiasy w łańcuchach JSON (także z cudzysłowami poprzedzonymi \\) są pomijane.
+    """
+
+    def __init__(self, openers='{'):
+        self._open_re = re.compile('[' + re.escape(openers) + ']')
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._parts = []
+
+    def feed(self, chunk):
+        completed = []
+        pos = 0
+        start = 0
+        if self._escape and chunk:
+            self._escape = False
+            pos = 1
+        length = len(chunk)
+
+        while pos < length:
+            if not self._stack:
+                match = self._open_re.search(chunk, pos)
+                if match is None:
+                    break
+                start = match.start()
+                self._stack.append(_CLOSERS[match.group()])
+                pos = match.end()
+                continue
+
+            if self._in_string:
+                match = _STRING_RE.search(chunk, pos)
+                if match is None:
+                    break
+                if match.group() == '\\':
+                    if match.end() == length:
+                        self._escape = True
+                    pos = match.end() + 1
+                else:
+                    self._in_string = False
+                    pos = match.end()
+                continue
+
+            match = _STRUCTURE_RE.search(chunk, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(_CLOSERS[char])
+            else:
+                # Niedopasowany nawias zamykający też zamyka poziom - naprawa zajmie się resztą
+                self._stack.pop()
+                if not self._stack:
+                    self._parts.append(chunk[start:pos])
+                    completed.append(''.join(self._parts))
+                    self._parts = []
+
+        if self._stack:
+            self._parts.append(chunk[start:])
+        return completed
+
+    def pending(self):
+        """Tekst rozpoczętego, jeszcze niezamkniętego obiektu ('' gdy brak)"""
+        return ''.join(self._parts) if self._stack else ''
+
+    def partial(self):
+        """Dotychczasowa treść obiektu w toku jako JSON (naprawiona) - podgląd w trakcie streamingu"""
+        pending = self.pending()
+        if not pending:
+            return None
+        try:
+            return _loads(pending, repair=True)
+        except ResponseParseError:
+            return None
+
+
+def _drop_trailing_comma(out):
+    """Usuń przecinek kończący dotychczasowy wynik (out to lista fragmentów tekstu)"""
+    i = len(out) - 1
+    while i >= 0 and not out[i].strip():
+        i -= 1
+    if i >= 0:
+        stripped = out[i].rstrip()
+        if stripped.endswith(','):
+            out[i] = stripped[:-1] + out[i][len(stripped):]
+
+
+def _close(out, stack, in_string=False, escape=False):
+    """Domknij ucięty JSON: łańcuch, wiszący klucz/przecinek i otwarte nawiasy"""
+    out = list(out)
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    i = len(out) - 1
+    while i >= 0 and not out[i].strip():
+        i -= 1
+    if i >= 0 and out[i].rstrip().endswith(':'):
+        out.append('null')
+    for closer in reversed(stack):
+        _drop_trailing_comma(out)
+        out.append(closer)
+    return ''.join(out)
+
+
+def repair_json(text):
+    """
+    Typowe błędy JSON generowanego przez LLM: przecinek przed } lub ], surowe znaki nowej linii
+    i tabulatory w łańcuchach, niedopasowane lub brakujące nawiasy zamykające (ucięta odpowiedź).
+    Zwraca listę wariantów do próby - od pełnego tekstu po wersje obcięte do wcześniejszych przecinków.
+    """
+    out = []
+    stack = []
+    commas = []  # (pozycja w out, stos) - punkty, do których można obciąć uciętą odpowiedź
+    in_string = False
+    escape = False
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = (_REPAIR_STRING_RE if in_string else _REPAIR_STRUCTURE_RE).search(text, pos)
+        if match is None:
+            out.append(text[pos:])
+            break
+        out.append(text[pos:match.start()])
+        char = match.group()
+        pos = match.end()
+
+        if in_string:
+            if char == '\\':
+                out.append(text[match.start():pos + 1])
+                escape = pos == length
+                pos += 1
+            elif char == '"':
+                in_string = False
+                out.append(char)
+            else:
+                out.append(_CONTROL_ESCAPES.get(char) or '\\u%04x' % ord(char))
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char == ',':
+            commas.append((len(out), list(stack)))
+        else:
+            _drop_trailing_comma(out)
+            if not stack:
+                continue
+            char = stack.pop()
+        out.append(char)
+
+    variants = [_close(out, stack, in_string, escape)]
+    if stack or in_string:
+        for position, comma_stack in reversed(commas[-MAX_TRUNCATION_RETRIES:]):
+            variants.append(_close(out[:position], comma_stack))
+    return variants
+
+
+def _loads(candidate, repair):
+    try:
+        return _decoder.decode(candidate)
+    except json.JSONDecodeError as e:
+        error = e
+    if repair:
+        for variant in repair_json(candidate):
+            try:
+                return _decoder.decode(variant)
+            except json.JSONDecodeError:
+                continue
+    raise ResponseParseError(f"Niepoprawny JSON: {error}")
+
+
+def _fences(text):
+    """Treść bloków ```json ... ``` (bez etykiety języka i skrajnych odstępów)"""
+    end = -1
+    while True:
+        start = text.find(FENCE, end + 1)
+        if start == -1:
+            return
+        end = text.find(FENCE, start + len(FENCE))
+        if end == -1:
+            return
+        body = text[start + len(FENCE):end]
+        label, newline, rest = body.partition('\n')
+        if newline and label.strip().lower() in ('', 'json'):
+            body = rest
+        yield body.strip()
+        end += len(FENCE) - 1
+
+
+def _direct(text, openers, expected):
+    """
+    Obiekt odczytany wprost od jednego z pierwszych nawiasów otwierających (tekst wokół JSON).
+    Tylko gdy zajmuje co najmniej połowę odpowiedzi - inaczej (np. mały przykład w komentarzu
+    przed uszkodzonym właściwym obiektem) decyduje skaner z naprawą; wtedy None.
+    """
+    best = None
+    pos = 0
+    for _ in range(MAX_DIRECT_ATTEMPTS):
+        starts = [i for i in (text.find(opener, pos) for opener in openers) if i != -1]
+        if not starts:
+            break
+        start = min(starts)
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            pos = start + 1
+            continue
+        if isinstance(value, expected) and (best is None or end - start > best.span):
+            best = Extracted(value, end - start, False)
+        pos = end
+    return best if best and 2 * best.span >= len(text.strip()) else None
+
+
+def extract_json(text, repair=True, expected=dict):
+    """
+    Obiekt JSON z odpowiedzi modelu: cała odpowiedź, blok ```json```, albo największy
+    zbalansowany obiekt w tekście (kolejne są próbowane, gdy pierwszy się nie parsuje);
+    ucięta odpowiedź jest domykana. ResponseParseError, gdy nic nie pasuje do `expected`.
+    """
+    return extract_json_details(text, repair, expected).value
+
+
+def extract_json_details(text, repair=True, expected=dict):
+    """
+    Jak extract_json, ale zwraca Extracted: wartość, długość tekstu, z którego pochodzi (span),
+    i czy obiekt był ucięty i został domknięty przy naprawie (truncated).
+    """
+    if not isinstance(text, str):
+        raise ResponseParseError(f"Odpowiedź nie jest tekstem: {type(text).__name__}")
+    openers = '{' if expected is dict else '{['
+
+    stripped = text.strip()
+    if stripped[:1] in openers and stripped:
+        try:
+            value = _decoder.decode(stripped)
+            if isinstance(value, expected):
+                return Extracted(value, len(stripped), False)
+        except json.JSONDecodeError:
+            pass
+
+    # Bloki ```json``` najpierw - skaner całego tekstu tylko, gdy żaden nie pasuje
+    for body in _fences(text):
+        if body[:1] in openers and body:
+            try:
+                value = _loads(body, repair)
+            except ResponseParseError:
+                continue
+            if isinstance(value, expected):
+                return Extracted(value, len(body), False)
+
+    direct = _direct(text, openers, expected)
+    if direct is not None:
+        return direct
+
+    scanner = JSONScanner(openers)
+    for candidate in sorted(scanner.feed(text), key=len, reverse=True):
+        try:
+            value = _loads(candidate, repair)
+        except ResponseParseError:
+            continue
+        if isinstance(value, expected):
+            return Extracted(value, len(candidate), False)
+
+    pending = scanner.pending()
+    if pending and repair:
+        try:
+            value = _loads(pending, repair)
+            if isinstance(value, expected):
+                logger.debug("Odpowiedź modelu była ucięta - JSON domknięty")
+                return Extracted(value, len(pending), True)
+        except ResponseParseError:
+            pass
+    raise ResponseParseError("Brak poprawnego obiektu JSON w odpowiedzi")
+
+
+def parse_ai_response(text, keys=CV_TEXT_KEYS):
+    """
+    Odpowiedź funkcji optymalizujących: tekst CV z pierwszego znalezionego pola `keys`,
+    cały obiekt JSON, gdy żadnego pola nie ma, ale obiekt to co najmniej połowa odpowiedzi,
+    albo tekst bez zmian - także gdy JSON to tylko fragment treści CV (np. przykład konfiguracji).
+    """
+    if not isinstance(text, str) or '{' not in text:
+        return text
+    try:
+        extracted = extract_json_details(text)
+    except ResponseParseError as e:
+        logger.warning(f"Failed to parse AI response as JSON, returning original: {e}")
+        return text
+    data = extracted.value
+    for key in keys:
+        if key in data:
+            return data[key]
+    if 2 * extracted.span >= len(text.strip()):
+        return data
+    logger.debug("JSON w odpowiedzi to fragment tekstu CV - zwracam tekst bez zmian")
+    return text
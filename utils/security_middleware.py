@@ -1,9 +1,38 @@
 
 from flask import request, g
 import logging
-from datetime import datetime
+import re
+import time
+import threading
 import json
 
+from utils.metrics import metrics, start_request_timing, install_db_timing, LATENCY_BUCKETS, PHASES
+from utils.profiling import profiler
+
+# Skanujemy tylko początek każdej wartości - długie pola (np. tekst CV) nie mnożą kosztu requestu
+MAX_SCAN_CHARS = 4096
+
+
+def build_pattern_scanner(patterns):
+    """Jedno skompilowane wyrażenie (alternatywa) zamiast osobnego wyszukiwania dla każdego wzorca"""
+    alternatives = sorted({p.lower() for p in patterns}, key=len, reverse=True)
+    # Bez re.IGNORECASE - tekst jest zamieniany na małe litery raz, co jest znacznie szybsze
+    return re.compile('|'.join(re.escape(p) for p in alternatives))
+
+
+def iter_string_values(data, prefix=''):
+    """Zwraca pary (klucz, wartość) dla wszystkich napisów w zagnieżdżonym JSON-ie, bez rekurencji"""
+    stack = [(prefix, data)]
+    while stack:
+        key, value = stack.pop()
+        if isinstance(value, str):
+            yield key, value
+        elif isinstance(value, dict):
+            stack.extend((f"{key}.{k}" if key else str(k), v) for k, v in value.items())
+        elif isinstance(value, list):
+            stack.extend((f"{key}[{i}]", v) for i, v in enumerate(value))
+
+
 class SecurityMiddleware:
     def __init__(self, app=None):
         self.app = app
@@ -12,22 +41,29 @@ class SecurityMiddleware:
             'SELECT', 'INSERT', 'DELETE', 'UPDATE', 'DROP',
             '../', '..\\', '/etc/passwd', 'cmd.exe'
         ]
+        self._pattern_scanner = build_pattern_scanner(self.suspicious_patterns)
+        self.slow_request_threshold = 10  # sekundy
         
         if app:
             self.init_app(app)
     
     def init_app(self, app):
+        self.slow_request_threshold = app.config.get('SLOW_REQUEST_THRESHOLD', self.slow_request_threshold)
+        profiler.configure(enabled=app.config.get('SLOW_REQUEST_PROFILING', False),
+                           output_dir=app.config.get('SLOW_REQUEST_PROFILE_DIR'))
+        install_db_timing()
         app.before_request(self.before_request)
         app.after_request(self.after_request)
     
     def before_request(self):
         """Security checks before processing request"""
+        # Store request start time (zegar monotoniczny) i uruchom profiler próbkujący
+        start_request_timing()
+        profiler.start(threading.get_ident())
+        
         # Log suspicious activity
         self._check_suspicious_patterns()
         
-        # Store request start time
-        g.start_time = datetime.utcnow()
-        
         # Check for common attack patterns
         self._check_security_headers()
     
@@ -40,40 +76,52 @@ class SecurityMiddleware:
         response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
         
         # Log response time
-        if hasattr(g, 'start_time'):
-            duration = (datetime.utcnow() - g.start_time).total_seconds()
-            if duration > 10:  # Log slow requests
-                logging.warning(f"Slow request: {request.endpoint} took {duration:.2f}s")
+        if hasattr(g, 'request_started'):
+            self._record_request(response)
         
         return response
     
+    def _record_request(self, response):
+        """Histogram czasu per endpoint, liczniki statusów i podział czasu na fazy"""
+        duration = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unknown'
+        samples = profiler.stop(threading.get_ident())
+
+        metrics.observe('request_latency_seconds', duration, LATENCY_BUCKETS, endpoint=endpoint)
+        metrics.inc('responses_total', status=str(response.status_code))
+
+        if duration > self.slow_request_threshold:  # Log slow requests
+            phases = g.request_phases
+            accounted = sum(phases.values())
+            breakdown = ', '.join(f"{name}={phases[name]:.2f}s" for name in PHASES if phases.get(name))
+            logging.warning(f"Slow request: {endpoint} took {duration:.2f}s "
+                            f"({breakdown or 'brak faz'}, other={duration - accounted:.2f}s)")
+            profiler.dump(samples, endpoint, duration)
+    
+    def find_suspicious_patterns(self, value):
+        """Return suspicious patterns found in the scanned prefix of value (single pass)"""
+        return set(self._pattern_scanner.findall(value[:MAX_SCAN_CHARS].lower()))
+
     def _check_suspicious_patterns(self):
         """Check for suspicious patterns in request data"""
-        request_data = {}
-        
-        # Check URL parameters
-        if request.args:
-            request_data.update(request.args)
+        values = []
         
-        # Check form data
-        if request.form:
-            request_data.update(request.form)
+        # Check URL parameters and form data
+        for source in (request.args, request.form):
+            if source:
+                values.extend(source.items(multi=True))
         
-        # Check JSON data
+        # Check JSON data - get_json cache'uje wynik, więc widok nie parsuje body ponownie
         if request.is_json:
-            try:
-                json_data = request.get_json()
-                if json_data:
-                    request_data.update(json_data)
-            except:
-                pass
+            json_data = request.get_json(silent=True)
+            if json_data:
+                values.extend(iter_string_values(json_data))
         
         # Check for suspicious patterns
-        for key, value in request_data.items():
-            if isinstance(value, str):
-                for pattern in self.suspicious_patterns:
-                    if pattern.lower() in value.lower():
-                        logging.warning(f"Suspicious pattern '{pattern}' detected in {key}: {value[:100]}")
+        for key, value in values:
+            found = self.find_suspicious_patterns(value)
+            if found:
+                logging.warning(f"Suspicious patterns {sorted(found)} detected in {key}: {value[:100]}")
     
     def _check_security_headers(self):
         """Check for security headers"""
@@ -0,0 +1,226 @@
+import os
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from flask import request
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from werkzeug.datastructures import CallbackDict
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Endpointy, dla których nie mierzymy rozmiaru sesji (zasoby statyczne, health check)
+SIZE_TRACKING_SKIP_ENDPOINTS = {'static', 'test', 'manifest', 'service_worker', 'ads_txt'}
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose content lives in the database, keyed by session id"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None, size=0):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        # Rozmiar ostatnio zapisanych/odczytanych danych - aktualizowany tylko przy zapisie
+        self.size = size
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Przechowuje dane sesji po stronie serwera (tabela server_sessions).
+    Ciasteczko zawiera wyłącznie podpisany identyfikator sesji.
+    """
+
+    serializer = TaggedJSONSerializer()
+    salt = 'cv-optimizer-server-session'
+
+    def __init__(self, sweep_interval=300, size_warn_bytes=512 * 1024):
+        self.sweep_interval = sweep_interval
+        self.size_warn_bytes = size_warn_bytes
+        self._engine = None
+        self._table = None
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+
+    def init_app(self, app):
+        from models import SessionRecord
+
+        self._table = SessionRecord.__table__
+        self.sweep_interval = app.config.get('SESSION_SWEEP_INTERVAL', self.sweep_interval)
+        self.size_warn_bytes = app.config.get('SESSION_SIZE_WARN_BYTES', self.size_warn_bytes)
+        app.session_interface = self
+
+    def _get_signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+    def _get_engine(self):
+        if self._engine is None:
+            from models import db
+            self._engine = db.engine
+        return self._engine
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime
+
+    def _new_session(self):
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def open_session(self, app, request):
+        self._ensure_sweeper()
+
+        # Zasoby statyczne nie potrzebują sesji - pomijamy odczyt z bazy
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self._new_session()
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+
+        try:
+            sid = self._get_signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self._new_session()
+
+        try:
+            with self._get_engine().connect() as conn:
+                row = conn.execute(
+                    select(self._table.c.data, self._table.c.expires_at)
+                    .where(self._table.c.id == sid)
+                ).first()
+        except SQLAlchemyError as e:
+            logger.error(f"Błąd odczytu sesji z bazy: {e}")
+            return self._new_session()
+
+        if row is None or row.expires_at <= datetime.utcnow():
+            return self._new_session()
+
+        try:
+            data = self.serializer.loads(row.data)
+        except ValueError:
+            logger.warning(f"Uszkodzone dane sesji {sid[:8]}, tworzę nową sesję")
+            return self._new_session()
+
+        return ServerSideSession(data, sid=sid, expires_at=row.expires_at, size=len(row.data))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        lifetime = self._lifetime(app)
+        # Odświeżaj wygaśnięcie tylko gdy minęła połowa czasu życia - oszczędza zapis na każdym requeście
+        needs_refresh = (session.expires_at is None
+                         or session.expires_at - now < lifetime / 2)
+
+        if not (session.modified or session.new or needs_refresh):
+            return
+
+        expires_at = now + lifetime
+        payload = self.serializer.dumps(dict(session))
+        try:
+            self._store(session.sid, payload, expires_at)
+        except SQLAlchemyError as e:
+            logger.error(f"Błąd zapisu sesji do bazy: {e}")
+            return
+        session.expires_at = expires_at
+
+        # Rozmiar liczymy z już zserializowanych danych, tylko gdy sesja się zmieniła
+        if session.modified:
+            self._track_size(session, len(payload))
+
+        response.set_cookie(
+            name,
+            self._get_signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _track_size(self, session, size):
+        session.size = size
+        if request.endpoint in SIZE_TRACKING_SKIP_ENDPOINTS:
+            return
+        metrics.observe('session_size_bytes', size)
+        if size > self.size_warn_bytes:
+            logger.warning(f"Sesja jest bardzo duża: {size} bajtów (endpoint: {request.endpoint})")
+
+    def _store(self, sid, payload, expires_at):
+        table = self._table
+        with self._get_engine().begin() as conn:
+            result = conn.execute(
+                update(table).where(table.c.id == sid)
+                .values(data=payload, expires_at=expires_at))
+            if result.rowcount:
+                return
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(table).values(id=sid, data=payload, expires_at=expires_at))
+            except IntegrityError:
+                # Równoległy request zdążył wstawić ten sam identyfikator
+                conn.execute(
+                    update(table).where(table.c.id == sid)
+                    .values(data=payload, expires_at=expires_at))
+
+    def _delete(self, sid):
+        try:
+            with self._get_engine().begin() as conn:
+                conn.execute(delete(self._table).where(self._table.c.id == sid))
+        except SQLAlchemyError as e:
+            logger.error(f"Błąd usuwania sesji: {e}")
+
+    def purge_expired(self):
+        """Usuń wygasłe sesje, zwraca liczbę usuniętych rekordów"""
+        with self._get_engine().begin() as conn:
+            result = conn.execute(
+                delete(self._table).where(self._table.c.expires_at <= datetime.utcnow()))
+        return result.rowcount
+
+    def _ensure_sweeper(self):
+        """Uruchom wątek czyszczący raz na proces (również po forku workera gunicorna)"""
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._get_engine()
+            thread = threading.Thread(target=self._sweep_loop,
+                                      name='session-sweeper',
+                                      daemon=True)
+            thread.start()
+            self._sweeper_pid = os.getpid()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.purge_expired()
+                if removed:
+                    logger.info(f"🧹 Usunięto {removed} wygasłych sesji")
+            except Exception as e:
+                logger.error(f"Błąd czyszczenia sesji: {e}")
+
+
+session_store = ServerSideSessionInterface()
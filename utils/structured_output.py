@@ -0,0 +1,421 @@
+import re
+import json
+import logging
+
+from utils.metrics import metrics
+from utils.response_parser import Extracted, ResponseParseError, extract_json_details
+
+logger = logging.getLogger(__name__)
+
+NUMBER_RE = re.compile(r'^\s*(-?\d+(?:[.,]\d+)?)\s*%?\s*$')
+
+# Budżet max_tokens na jedno pole przy poprawce (gdy zadanie nie podaje własnego)
+DEFAULT_FIELD_TOKENS = 200
+# Poprawka całej odpowiedzi (tekst zamiast JSON) - ~3 znaki na token plus zapas na składnię
+CHARS_PER_TOKEN = 3
+CONVERSION_OVERHEAD_TOKENS = 200
+TRUNCATED_MESSAGE = 'urwane - odpowiedź przekroczyła limit max_tokens'
+
+_STRING_LIST = {'type': 'array', 'items': {'type': 'string'}}
+
+CV_SCORE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'score': {'type': 'integer', 'minimum': 1, 'maximum': 100},
+        'grade': {'type': 'string', 'enum': ['A+', 'A', 'B+', 'B', 'C+', 'C', 'D', 'F']},
+        'category_scores': {
+            'type': 'object',
+            'properties': {
+                'structure': {'type': 'integer', 'minimum': 0, 'maximum': 20},
+                'clarity': {'type': 'integer', 'minimum': 0, 'maximum': 20},
+                'job_match': {'type': 'integer', 'minimum': 0, 'maximum': 20},
+                'keywords': {'type': 'integer', 'minimum': 0, 'maximum': 15},
+                'achievements': {'type': 'integer', 'minimum': 0, 'maximum': 15},
+                'language': {'type': 'integer', 'minimum': 0, 'maximum': 10},
+            },
+        },
+        'strengths': _STRING_LIST,
+        'weaknesses': _STRING_LIST,
+        'recommendations': _STRING_LIST,
+        'summary': {'type': 'string', 'minLength': 1},
+    },
+    'required': ['score', 'grade', 'category_scores', 'strengths', 'weaknesses', 'recommendations', 'summary'],
+}
+
+JOB_POSTING_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'job_title': {'type': 'string', 'minLength': 1},
+        'industry': {'type': 'string'},
+        'location': {'type': 'string'},
+        'employment_type': {'type': 'string'},
+        'key_requirements': _STRING_LIST,
+        'main_responsibilities': _STRING_LIST,
+        'technical_skills': _STRING_LIST,
+        'soft_skills': _STRING_LIST,
+        'work_conditions': {
+            'type': 'object',
+            'properties': {
+                'hours': {'type': 'string'},
+                'schedule': {'type': 'string'},
+                'salary_info': {'type': 'string'},
+                'benefits': _STRING_LIST,
+            },
+        },
+        'industry_keywords': _STRING_LIST,
+        'critical_phrases': _STRING_LIST,
+        'experience_level': {'type': 'string'},
+        'education_requirements': {'type': 'string'},
+        'summary': {'type': 'string'},
+    },
+    'required': ['job_title', 'industry', 'key_requirements', 'main_responsibilities', 'technical_skills',
+                 'soft_skills', 'industry_keywords', 'summary'],
+}
+
+CV_OPTIMIZATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'reasoning_process': {
+            'type': 'object',
+            'properties': {
+                'industry_analysis': {'type': 'string'},
+                'candidate_positioning': {'type': 'string'},
+                'optimization_strategy': {'type': 'string'},
+                'key_insights': _STRING_LIST,
+            },
+        },
+        'optimized_cv': {'type': 'string', 'minLength': 1},
+        'improvements_made': _STRING_LIST,
+        'ats_optimization': {
+            'type': 'object',
+            'properties': {
+                'keyword_density': {'type': ['integer', 'string']},
+                'structure_score': {'type': ['integer', 'string']},
+                'readability_score': {'type': ['integer', 'string']},
+            },
+        },
+        'success_probability': {'type': ['string', 'integer']},
+        'next_steps': {'type': 'string'},
+    },
+    'required': ['optimized_cv', 'improvements_made'],
+}
+
+CV_CONTENT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'professional_title': {'type': 'string', 'minLength': 1},
+        'professional_summary': {'type': 'string', 'minLength': 1},
+        'experience_suggestions': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'company': {'type': 'string'},
+                    'startDate': {'type': 'string'},
+                    'endDate': {'type': 'string'},
+                    'description': {'type': 'string'},
+                },
+                'required': ['title', 'company', 'startDate', 'endDate', 'description'],
+            },
+        },
+        'education_suggestions': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'degree': {'type': 'string'},
+                    'school': {'type': 'string'},
+                    'startYear': {'type': 'string'},
+                    'endYear': {'type': 'string'},
+                },
+                'required': ['degree', 'school'],
+            },
+        },
+        'skills_list': {'type': 'string'},
+        'career_level': {'type': 'string'},
+        'industry_focus': {'type': 'string'},
+        'generation_notes': {'type': 'string'},
+    },
+    'required': ['professional_title', 'professional_summary', 'experience_suggestions',
+                 'education_suggestions', 'skills_list'],
+}
+
+
+class StructuredTask:
+    """
+    Zadanie LLM z odpowiedzią JSON: nazwa (response_format, metryki), schemat,
+    budżet max_tokens poprawki dla pól dłuższych niż DEFAULT_FIELD_TOKENS i pole główne
+    (primary) - wynik zadania, bez którego odpowiedź jest bezużyteczna.
+    """
+
+    def __init__(self, name, schema, field_tokens=None, primary=None):
+        self.name = name
+        self.schema = schema
+        self.field_tokens = field_tokens or {}
+        self.primary = primary
+
+    def response_format(self, mode, keys=None):
+        """Parametr response_format dla OpenRouter ('json_schema', 'json_object') albo None"""
+        if mode == 'json_object':
+            return {'type': 'json_object'}
+        if mode == 'json_schema':
+            # strict=False - schematy zostawiają pola opcjonalne, czego tryb strict nie dopuszcza
+            return {'type': 'json_schema',
+                    'json_schema': {'name': self.name, 'strict': False, 'schema': self.subschema(keys)}}
+        return None
+
+    def subschema(self, keys=None):
+        """Schemat ograniczony do pól `keys` (wszystkie, gdy None)"""
+        if keys is None:
+            return self.schema
+        properties = self.schema['properties']
+        return {'type': 'object', 'properties': {key: properties[key] for key in keys},
+                'required': list(keys)}
+
+    def repair_tokens(self, keys):
+        return sum(self.field_tokens.get(key, DEFAULT_FIELD_TOKENS) for key in keys)
+
+
+TASKS = {
+    'cv_score': StructuredTask('cv_score', CV_SCORE_SCHEMA, {'category_scores': 120, 'summary': 300}),
+    'job_posting_analysis': StructuredTask('job_posting_analysis', JOB_POSTING_SCHEMA, {'summary': 300}),
+    'cv_optimization_reasoning': StructuredTask('cv_optimization_reasoning', CV_OPTIMIZATION_SCHEMA,
+                                                # Brak samego CV to de facto ponowna generacja - limit zadania
+                                                {'optimized_cv': 6000, 'improvements_made': 500},
+                                                primary='optimized_cv'),
+    'cv_content': StructuredTask('cv_content', CV_CONTENT_SCHEMA,
+                                 {'professional_summary': 300, 'experience_suggestions': 1200,
+                                  'education_suggestions': 250}),
+}
+
+
+def _is_type(value, name):
+    if name == 'object':
+        return isinstance(value, dict)
+    if name == 'array':
+        return isinstance(value, list)
+    if name == 'string':
+        return isinstance(value, str)
+    if name == 'integer':
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == 'number':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if name == 'boolean':
+        return isinstance(value, bool)
+    return name == 'null' and value is None
+
+
+def validate(value, schema, path=()):
+    """
+    Sprawdzenie wartości względem podzbioru JSON Schema używanego w TASKS
+    (type, properties, required, items, enum, minimum/maximum, minLength, minItems).
+    Zwraca listę (ścieżka, komunikat); ścieżka to krotka kluczy/indeksów.
+    """
+    types = schema.get('type')
+    if types:
+        types = [types] if isinstance(types, str) else types
+        if not any(_is_type(value, t) for t in types):
+            return [(path, f"oczekiwano {'/'.join(types)}")]
+
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append((path, f"dozwolone wartości: {', '.join(map(str, schema['enum']))}"))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append((path, f"minimum {schema['minimum']}"))
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append((path, f"maksimum {schema['maximum']}"))
+    if isinstance(value, str) and len(value.strip()) < schema.get('minLength', 0):
+        errors.append((path, "pusty tekst"))
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append((path + (key,), "brak pola"))
+        for key, subschema in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate(value[key], subschema, path + (key,)))
+    if isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            errors.append((path, f"za mało elementów (min. {schema['minItems']})"))
+        if 'items' in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema['items'], path + (i,)))
+    return errors
+
+
+def coerce(value, schema):
+    """
+    Poprawki bez wywołania LLM: liczby podane jako tekst ("85", "85%"), liczby w polach
+    tekstowych, pojedynczy tekst zamiast listy tekstów. Zwraca nową wartość.
+    """
+    types = schema.get('type')
+    types = [types] if isinstance(types, str) else (types or [])
+    if any(_is_type(value, t) for t in types):
+        if isinstance(value, dict):
+            properties = schema.get('properties', {})
+            return {key: coerce(item, properties[key]) if key in properties else item
+                    for key, item in value.items()}
+        if isinstance(value, list) and 'items' in schema:
+            return [coerce(item, schema['items']) for item in value]
+        return value
+
+    if isinstance(value, str) and ('integer' in types or 'number' in types):
+        match = NUMBER_RE.match(value)
+        if match:
+            number = float(match.group(1).replace(',', '.'))
+            if 'integer' in types and number.is_integer():
+                return int(number)
+            if 'number' in types:
+                return number
+    if 'string' in types and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if 'integer' in types and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if 'array' in types and isinstance(value, str) and schema.get('items', {}).get('type') == 'string':
+        return [value]
+    return value
+
+
+def invalid_fields(errors):
+    """Pola najwyższego poziomu, których dotyczą błędy (kolejność pierwszego wystąpienia)"""
+    fields = []
+    for path, _ in errors:
+        if path and path[0] not in fields:
+            fields.append(path[0])
+    return fields
+
+
+def _describe(errors):
+    return '; '.join(f"{'.'.join(map(str, path)) or 'odpowiedź'}: {message}" for path, message in errors)
+
+
+def field_repair_prompt(prompt, task, data, errors):
+    """
+    Prompt poprawki: pierwotne zadanie + lista błędów + prośba o same błędne pola.
+    Model generuje tylko te pola - poprawne części odpowiedzi nie są generowane ponownie.
+    """
+    fields = invalid_fields(errors)
+    valid = {key: value for key, value in data.items() if key not in fields}
+    return f"""{prompt}
+
+    POPRAWKA ODPOWIEDZI:
+    Poprzednia odpowiedź była niepełna lub niezgodna ze schematem: {_describe(errors)}.
+    Poprawne pola (NIE powtarzaj ich): {', '.join(valid) or 'brak'}.
+    Zwróć WYŁĄCZNIE obiekt JSON zawierający tylko pola: {', '.join(map(str, fields))}, zgodny ze schematem:
+    {json.dumps(task.subschema(fields), ensure_ascii=False)}
+    """
+
+
+def conversion_prompt(task, raw_text):
+    """Prompt przepisania odpowiedzi tekstowej na JSON - bez ponownej analizy, tylko zmiana formy"""
+    return f"""
+    Przepisz poniższą odpowiedź do formatu JSON zgodnego ze schematem. Nie zmieniaj treści,
+    nie dodawaj nowych informacji, nie analizuj ponownie. Zwróć WYŁĄCZNIE obiekt JSON.
+
+    SCHEMAT:
+    {json.dumps(task.schema, ensure_ascii=False)}
+
+    ODPOWIEDŹ DO PRZEPISANIA:
+    {raw_text}
+    """
+
+
+def _truncated_field(data, extracted, finish_reason):
+    """
+    Pole, na którym urwała się odpowiedź ucięta na max_tokens (ostatnie w kolejności tekstu)
+    albo None. Naprawa domyka ucięty JSON, więc bez tego urwana wartość przeszłaby walidację.
+    """
+    if (finish_reason == 'length' or extracted.truncated) and data:
+        return next(reversed(data))
+    return None
+
+
+def request_structured(task, prompt, send, max_tokens, response_format_mode='json_object'):
+    """
+    Odpowiedź JSON zgodna ze schematem zadania. send(prompt, max_tokens, response_format)
+    wysyła jedno zapytanie do LLM i zwraca (tekst odpowiedzi, finish_reason).
+
+    Kolejne kroki, każdy tylko gdy poprzedni nie wystarczył:
+    parsowanie z naprawą (utils.response_parser) -> poprawki lokalne (coerce) ->
+    jedno zapytanie o same błędne pola (max_tokens wg repair_tokens). Odpowiedź, która nie jest
+    JSON-em, dla zadania z polem głównym (primary) to wartość tego pola - brakujące pola są
+    uzupełniane jak błędne; dla pozostałych zadań jest przepisywana na JSON. Pole urwane limitem max_tokens
+    jest błędne; jeśli poprawka go nie uzupełni, jest usuwane - urwana wartość nie jest zwracana.
+    Zwraca (dane, surowa odpowiedź); dane to None, gdy JSON-a nie udało się uzyskać,
+    i mogą mieć pozostałe błędy walidacji.
+    """
+    raw, finish_reason = send(prompt, max_tokens, task.response_format(response_format_mode))
+    try:
+        extracted = extract_json_details(raw)
+    except ResponseParseError:
+        extracted = None
+    if (extracted is not None and task.primary and task.primary not in extracted.value
+            and 2 * extracted.span < len(raw.strip())):
+        # Mały obiekt JSON w treści tekstowej odpowiedzi (np. przykład konfiguracji w CV), nie wynik zadania
+        extracted = None
+
+    if extracted is None and task.primary and isinstance(raw, str) and raw.strip():
+        # Odpowiedź tekstowa to sam wynik (np. zoptymalizowane CV) - bez ponownego przepisywania całości
+        extracted = Extracted({task.primary: raw.strip()}, len(raw), False)
+        outcome = 'wrapped'
+    elif extracted is None:
+        if not isinstance(raw, str) or not raw.strip():
+            metrics.inc('llm_structured_output_total', task=task.name, outcome='unparsed')
+            return None, raw
+        # Cała treść jest już w odpowiedzi - koszt przepisania zależy od jej długości, nie od max_tokens zadania
+        budget = min(max_tokens, len(raw) // CHARS_PER_TOKEN + CONVERSION_OVERHEAD_TOKENS)
+        logger.info(f"Odpowiedź {task.name} nie jest JSON - przepisanie (max_tokens={budget})")
+        metrics.inc('llm_structured_repair_total', task=task.name, kind='conversion')
+        try:
+            converted, finish_reason = send(conversion_prompt(task, raw), budget,
+                                            task.response_format(response_format_mode))
+            extracted = extract_json_details(converted)
+        except Exception as e:
+            logger.warning(f"Przepisanie odpowiedzi {task.name} na JSON nieudane: {e}")
+            metrics.inc('llm_structured_output_total', task=task.name, outcome='unparsed')
+            return None, raw
+        outcome = 'converted'
+    else:
+        outcome = 'valid'
+
+    data = coerce(extracted.value, task.schema)
+    truncated = _truncated_field(data, extracted, finish_reason)
+    errors = _errors(data, task, truncated)
+    fields = invalid_fields(errors)
+    if fields and outcome in ('valid', 'wrapped'):
+        budget = min(max_tokens, task.repair_tokens(fields))
+        logger.info(f"Odpowiedź {task.name}: błędne pola {fields} - poprawka (max_tokens={budget})")
+        metrics.inc('llm_structured_repair_total', task=task.name, kind='fields')
+        try:
+            patch_raw, patch_finish_reason = send(field_repair_prompt(prompt, task, data, errors), budget,
+                                                  task.response_format(response_format_mode, fields))
+            patch_extracted = extract_json_details(patch_raw)
+            patch = {key: value for key, value in patch_extracted.value.items() if key in fields}
+            # Poprawka też może zostać ucięta - jej urwane pole odrzucamy
+            patch.pop(_truncated_field(patch, patch_extracted, patch_finish_reason), None)
+            patch = coerce(patch, task.subschema(list(patch)))
+            data = dict(data, **patch)
+            if truncated in patch:
+                truncated = None
+            errors = _errors(data, task, truncated)
+            outcome = 'repaired'
+        except Exception as e:
+            # Nieudana poprawka nie przekreśla poprawnych pól pierwszej odpowiedzi
+            logger.warning(f"Poprawka odpowiedzi {task.name} nieudana: {e}")
+
+    if truncated is not None:
+        data = {key: value for key, value in data.items() if key != truncated}
+    if errors:
+        logger.warning(f"Odpowiedź {task.name} niezgodna ze schematem: {_describe(errors)}")
+        outcome = 'invalid'
+    metrics.inc('llm_structured_output_total', task=task.name, outcome=outcome)
+    return data, raw
+
+
+def _errors(data, task, truncated):
+    errors = validate(data, task.schema)
+    if truncated is not None:
+        errors.append(((truncated,), TRUNCATED_MESSAGE))
+    return errors